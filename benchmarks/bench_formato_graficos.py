@@ -0,0 +1,109 @@
+"""
+Benchmark: formato de saída dos gráficos (PNG em vários DPIs x SVG)
+
+Monta o contexto de um relatório com o MockDataProvider, renderiza os
+gráficos em cada formato (cache de imagens desligado) e compara o tempo de
+renderização, o tamanho do HTML de relatorio_full.html em modo PDF e, se o
+WeasyPrint estiver disponível, o tempo de geração e o tamanho do PDF final.
+
+Uso:
+    python benchmarks/bench_formato_graficos.py [--repeticoes 3] [--cliente 1001]
+"""
+from __future__ import annotations
+import argparse
+import os
+import sys
+import time
+from typing import List, Optional, Tuple
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import matplotlib  # noqa: E402
+matplotlib.use("Agg")
+
+from flask import Flask, render_template  # noqa: E402
+
+from reporting.chart_service import ChartService  # noqa: E402
+from reporting.mock_data_provider import MockDataProvider  # noqa: E402
+from reporting.report_service import ReportService  # noqa: E402
+
+CORES = {"primary": "#2d5a3d", "secondary": "#7fa88f", "tertiary": "#1a1a1a", "bg": "#fafbfa"}
+FORMATOS: List[Tuple[str, int]] = [("png", 150), ("png", 96), ("svg", 150)]
+STYLESHEETS = [
+    os.path.join(RAIZ, "static", "style.css"),
+    os.path.join(RAIZ, "static", "css", "relatorio-pdf.css"),
+]
+
+
+def criar_app() -> Flask:
+    # Mesmo app mínimo dos workers de lote: só 'static' e 'serve_img' para url_for
+    app = Flask("main", root_path=RAIZ)
+    app.add_url_rule("/img/<path:filename>", endpoint="serve_img")
+    return app
+
+
+def carregar_weasyprint():
+    try:
+        from weasyprint import CSS, HTML
+    except Exception as e:  # bibliotecas nativas (pango) ausentes
+        print(f"WeasyPrint indisponível ({type(e).__name__}); tamanho do PDF não será medido.")
+        return None
+    return HTML, [CSS(filename=css) for css in STYLESHEETS]
+
+
+def medir(
+    app: Flask,
+    formato: str,
+    dpi: int,
+    cliente_id: int,
+    repeticoes: int,
+    weasy,
+) -> Tuple[float, int, Optional[float], Optional[int]]:
+    charts = ChartService(**CORES, formato=formato, dpi=dpi, cache_max_bytes=0)
+    service = ReportService(MockDataProvider(), charts)
+
+    tempos = []
+    for _ in range(repeticoes):
+        contexto = service.montar_contexto(cliente_id=cliente_id, year=2024, months=[1, 2, 3])
+        inicio = time.perf_counter()
+        for nome in contexto["graficos"]:
+            contexto["graficos"][nome]
+        tempos.append(time.perf_counter() - inicio)
+
+    with app.test_request_context("/", base_url="http://localhost/"):
+        html = render_template("relatorio_full.html", **contexto, mode="pdf")
+
+    tempo_pdf = tamanho_pdf = None
+    if weasy is not None:
+        HTML, stylesheets = weasy
+        inicio = time.perf_counter()
+        pdf = HTML(string=html, base_url=RAIZ).write_pdf(stylesheets=stylesheets)
+        tempo_pdf = time.perf_counter() - inicio
+        tamanho_pdf = len(pdf)
+
+    return min(tempos), len(html.encode("utf-8")), tempo_pdf, tamanho_pdf
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--cliente", type=int, default=1001)
+    args = parser.parse_args()
+
+    app = criar_app()
+    weasy = carregar_weasyprint()
+
+    print(f"{'formato':<10} {'gráficos (s)':>13} {'HTML (KB)':>10} {'PDF (s)':>9} {'PDF (KB)':>9}")
+    for formato, dpi in FORMATOS:
+        tempo, html_bytes, tempo_pdf, pdf_bytes = medir(app, formato, dpi, args.cliente, args.repeticoes, weasy)
+        rotulo = f"{formato}@{dpi}" if formato == "png" else formato
+        print(
+            f"{rotulo:<10} {tempo:>13.3f} {html_bytes / 1024:>10.1f} "
+            f"{(f'{tempo_pdf:.2f}' if tempo_pdf is not None else '-'):>9} "
+            f"{(f'{pdf_bytes / 1024:.1f}' if pdf_bytes is not None else '-'):>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Benchmark: filtro de período com EXTRACT(...) x faixas S.DATA >= ? AND S.DATA < ?
+
+Gera uma base SQLite local com o formato de TABSALDOCONTABIL (índice em
+CODIGOEMPRESA + DATA) e compara o plano e o tempo das duas formas de filtro.
+As faixas vêm de DatabaseDataProvider._intervalos_periodo, o mesmo código
+usado nas consultas do Firebird.
+
+Uso:
+    python benchmarks/bench_periodo_sargavel.py [--linhas 2000000] [--db caminho.sqlite]
+"""
+from __future__ import annotations
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reporting.database_data_provider import DatabaseDataProvider  # noqa: E402
+
+EMPRESA = 1001
+ANO = 2024
+MESES = [1, 2, 3]
+
+
+def criar_base(caminho: str, linhas: int) -> sqlite3.Connection:
+    conn = sqlite3.connect(caminho)
+    existe = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE name = 'TABSALDOCONTABIL'"
+    ).fetchone()[0]
+    if existe:
+        return conn
+
+    print(f"Gerando {linhas:,} linhas em {caminho} ...")
+    conn.execute("""
+        CREATE TABLE TABSALDOCONTABIL (
+            CODIGOEMPRESA INTEGER,
+            CODIGOFILIAL INTEGER,
+            CODIGOCONTACONTABIL TEXT,
+            DATA DATE,
+            INICIAL INTEGER,
+            VALORDEBITO REAL,
+            VALORCREDITO REAL
+        )
+    """)
+    rnd = random.Random(42)
+    inicio = date(2015, 1, 1)
+    dias = (date(2025, 12, 31) - inicio).days
+    empresas = [EMPRESA] + list(range(2000, 2020))
+    contas = [f"{g}{rnd.randint(100, 999)}" for g in range(1, 6) for _ in range(60)]
+
+    lote = []
+    for i in range(linhas):
+        lote.append((
+            rnd.choice(empresas),
+            rnd.randint(1, 3),
+            rnd.choice(contas),
+            (inicio + timedelta(days=rnd.randint(0, dias))).isoformat(),
+            1,
+            round(rnd.random() * 1000, 2),
+            round(rnd.random() * 1000, 2),
+        ))
+        if len(lote) == 50_000:
+            conn.executemany("INSERT INTO TABSALDOCONTABIL VALUES (?, ?, ?, ?, ?, ?, ?)", lote)
+            lote.clear()
+    if lote:
+        conn.executemany("INSERT INTO TABSALDOCONTABIL VALUES (?, ?, ?, ?, ?, ?, ?)", lote)
+    conn.execute("CREATE INDEX IDX_SALDO_EMP_DATA ON TABSALDOCONTABIL (CODIGOEMPRESA, DATA)")
+    conn.commit()
+    conn.execute("ANALYZE")
+    return conn
+
+
+def consulta_extract() -> tuple:
+    # Equivalente SQLite de EXTRACT(YEAR/MONTH FROM S.DATA) IN (...)
+    sql = f"""
+        SELECT CODIGOCONTACONTABIL, SUM(VALORDEBITO), SUM(VALORCREDITO)
+        FROM TABSALDOCONTABIL S
+        WHERE S.CODIGOEMPRESA = ?
+          AND CAST(strftime('%Y', S.DATA) AS INTEGER) IN ({ANO})
+          AND CAST(strftime('%m', S.DATA) AS INTEGER) IN ({','.join(map(str, MESES))})
+        GROUP BY CODIGOCONTACONTABIL
+    """
+    return sql, [EMPRESA]
+
+
+def consulta_faixas() -> tuple:
+    filtro, params = DatabaseDataProvider._filtro_periodo([ANO], MESES)
+    sql = f"""
+        SELECT CODIGOCONTACONTABIL, SUM(VALORDEBITO), SUM(VALORCREDITO)
+        FROM TABSALDOCONTABIL S
+        WHERE S.CODIGOEMPRESA = ?
+          AND {filtro}
+        GROUP BY CODIGOCONTACONTABIL
+    """
+    return sql, [EMPRESA] + [d.isoformat() for d in params]
+
+
+def medir(conn: sqlite3.Connection, nome: str, sql: str, params: list, repeticoes: int) -> float:
+    print(f"\n== {nome} ==")
+    for linha in conn.execute("EXPLAIN QUERY PLAN " + sql, params):
+        print("  plano:", linha[-1])
+
+    tempos = []
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        linhas = conn.execute(sql, params).fetchall()
+        tempos.append(time.perf_counter() - t0)
+    melhor = min(tempos)
+    print(f"  linhas: {len(linhas)}  melhor de {repeticoes}: {melhor * 1000:.1f} ms")
+    return melhor
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, default=2_000_000)
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "bench_saldo_contabil.sqlite"))
+    parser.add_argument("--repeticoes", type=int, default=5)
+    args = parser.parse_args()
+
+    conn = criar_base(args.db, args.linhas)
+    total = conn.execute("SELECT COUNT(*) FROM TABSALDOCONTABIL").fetchone()[0]
+    print(f"Base: {args.db} ({total:,} linhas) | empresa {EMPRESA}, {MESES}/{ANO}")
+
+    t_extract = medir(conn, "EXTRACT (não sargável)", *consulta_extract(), args.repeticoes)
+    t_faixas = medir(conn, "Faixas de data (sargável)", *consulta_faixas(), args.repeticoes)
+    print(f"\nGanho: {t_extract / t_faixas:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
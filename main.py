@@ -1,17 +1,29 @@
-import io
+import hmac
+import json
 import os
 import warnings
+from concurrent.futures import TimeoutError as FuturoTimeoutError
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timedelta
 from typing import List
 
 import matplotlib.pyplot as plt
-from flask import Flask, render_template, make_response, request, redirect, url_for, send_file, jsonify
-from weasyprint import HTML, CSS
+from flask import Flask, render_template, make_response, request, redirect, url_for, send_file, send_from_directory, jsonify, Response, stream_with_context
 from dotenv import load_dotenv
 
 from reporting.database_data_provider import DatabaseDataProvider
 from reporting.chart_service import ChartService
 from reporting.report_service import ReportService
+from reporting.context_cache import ContextCache, DiskCacheBackend, MemoryCacheBackend, periodo_fechado
+from reporting.http_cache import HttpCache, versionar_estaticos
+from reporting.pdf_cache import PdfArtifactCache
+from reporting.pdf_worker_pool import PdfWorkerPool, PdfPoolOcupadoError
+from reporting.batch_service import BatchReportService
+from reporting.client_directory import ClientDirectory
+from reporting.zip_stream import zip_em_stream
+from reporting.balancete import AGRUPAMENTOS, colunas_balancete
+from reporting.json_stream import FORMATOS, codificacao_aceita, comprimir_stream, linhas_em_stream
+from reporting.job_queue import JobQueue, FilaCheiaError
 
 load_dotenv()
 
@@ -26,17 +38,168 @@ COLOR_SECONDARY = '#7fa88f'
 COLOR_TERTIARY = '#1a1a1a'
 COLOR_BG = '#fafbfa'
 
+CHART_COLORS = dict(primary=COLOR_PRIMARY, secondary=COLOR_SECONDARY, tertiary=COLOR_TERTIARY, bg=COLOR_BG)
+
 # --- CONFIGURAÇÃO FIREBIRD ---
 # Atualizado para conectar no banco Athenas (Firebird)
-data_provider = DatabaseDataProvider(
+DB_CONFIG = dict(
     host='192.168.10.160',
     port=3050,
     database=r'e:\Athenas\rps.fdb',
     user='SYSDBA',
     password='masterkey',
 )
-chart_service = ChartService(primary=COLOR_PRIMARY, secondary=COLOR_SECONDARY, tertiary=COLOR_TERTIARY, bg=COLOR_BG)
-report_service = ReportService(data_provider, chart_service)
+# SALDO_STORE_DB: base SQLite de saldos mensais mantida por `python -m reporting.saldo_store`;
+# empresas sincronizadas há menos de SALDO_STORE_MAX_IDADE segundos (padrão 15 min) são lidas
+# dela. Um lançamento feito depois da sincronização só aparece passado esse prazo: mantenha-o
+# próximo do intervalo do agendamento da sincronização.
+SALDO_STORE_CONFIG = {
+    'saldo_store_db': os.environ.get('SALDO_STORE_DB') or None,
+    'saldo_store_max_idade': float(os.environ.get('SALDO_STORE_MAX_IDADE', str(15 * 60))),
+}
+data_provider = DatabaseDataProvider(
+    **DB_CONFIG,
+    **SALDO_STORE_CONFIG,
+    pool_size=int(os.environ.get('DB_POOL_SIZE', '8')),
+    pool_idle_timeout=float(os.environ.get('DB_POOL_IDLE_TIMEOUT', '300')),
+)
+# Gráficos do PDF: svg (vetorial, padrão) ou png (rasterizado em CHART_DPI)
+# CHART_CACHE_MAX_MB=0 desliga o cache de imagens dos gráficos
+CHART_OPTIONS = {
+    'formato': os.environ.get('CHART_FORMAT', 'svg'),
+    'dpi': int(os.environ.get('CHART_DPI', '150')),
+}
+# CHART_WORKERS: processos que desenham em paralelo os gráficos de um PDF (0 = no próprio processo)
+chart_service = ChartService(
+    **CHART_COLORS,
+    **CHART_OPTIONS,
+    cache_max_bytes=int(os.environ.get('CHART_CACHE_MAX_MB', '32')) * 1024 * 1024,
+    processos=int(os.environ.get('CHART_WORKERS', str(min(4, os.cpu_count() or 1)))),
+)
+
+# --- CADASTRO DE CLIENTES EM MEMÓRIA ---
+# Dashboard e /api/clientes buscam no cadastro carregado, recarregado a cada CLIENTES_REFRESH segundos.
+# A carga começa na primeira requisição (iniciar_servicos), nunca no import deste módulo.
+client_directory = ClientDirectory(
+    data_provider,
+    intervalo=float(os.environ.get('CLIENTES_REFRESH', '300')),
+)
+
+# --- CACHE DE CONTEXTOS ---
+# CONTEXT_CACHE_DIR definido -> cache em disco compartilhado entre workers (gunicorn)
+_cache_dir = os.environ.get('CONTEXT_CACHE_DIR')
+_cache_max_mb = int(os.environ.get('CONTEXT_CACHE_MAX_MB', '64'))
+context_cache = ContextCache(
+    backend=(
+        DiskCacheBackend(_cache_dir, max_bytes=_cache_max_mb * 1024 * 1024)
+        if _cache_dir
+        else MemoryCacheBackend(max_bytes=_cache_max_mb * 1024 * 1024)
+    ),
+    ttl_aberto=float(os.environ.get('CONTEXT_CACHE_TTL', '300')),
+    ttl_fechado=float(os.environ.get('CONTEXT_CACHE_TTL_FECHADO', str(7 * 24 * 3600))),
+)
+report_service = ReportService(data_provider, chart_service, context_cache)
+# CONTEXT_CACHE_TOKEN: exigido no cabeçalho X-Cache-Token de POST /api/cache/invalidate. Sem ele
+# a rota só aceita requisições da própria máquina (atrás de proxy reverso, defina o token).
+CONTEXT_CACHE_TOKEN = os.environ.get('CONTEXT_CACHE_TOKEN') or None
+
+# --- CACHE DE PDFs RENDERIZADOS ---
+# Incrementar ao mudar algo que afete o PDF e não apareça no HTML (ex.: versão do WeasyPrint)
+PDF_TEMPLATE_VERSION = '2'
+PDF_STYLESHEETS = [
+    os.path.join(app.static_folder, 'style.css'),
+    os.path.join(app.static_folder, 'css', 'relatorio-pdf.css'),
+]
+# Folhas e fontes parseadas uma vez; recursos do PDF resolvidos só localmente.
+# PDF_FONTS_DIR: fontes (Inter, Poppins...) no lugar do @import do Google Fonts; se o
+# diretório não existir o @import fica (só os hosts do Google Fonts são liberados).
+PDF_RENDERER_CONFIG = {
+    'static_dir': app.static_folder,
+    'arquivos_css': PDF_STYLESHEETS,
+    'img_dir': os.path.join(app.root_path, 'img'),
+    'fontes_dir': os.environ.get('PDF_FONTS_DIR', os.path.join(app.static_folder, 'fonts')),
+    'permitir_rede': os.environ.get('PDF_PERMITIR_REDE', '0') == '1',
+}
+# Layout do WeasyPrint em processos à parte: PDF_WORKERS em paralelo, PDF_MAX_FILA esperando
+# (além disso, 503). PDF_WORKERS=0 gera no próprio processo web.
+pdf_workers = PdfWorkerPool(
+    PDF_RENDERER_CONFIG,
+    max_workers=int(os.environ.get('PDF_WORKERS', '2')),
+    max_fila=int(os.environ.get('PDF_MAX_FILA', '8')),
+    timeout=float(os.environ.get('PDF_TIMEOUT', '120')),
+)
+_pdf_cache_dir = os.environ.get('PDF_CACHE_DIR', os.path.join(app.root_path, '.cache', 'pdf'))
+pdf_cache = PdfArtifactCache(
+    _pdf_cache_dir,
+    arquivos_css=PDF_STYLESHEETS,
+    versao_template=PDF_TEMPLATE_VERSION,
+    max_bytes=int(os.environ.get('PDF_CACHE_MAX_MB', '1024')) * 1024 * 1024,
+)
+
+# --- CACHE HTTP ---
+# ETag pelos dados + templates/CSS; períodos fechados ficam HTTP_CACHE_MAX_AGE segundos em cache
+# (HTTP_CACHE_PUBLICO=0 restringe ao navegador). Arquivos estáticos levam ?v=<mtime> na URL e
+# podem ficar HTTP_STATIC_MAX_AGE segundos em cache.
+http_cache = HttpCache(
+    versao=PDF_TEMPLATE_VERSION,
+    arquivos=PDF_STYLESHEETS + [
+        os.path.join(app.root_path, 'templates', nome)
+        for nome in sorted(os.listdir(os.path.join(app.root_path, 'templates')))
+    ],
+    max_age_fechado=int(os.environ.get('HTTP_CACHE_MAX_AGE', str(24 * 3600))),
+    compartilhado=os.environ.get('HTTP_CACHE_PUBLICO', '1') == '1',
+)
+HTTP_STATIC_MAX_AGE = int(os.environ.get('HTTP_STATIC_MAX_AGE', str(30 * 24 * 3600)))
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = HTTP_STATIC_MAX_AGE
+versionar_estaticos(app)
+
+# --- BALANCETE EM STREAM ---
+# Linhas lidas do cursor (e enviadas) por vez em /api/balancete
+BALANCETE_LINHAS_POR_LOTE = int(os.environ.get('BALANCETE_LINHAS_POR_LOTE', '1000'))
+
+# --- GERAÇÃO EM LOTE ---
+# BATCH_WORKERS=0 gera em série no próprio processo (útil para debug); cada tarefa leva até
+# BATCH_CLIENTES_POR_TAREFA clientes, cujos dados são buscados juntos no banco.
+# Cada worker do lote tem o próprio WeasyPrint, fora do limite de PDF_WORKERS/PDF_MAX_FILA.
+# Orçamento de processos: cada processo web abre até CHART_WORKERS + PDF_WORKERS +
+# BATCH_WORKERS processos filhos (padrão: até 4 + 2 + 2), sob demanda. Com gunicorn isso
+# se multiplica pelo número de workers web: dimensione a soma pelos núcleos da máquina.
+batch_service = BatchReportService(
+    config={
+        'root_path': app.root_path,
+        'provider': {**DB_CONFIG, **SALDO_STORE_CONFIG, 'pool_size': 2},
+        'cores': CHART_COLORS,
+        'graficos': CHART_OPTIONS,
+        'context_cache_dir': _cache_dir,
+        'pdf_cache_dir': _pdf_cache_dir,
+        'pdf_template_version': PDF_TEMPLATE_VERSION,
+        'stylesheets': PDF_STYLESHEETS,
+        'pdf_renderer': PDF_RENDERER_CONFIG,
+    },
+    max_workers=int(os.environ.get('BATCH_WORKERS', str(min(2, os.cpu_count() or 1)))),
+    pdf_cache=pdf_cache,
+    clientes_por_tarefa=int(os.environ.get('BATCH_CLIENTES_POR_TAREFA', '10')),
+)
+
+# --- FILA DE JOBS ASSÍNCRONOS (lotes grandes) ---
+_jobs_dir = os.environ.get('JOBS_DIR', os.path.join(app.root_path, '.cache', 'jobs'))
+job_queue = JobQueue(
+    db_path=os.path.join(_jobs_dir, 'jobs.sqlite3'),
+    dir_resultados=_jobs_dir,
+    max_workers=int(os.environ.get('JOBS_WORKERS', '2')),
+    max_fila=int(os.environ.get('JOBS_MAX_FILA', '20')),
+)
+
+@app.before_request
+def iniciar_servicos():
+    """
+    Tarefas de fundo do processo web, iniciadas na primeira requisição.
+    Os workers dos pools (gráficos, PDF, lote) usam spawn e reimportam este
+    módulo como __mp_main__: nada aqui pode rodar no import, senão cada
+    worker abriria a própria thread consultando o Firebird.
+    """
+    client_directory.iniciar()
+
 
 def parse_request_params():
     """Helper para extrair filtros de ano, meses e filiais da requisição"""
@@ -62,15 +225,6 @@ def parse_request_params():
 @app.route('/')
 def home():
     """Dashboard moderno com cards de clientes e estatísticas"""
-    empresas = data_provider.listar_clientes()
-    
-    # Filtrar empresas com codigo e nome válidos (não None, não vazio)
-    empresas = [e for e in empresas 
-                if e.get('codigo') is not None 
-                and e.get('codigo') != '' 
-                and e.get('nome') is not None 
-                and e.get('nome') != '']
-
     query = (request.args.get('q') or '').strip()
     sort = request.args.get('sort', 'nome')
     direction = request.args.get('dir', 'asc')
@@ -78,40 +232,28 @@ def home():
     max_id = request.args.get('max_id', type=int)
     items_per_page = request.args.get('per_page', 15, type=int)
     items_per_page = max(5, min(items_per_page or 15, 100))
-
-    if query:
-        q = query.lower()
-        empresas = [
-            e for e in empresas
-            if q in str(e.get('codigo', '')).lower()
-            or q in (e.get('nome', '') or '').lower()
-            or q in (e.get('fantaisa', '') or '').lower()
-        ]
-
-    if min_id is not None:
-        empresas = [e for e in empresas if e.get('codigo') is not None and e['codigo'] >= min_id]
-    if max_id is not None:
-        empresas = [e for e in empresas if e.get('codigo') is not None and e['codigo'] <= max_id]
-
-    key_map = {
-        'nome': lambda e: (e.get('nome') or '').lower(),
-        'codigo': lambda e: e.get('codigo') or 0,
-    }
-    key_func = key_map.get(sort, key_map['nome'])
-    empresas = sorted(empresas, key=key_func, reverse=(direction == 'desc'))
-    
-    page = request.args.get('page', 1, type=int)
-    total_items = len(empresas)
+    page = max(1, request.args.get('page', 1, type=int) or 1)
+
+    # Cadastro em memória; enquanto não carregou, filtro e paginação vão para o banco
+    listar_pagina = client_directory.pagina if client_directory.pronto else data_provider.listar_clientes_pagina
+
+    def buscar_pagina(pagina: int):
+        return listar_pagina(
+            query=query or None,
+            min_id=min_id,
+            max_id=max_id,
+            sort=sort,
+            direction=direction,
+            offset=(pagina - 1) * items_per_page,
+            limit=items_per_page,
+        )
+
+    empresas_page, total_items = buscar_pagina(page)
     total_pages = (total_items + items_per_page - 1) // items_per_page
-    
-    if page < 1:
-        page = 1
-    elif page > total_pages and total_pages > 0:
+
+    if page > total_pages and total_pages > 0:
         page = total_pages
-    
-    start_idx = (page - 1) * items_per_page
-    end_idx = start_idx + items_per_page
-    empresas_page = empresas[start_idx:end_idx]
+        empresas_page, total_items = buscar_pagina(page)
     
     ids_pagina = ','.join(str(e['codigo']) for e in empresas_page)
     
@@ -149,7 +291,16 @@ def home():
 def report_view(cliente_id: int):
     """Visualização web do relatório com navegação entre páginas - Modo WEB"""
     year, months, branches = parse_request_params()
-    
+    fechado = periodo_fechado([year], months)
+
+    # Contexto já em cache e igual ao que o navegador tem: 304 sem consultar o banco
+    versao = report_service.versao_em_cache(cliente_id, year=year, months=months, branches=branches)
+    nao_modificado = http_cache.validar(
+        versao and http_cache.etag('view', cliente_id, year, months, branches, versao), fechado
+    )
+    if nao_modificado is not None:
+        return nao_modificado
+
     # Passando os parâmetros novos corretamente
     contexto = report_service.montar_contexto(
         cliente_id=cliente_id, 
@@ -157,35 +308,77 @@ def report_view(cliente_id: int):
         months=months, 
         branches=branches
     )
-    
-    return render_template('relatorio_full.html', **contexto, mode='web')
+
+    # Mesmos dados e templates que o navegador já tem: 304 sem renderizar
+    etag = http_cache.etag('view', cliente_id, year, months, branches, contexto['versao_dados'])
+    return http_cache.responder(
+        etag,
+        lambda: render_template('relatorio_full.html', **contexto, mode='web'),
+        fechado=fechado,
+    )
+
+
+def gerar_pdf(html_string: str):
+    """Renderiza o HTML com WeasyPrint, reaproveitando o PDF em cache. Retorna (chave, bytes)."""
+    def renderizar() -> bytes:
+        return pdf_workers.renderizar(html_string, base_url=request.url_root)
+
+    return pdf_cache.obter_ou_gerar(html_string, renderizar)
+
+
+def pdf_indisponivel(erro: str):
+    """503 em JSON quando o PDF não sai por sobrecarga (sem vaga, timeout) ou worker morto."""
+    response = jsonify({"error": erro})
+    response.status_code = 503
+    response.headers['Retry-After'] = '10'
+    return response
 
 
 @app.route('/report/pdf/<int:cliente_id>')
 def report_pdf(cliente_id: int):
     """Geração de PDF com WeasyPrint - Modo PDF"""
     year, months, branches = parse_request_params()
-    
+    fechado = periodo_fechado([year], months)
+
+    # Contexto já em cache e igual ao PDF que o cliente tem: 304 sem consultar o banco
+    versao = report_service.versao_em_cache(cliente_id, year=year, months=months, branches=branches)
+    nao_modificado = http_cache.validar(
+        versao and http_cache.etag('pdf', cliente_id, year, months, branches, versao), fechado
+    )
+    if nao_modificado is not None:
+        return nao_modificado
+
     contexto = report_service.montar_contexto(
         cliente_id=cliente_id, 
         year=year, 
         months=months, 
         branches=branches
     )
-    
-    html_string = render_template('relatorio_full.html', **contexto, mode='pdf')
 
-    css_base = os.path.join(app.static_folder, 'style.css')
-    css_pdf = os.path.join(app.static_folder, 'css', 'relatorio-pdf.css')
-    pdf_bytes = HTML(string=html_string, base_url=request.url_root).write_pdf(
-        stylesheets=[CSS(filename=css_base), CSS(filename=css_pdf)]
-    )
+    def gerar():
+        # Os 10 gráficos de uma vez, distribuídos entre os workers de gráficos
+        contexto['graficos'].renderizar_todos()
 
-    response = make_response(pdf_bytes)
-    response.headers['Content-Type'] = 'application/pdf'
-    filename = f"Relatorio_{cliente_id}_{year}.pdf"
-    response.headers['Content-Disposition'] = f"attachment; filename={filename}"
-    return response
+        html_string = render_template('relatorio_full.html', **contexto, mode='pdf')
+
+        try:
+            _, pdf_bytes = gerar_pdf(html_string)
+        except PdfPoolOcupadoError as e:
+            return pdf_indisponivel(str(e))
+        except FuturoTimeoutError:
+            return pdf_indisponivel(f"Geração de PDF excedeu {pdf_workers.timeout:.0f}s")
+        except BrokenProcessPool:
+            return pdf_indisponivel("Worker de PDF interrompido; tente novamente")
+
+        response = make_response(pdf_bytes)
+        response.headers['Content-Type'] = 'application/pdf'
+        filename = f"Relatorio_{cliente_id}_{year}.pdf"
+        response.headers['Content-Disposition'] = f"attachment; filename={filename}"
+        return response
+
+    # Mesmos dados que o cliente já tem: 304 sem gráficos, template nem WeasyPrint
+    etag = http_cache.etag('pdf', cliente_id, year, months, branches, contexto['versao_dados'])
+    return http_cache.responder(etag, gerar, fechado=fechado)
 
 
 @app.route('/report/pdf-batch')
@@ -202,41 +395,108 @@ def report_pdf_batch():
     except ValueError:
         return jsonify({"error": "Parâmetro 'ids' inválido"}), 400
 
-    import zipfile
-    buf = io.BytesIO()
-    with zipfile.ZipFile(buf, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
-        for cid in ids:
-            contexto = report_service.montar_contexto(
-                cliente_id=cid, 
-                year=year, 
-                months=months, 
-                branches=branches
-            )
-            html_string = render_template('relatorio_full.html', **contexto, mode='pdf')
-            css_base = os.path.join(app.static_folder, 'style.css')
-            css_pdf = os.path.join(app.static_folder, 'css', 'relatorio-pdf.css')
-            pdf_bytes = HTML(string=html_string, base_url=request.url_root).write_pdf(
-                stylesheets=[CSS(filename=css_base), CSS(filename=css_pdf)]
+    base_url = request.url_root
+
+    if request.args.get('async') == '1':
+        # Lote roda em background; o cliente acompanha por /api/jobs/<id>
+        def executar(job_id, progresso):
+            caminho = job_queue.caminho_resultado(job_id)
+            parcial = caminho + '.part'
+            try:
+                with open(parcial, 'wb') as f:
+                    for pedaco in zip_em_stream(entradas_lote(ids, year, months, branches, base_url, progresso)):
+                        f.write(pedaco)
+                os.replace(parcial, caminho)
+            except BaseException:
+                # Job em erro não tem 'arquivo': a limpeza da fila nunca acharia o .part
+                try:
+                    os.remove(parcial)
+                except OSError:
+                    pass
+                raise
+            return caminho
+
+        try:
+            job_id = job_queue.enfileirar(
+                'pdf-batch',
+                {"ids": ids, "year": year, "months": months, "branches": branches},
+                total=len(ids),
+                executar=executar,
             )
-            filename = f"RPS_Relatorio_{cid}_{year}.pdf"
-            zf.writestr(filename, pdf_bytes)
+        except FilaCheiaError as e:
+            return jsonify({"error": str(e)}), 503
+
+        return jsonify({
+            "job_id": job_id,
+            "status_url": url_for('api_job_status', job_id=job_id),
+            "download_url": url_for('api_job_download', job_id=job_id),
+        }), 202
 
-    buf.seek(0)
     zip_name = f"RPS_Relatorios_{year}.zip"
-    return send_file(buf, as_attachment=True, download_name=zip_name, mimetype='application/zip')
+    entradas = entradas_lote(ids, year, months, branches, base_url)
+    response = Response(stream_with_context(zip_em_stream(entradas)), mimetype='application/zip')
+    response.headers['Content-Disposition'] = f"attachment; filename={zip_name}"
+    return response
+
+
+def entradas_lote(ids, year, months, branches, base_url, progresso=None):
+    """Entradas (nome, bytes) do ZIP do lote, na ordem em que os PDFs ficam prontos."""
+    erros = []
+    concluidos = 0
+    for resultado in batch_service.gerar(ids, year, months, branches, base_url=base_url):
+        if resultado.erro:
+            erros.append({"cliente_id": resultado.cliente_id, "erro": resultado.erro})
+        else:
+            concluidos += 1
+            yield f"RPS_Relatorio_{resultado.cliente_id}_{year}.pdf", resultado.pdf_bytes
+        if progresso:
+            progresso(concluidos, len(erros))
+
+    if erros:
+        manifesto = json.dumps({"total": len(erros), "erros": erros}, ensure_ascii=False, indent=2)
+        yield "erros.json", manifesto.encode('utf-8')
+
+
+@app.route('/api/jobs/<job_id>')
+def api_job_status(job_id: str):
+    """Andamento de um job assíncrono"""
+    job = job_queue.obter(job_id)
+    if job is None:
+        return jsonify({"error": "Job não encontrado"}), 404
+    job.pop('arquivo', None)
+    if job['status'] == 'concluido':
+        job['download_url'] = url_for('api_job_download', job_id=job_id)
+    return jsonify(job)
+
+
+@app.route('/api/jobs/<job_id>/download')
+def api_job_download(job_id: str):
+    """Download do resultado de um job concluído"""
+    job = job_queue.obter(job_id)
+    if job is None:
+        return jsonify({"error": "Job não encontrado"}), 404
+    if job['status'] != 'concluido' or not job.get('arquivo') or not os.path.exists(job['arquivo']):
+        return jsonify({"error": "Resultado ainda não disponível", "status": job['status']}), 409
+
+    year = job['params'].get('year', '')
+    return send_file(job['arquivo'], as_attachment=True,
+                     download_name=f"RPS_Relatorios_{year}.zip", mimetype='application/zip')
 
 
 @app.route('/api/clientes')
 def api_clientes():
-    """API REST para listar clientes"""
-    empresas = data_provider.listar_clientes()
+    """API REST para listar clientes (?q= busca por código/nome/fantasia, ?limite= máximo)"""
+    empresas = client_directory.buscar(
+        (request.args.get('q') or '').strip() or None,
+        limite=request.args.get('limite', type=int),
+    )
     return jsonify({
         "total": len(empresas),
         "clientes": [
             {
                 "codigo": empresa['codigo'],
                 "nome": empresa.get('nome', ''),
-                "fantasia": empresa.get('fantaisa', '')
+                "fantasia": empresa.get('fantasia', '')
             }
             for empresa in empresas
         ]
@@ -247,51 +507,133 @@ def api_clientes():
 def api_branches(cliente_id: int):
     """API REST para listar filiais de um cliente"""
     filiais = data_provider.listar_filiais(cliente_id)
-    return jsonify([
+    return http_cache.responder(None, lambda: jsonify([
         {
             "codigo": filial['codigo'],
             "nome": filial.get('nome', ''),
             "fantasia": filial.get('fantasia', '')
         }
         for filial in filiais
-    ])
+    ]))
 
 
 @app.route('/api/balancete/<int:cliente_id>')
 def api_balancete(cliente_id: int):
-    """API REST para retornar dados do balancete contábil"""
+    """
+    API REST para retornar dados do balancete contábil.
+    ?formato=json (padrão), ndjson ou colunas; a resposta sai em stream direto
+    do cursor, comprimida com gzip/br quando o cliente aceita.
+    ?group_by=filial (padrão), empresa ou grupo e ?level=N (profundidade do
+    plano de contas) consolidam no servidor; level não vale com group_by=grupo.
+    """
     year, months, branches = parse_request_params()
-    
-    balancete = data_provider.obter_balancete(
-        cliente_id=cliente_id,
-        anos=[year],
-        meses=months,
-        filiais=branches
-    )
-    
-    return jsonify({
-        "total": len(balancete),
-        "dados": balancete
-    })
+    formato = request.args.get('formato', 'json')
+    if formato not in FORMATOS:
+        return jsonify({"error": f"formato deve ser um de: {', '.join(FORMATOS)}"}), 400
+    agrupar_por = request.args.get('group_by', 'filial')
+    if agrupar_por not in AGRUPAMENTOS:
+        return jsonify({"error": f"group_by deve ser um de: {', '.join(AGRUPAMENTOS)}"}), 400
+    nivel = request.args.get('level', type=int)
+    if nivel is not None and nivel < 1:
+        return jsonify({"error": "level deve ser um inteiro >= 1"}), 400
+    if nivel is not None and agrupar_por == 'grupo':
+        return jsonify({"error": "level não se aplica a group_by=grupo (o grupo já é o 1º nível)"}), 400
+    codificacao = codificacao_aceita(request.accept_encodings)
+
+    def gerar():
+        lotes = data_provider.iterar_balancete(
+            cliente_id=cliente_id,
+            anos=[year],
+            meses=months,
+            filiais=branches,
+            tamanho_lote=BALANCETE_LINHAS_POR_LOTE,
+            agrupar_por=agrupar_por,
+            nivel=nivel
+        )
+        corpo = linhas_em_stream(lotes, colunas_balancete(agrupar_por), formato)
+        response = Response(
+            stream_with_context(comprimir_stream(corpo, codificacao)),
+            mimetype='application/json' if formato == 'json' else 'application/x-ndjson'
+        )
+        if codificacao:
+            response.headers['Content-Encoding'] = codificacao
+        return response
+
+    # Sem ETag e com no-cache: o stream vem direto do Firebird e não há versão barata dos
+    # lançamentos (a assinatura da base de saldos pode estar atrasada em relação a eles).
+    return http_cache.responder(None, gerar, vary='Accept-Encoding')
 
 
 @app.route('/api/preview/<int:cliente_id>')
 def api_preview(cliente_id: int):
     """API para prévia rápida dos KPIs de um cliente"""
     year, months, branches = parse_request_params()
-    
+    fechado = periodo_fechado([year], months)
+
+    versao = report_service.versao_em_cache(cliente_id, year=year, months=months, branches=branches)
+    nao_modificado = http_cache.validar(
+        versao and http_cache.etag('preview', cliente_id, year, months, branches, versao), fechado
+    )
+    if nao_modificado is not None:
+        return nao_modificado
+
     contexto = report_service.montar_contexto(
         cliente_id=cliente_id, 
         year=year, 
         months=months, 
-        branches=branches
+        branches=branches,
+        incluir_graficos=False
     )
-    
-    return jsonify({
+
+    etag = http_cache.etag('preview', cliente_id, year, months, branches, contexto['versao_dados'])
+    return http_cache.responder(etag, lambda: jsonify({
         "cliente_id": cliente_id,
         "periodo": contexto['dados']['periodo'],
         "kpis": contexto['dados']['kpis'],
         "indicadores": contexto['dados']['indicadores']
+    }), fechado=fechado)
+
+
+def invalidacao_autorizada() -> bool:
+    """Token de CONTEXT_CACHE_TOKEN no X-Cache-Token ou, sem token configurado, requisição local."""
+    if CONTEXT_CACHE_TOKEN:
+        return hmac.compare_digest(
+            request.headers.get('X-Cache-Token', '').encode('utf-8'), CONTEXT_CACHE_TOKEN.encode('utf-8')
+        )
+    return request.remote_addr in ('127.0.0.1', '::1')
+
+
+@app.route('/api/cache/invalidate', methods=['POST'])
+def api_cache_invalidate():
+    """Invalida o cache de contextos (de um cliente via ?cliente_id= ou inteiro)"""
+    if not invalidacao_autorizada():
+        return jsonify({"error": "Invalidação do cache não autorizada"}), 403
+    cliente_id = request.args.get('cliente_id', type=int)
+    removidos = context_cache.invalidar(cliente_id)
+    return jsonify({
+        "cliente_id": cliente_id,
+        "removidos": removidos
+    })
+
+
+@app.route('/api/clientes/atualizar', methods=['POST'])
+def api_clientes_atualizar():
+    """Recarrega o cadastro de clientes em memória"""
+    return jsonify({"clientes": client_directory.atualizar()})
+
+
+@app.route('/api/stats')
+def api_stats():
+    """Estatísticas internas (pool de conexões e caches)"""
+    return jsonify({
+        "pool": data_provider.pool_stats(),
+        "context_cache": context_cache.stats(),
+        "pdf_cache": pdf_cache.stats(),
+        "pdf_workers": pdf_workers.stats(),
+        "chart_cache": chart_service.cache_stats(),
+        "saldo_store": data_provider.saldo_store.stats() if data_provider.saldo_store else None,
+        "clientes": client_directory.stats(),
+        "jobs": job_queue.stats()
     })
 
 
@@ -299,7 +641,7 @@ def api_preview(cliente_id: int):
 def serve_img(filename):
     """Servir imagens da pasta img"""
     img_folder = os.path.join(os.path.dirname(__file__), 'img')
-    return send_file(os.path.join(img_folder, filename), mimetype='image/png')
+    return send_from_directory(img_folder, filename, mimetype='image/png', max_age=HTTP_STATIC_MAX_AGE)
 
 
 @app.route('/relatorio/<int:cliente_id>')
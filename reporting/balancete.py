@@ -0,0 +1,118 @@
+from __future__ import annotations
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .ledger import LedgerFrame, mapear_distintos
+
+
+# Valores de group_by em /api/balancete
+AGRUPAMENTOS = ('filial', 'empresa', 'grupo')
+
+EMPRESA = ('cod_empresa', 'nome_empresa')
+FILIAL = ('cod_filial', 'nome_filial', 'nome_fantasia_filial')
+CONTA = ('nome_conta', 'tipo_conta', 'natureza', 'cod_grupo')
+SOMAS = ('saldo_inicial', 'debito', 'credito', 'saldo')
+
+
+def nivel_conta(codigo: str) -> int:
+    """Profundidade da conta na máscara do plano ('1.2.03.10' -> 4)."""
+    return codigo.count('.') + 1 if codigo else 0
+
+
+def conta_no_nivel(codigo: str, nivel: int) -> str:
+    """Código da conta-mãe no `nivel` ('1.2.03.10', 2 -> '1.2')."""
+    return '.'.join(codigo.split('.')[:nivel])
+
+
+def colunas_balancete(agrupar_por: str = 'filial') -> Tuple[str, ...]:
+    """Colunas de cada linha do balancete agregado, na ordem do formato colunar."""
+    if agrupar_por == 'grupo':
+        return EMPRESA + ('cod_grupo', 'nome_grupo') + SOMAS
+    filial = FILIAL if agrupar_por == 'filial' else ()
+    return EMPRESA + filial + ('cod_conta_contabil',) + CONTA + SOMAS
+
+
+def _arredondar(frame: LedgerFrame) -> LedgerFrame:
+    # Valores são DECIMAL(15, 2): tira o resíduo das somas em float
+    frame.df[list(SOMAS)] = frame.df[list(SOMAS)].round(2)
+    return frame
+
+
+def _ate_nivel(frame: LedgerFrame, chaves: Tuple[str, ...], nivel: int) -> LedgerFrame:
+    """
+    Contas até a profundidade `nivel`, cada uma com a soma das analíticas
+    abaixo dela (ou dela mesma, se for analítica). As sintéticas do banco só
+    emprestam nome, tipo e natureza: somar as duas contaria o valor em dobro.
+    """
+    df = frame.df
+    codigos = df['cod_conta_contabil'].to_numpy(dtype=object)
+    profundidade = mapear_distintos(codigos, nivel_conta).astype(np.int64)
+    analitica = (df['tipo_conta'] != 'Sintetica').to_numpy(dtype=bool)
+
+    partes = []
+    for k in range(1, nivel + 1):
+        selecao = analitica & (profundidade >= k)
+        parte = df.loc[selecao, list(chaves) + ['natureza', 'cod_grupo'] + list(SOMAS)].copy()
+        parte['cod_conta_contabil'] = mapear_distintos(codigos[selecao], lambda c: conta_no_nivel(c, k))
+        partes.append(parte)
+    contas = LedgerFrame(pd.concat(partes, ignore_index=True)).agregar(
+        ('cod_conta_contabil',) + chaves, ('natureza', 'cod_grupo'), SOMAS
+    ).df
+
+    # Nome e tipo da própria conta quando ela está no balancete; senão é uma sintética sem saldo próprio
+    primeiras = df.drop_duplicates('cod_conta_contabil')
+    codigos_presentes = primeiras['cod_conta_contabil'].to_numpy(dtype=object)
+
+    def da_conta(coluna: str) -> dict:
+        return dict(zip(codigos_presentes, primeiras[coluna].to_numpy(dtype=object)))
+
+    codigo = contas['cod_conta_contabil']
+    contas['nome_conta'] = codigo.map(da_conta('nome_conta')).fillna('')
+    contas['tipo_conta'] = codigo.map(da_conta('tipo_conta')).fillna('Sintetica')
+    contas['natureza'] = codigo.map(da_conta('natureza')).fillna(contas['natureza'].astype(object))
+    return LedgerFrame(contas)
+
+
+def agregar_balancete(
+    lotes: Iterable[LedgerFrame],
+    agrupar_por: str = 'empresa',
+    nivel: Optional[int] = None,
+) -> LedgerFrame:
+    """
+    Balancete por `agrupar_por`, a partir dos lotes por filial e conta:
+
+    - filial: uma linha por filial e conta (o detalhe do banco)
+    - empresa: uma linha por conta, somando as filiais
+    - grupo: uma linha por grupo (1º dígito da conta), somando as analíticas
+
+    `nivel` limita as contas à profundidade N do plano (códigos com máscara,
+    '1.2.03'), consolidando as analíticas abaixo dela. O modo grupo já é o
+    1º nível e não aceita `nivel` (ValueError). No modo empresa cada lote já é
+    reduzido por conta ao chegar, então a memória fica no número de contas e
+    não no de linhas por filial.
+    """
+    if agrupar_por == 'grupo' and nivel is not None:
+        raise ValueError("nivel não se aplica ao agrupamento por grupo")
+    chaves = EMPRESA + (FILIAL if agrupar_por == 'filial' else ())
+    por_conta = ('cod_conta_contabil',) + chaves
+    if agrupar_por == 'filial':
+        frame = LedgerFrame.concatenar(lotes, colunas_balancete('filial'))
+    else:
+        frame = LedgerFrame.concatenar(
+            (lote.agregar(por_conta, CONTA, SOMAS) for lote in lotes), colunas_balancete('empresa')
+        ).agregar(por_conta, CONTA, SOMAS)
+
+    if agrupar_por == 'grupo':
+        df = frame.df
+        analiticas = LedgerFrame(df[(df['tipo_conta'] != 'Sintetica').to_numpy(dtype=bool)])
+        grupos = analiticas.agregar(('cod_grupo',) + EMPRESA, (), SOMAS).df
+        # Nome do grupo = nome da conta de 1º nível ('1' -> ATIVO), se ela vier no balancete
+        nomes = dict(zip(df['cod_conta_contabil'].to_numpy(dtype=object), df['nome_conta'].to_numpy(dtype=object)))
+        grupos['nome_grupo'] = grupos['cod_grupo'].astype(object).map(nomes).fillna('')
+        frame = LedgerFrame(grupos)
+    elif nivel is not None and len(frame):
+        frame = _ate_nivel(frame, chaves, nivel)
+
+    return _arredondar(LedgerFrame(frame.df[list(colunas_balancete(agrupar_por))]))
@@ -0,0 +1,249 @@
+from __future__ import annotations
+import multiprocessing
+import os
+import threading
+import traceback
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+
+class ResultadoLote(NamedTuple):
+    cliente_id: int
+    pdf_bytes: Optional[bytes]
+    erro: Optional[str] = None
+
+
+# --- Estado de cada processo worker (montado uma vez no initializer) ---
+
+_worker: Dict[str, Any] = {}
+
+
+def _inicializar_worker(config: Dict[str, Any]) -> None:
+    """
+    Monta, uma vez por processo, os serviços usados na renderização:
+    provider com pool próprio, ChartService com o tema aplicado, app Flask só
+    para os templates e o PdfRenderer com folhas de estilo e fontes já parseadas.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+
+    from flask import Flask
+
+    from .chart_service import ChartService
+    from .context_cache import ContextCache, DiskCacheBackend
+    from .database_data_provider import DatabaseDataProvider
+    from .http_cache import versionar_estaticos
+    from .pdf_cache import PdfArtifactCache
+    from .pdf_renderer import PdfRenderer
+    from .report_service import ReportService
+
+    provider = DatabaseDataProvider(**config["provider"])
+    charts = ChartService(**config["cores"], **config.get("graficos", {}))
+
+    # Só o cache em disco é compartilhado com o processo web
+    context_cache = None
+    if config.get("context_cache_dir"):
+        context_cache = ContextCache(DiskCacheBackend(config["context_cache_dir"]))
+
+    # App mínimo: os templates só precisam das rotas 'static' e 'serve_img' para url_for
+    app = Flask("main", root_path=config["root_path"])
+    app.add_url_rule("/img/<path:filename>", endpoint="serve_img")
+    # Mesmas URLs versionadas do processo web: o HTML (e a chave do cache de PDFs) coincide
+    versionar_estaticos(app)
+
+    _worker.update(
+        app=app,
+        report_service=ReportService(provider, charts, context_cache),
+        pdf_renderer=PdfRenderer(**config["pdf_renderer"]),
+        pdf_cache=PdfArtifactCache(
+            config["pdf_cache_dir"],
+            arquivos_css=config["stylesheets"],
+            versao_template=config["pdf_template_version"],
+        ) if config.get("pdf_cache_dir") else None,
+    )
+
+
+def _renderizar_clientes(
+    cliente_ids: List[int],
+    year: int,
+    months: List[int],
+    branches: Optional[List[int]],
+    base_url: str,
+) -> List[Dict[str, Any]]:
+    """
+    Contextos de um bloco de clientes buscados em lote e, para cada um,
+    HTML -> PDF, dentro do worker. Falha de um cliente vira `erro` no item dele.
+    """
+    contextos = _worker["report_service"].montar_contextos_lote(
+        cliente_ids,
+        year=year,
+        months=months,
+        branches=branches
+    )
+    resultados = []
+    for cid in cliente_ids:
+        try:
+            resultados.append({"cliente_id": cid, **_renderizar_contexto(contextos[cid], base_url)})
+        except Exception as e:
+            traceback.print_exc()
+            resultados.append({"cliente_id": cid, "erro": f"{type(e).__name__}: {e}"})
+    return resultados
+
+
+def _renderizar_contexto(contexto: Dict[str, Any], base_url: str) -> Dict[str, Any]:
+    """Contexto -> HTML -> PDF de um cliente, dentro do worker."""
+    from flask import render_template
+
+    app = _worker["app"]
+    with app.test_request_context("/", base_url=base_url):
+        html_string = render_template("relatorio_full.html", **contexto, mode="pdf")
+
+    pdf_cache = _worker["pdf_cache"]
+    chave = pdf_cache.chave(html_string) if pdf_cache else None
+    if pdf_cache:
+        pdf_bytes = pdf_cache.get(chave)
+        if pdf_bytes is not None:
+            return {"chave": chave, "pdf": pdf_bytes, "cache": True}
+
+    pdf_bytes = _worker["pdf_renderer"].renderizar(html_string, base_url=base_url)
+    return {"chave": chave, "pdf": pdf_bytes, "cache": False}
+
+
+class BatchReportService:
+    """
+    Geração de PDFs em lote distribuída num ProcessPoolExecutor.
+
+    Cada worker mantém ChartService, provider e PdfRenderer aquecidos entre
+    clientes e lotes. Cada tarefa leva um bloco de até `clientes_por_tarefa`
+    clientes, cujos dados vêm do banco em poucas consultas (CODIGOEMPRESA IN
+    (...)) em vez de uma rodada por cliente. Os resultados saem na ordem em que
+    os blocos ficam prontos; falhas de um cliente viram ResultadoLote com `erro`
+    em vez de abortar o lote. Com max_workers=0 tudo roda em série no próprio processo.
+
+    Os workers renderizam os PDFs com o próprio PdfRenderer, sem passar pelo
+    PdfWorkerPool das requisições web: por isso o padrão é só
+    `MAX_WORKERS_PADRAO` processos, somados aos dos outros pools.
+    """
+
+    # Padrão de max_workers: lotes não devem disputar todos os núcleos com o tráfego web
+    MAX_WORKERS_PADRAO = 2
+
+    def __init__(
+        self,
+        config: Dict[str, Any],
+        max_workers: Optional[int] = None,
+        pdf_cache=None,
+        clientes_por_tarefa: int = 10,
+    ) -> None:
+        self.config = config
+        self.max_workers = (
+            min(self.MAX_WORKERS_PADRAO, os.cpu_count() or 1) if max_workers is None else max_workers
+        )
+        self.clientes_por_tarefa = max(1, clientes_por_tarefa)
+        # Cache do processo web: só ele grava o índice, os workers apenas leem
+        self.pdf_cache = pdf_cache
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _obter_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    # spawn: não herda threads/conexões do servidor web
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_inicializar_worker,
+                    initargs=(self.config,),
+                )
+            return self._executor
+
+    def _descartar_executor(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _blocos(self, ids: List[int]) -> List[List[int]]:
+        """Blocos de clientes por tarefa, pequenos o bastante para ocupar todos os workers."""
+        por_worker = -(-len(ids) // max(1, self.max_workers))
+        tamanho = max(1, min(self.clientes_por_tarefa, por_worker))
+        return [ids[i:i + tamanho] for i in range(0, len(ids), tamanho)]
+
+    def _registrar_pdf(self, resultado: Dict[str, Any]) -> None:
+        if self.pdf_cache is None or resultado["chave"] is None:
+            return
+        if resultado["cache"]:
+            self.pdf_cache.registrar_acesso(resultado["chave"], len(resultado["pdf"]))
+        else:
+            self.pdf_cache.put(resultado["chave"], resultado["pdf"])
+
+    def _resultados(self, resultados: List[Dict[str, Any]]) -> Iterator[ResultadoLote]:
+        for resultado in resultados:
+            if "erro" in resultado:
+                yield ResultadoLote(resultado["cliente_id"], None, resultado["erro"])
+                continue
+            self._registrar_pdf(resultado)
+            yield ResultadoLote(resultado["cliente_id"], resultado["pdf"])
+
+    def gerar(
+        self,
+        ids: List[int],
+        year: int,
+        months: List[int],
+        branches: Optional[List[int]],
+        base_url: str,
+    ) -> Iterator[ResultadoLote]:
+        """Gera os PDFs dos `ids`, entregando cada resultado assim que fica pronto."""
+        if self.max_workers <= 0:
+            yield from self._gerar_em_serie(ids, year, months, branches, base_url)
+            return
+
+        executor = self._obter_executor()
+        futuros: Dict[Future, List[int]] = {
+            executor.submit(_renderizar_clientes, bloco, year, months, branches, base_url): bloco
+            for bloco in self._blocos(ids)
+        }
+        try:
+            for futuro in as_completed(futuros):
+                bloco = futuros[futuro]
+                try:
+                    resultados = futuro.result()
+                except BrokenProcessPool as e:
+                    # Worker morreu (ex.: falta de memória): recria o pool no próximo lote
+                    self._descartar_executor()
+                    for cid in bloco:
+                        yield ResultadoLote(cid, None, f"Worker encerrado inesperadamente: {e}")
+                    continue
+                except Exception as e:
+                    for cid in bloco:
+                        yield ResultadoLote(cid, None, f"{type(e).__name__}: {e}")
+                    continue
+                yield from self._resultados(resultados)
+        finally:
+            # Consumidor desistiu (ex.: download cancelado): não renderiza o resto à toa
+            for futuro in futuros:
+                futuro.cancel()
+
+    def _gerar_em_serie(
+        self,
+        ids: List[int],
+        year: int,
+        months: List[int],
+        branches: Optional[List[int]],
+        base_url: str,
+    ) -> Iterator[ResultadoLote]:
+        if not _worker:
+            _inicializar_worker(self.config)
+        for bloco in self._blocos(ids):
+            try:
+                resultados = _renderizar_clientes(bloco, year, months, branches, base_url)
+            except Exception as e:
+                traceback.print_exc()
+                for cid in bloco:
+                    yield ResultadoLote(cid, None, f"{type(e).__name__}: {e}")
+                continue
+            yield from self._resultados(resultados)
+
+    def fechar(self) -> None:
+        self._descartar_executor()
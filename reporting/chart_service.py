@@ -1,45 +1,337 @@
 from __future__ import annotations
 import io
 import base64
-from typing import List, Sequence
+import functools
+import hashlib
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
 
-import matplotlib.pyplot as plt
+import matplotlib
+from cycler import cycler
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.patches import Circle
 from matplotlib.ticker import FuncFormatter
 import seaborn as sns
 import pandas as pd
 
+# rcParams é global no matplotlib: trocas temporárias (tema ao preparar uma
+# figura, opções de SVG ao salvar) passam por este lock
+_rc_lock = threading.RLock()
+
+
+def _normalizar_para_chave(valor: Any) -> Any:
+    """Converte argumentos de gráfico numa estrutura com repr estável para a chave do cache."""
+    if isinstance(valor, pd.DataFrame):
+        return ("df", tuple(map(str, valor.columns)), tuple(map(str, valor.index)), valor.to_numpy().tolist())
+    if isinstance(valor, pd.Series):
+        return ("serie", tuple(map(str, valor.index)), valor.tolist())
+    if isinstance(valor, (list, tuple)):
+        return tuple(_normalizar_para_chave(v) for v in valor)
+    if isinstance(valor, dict):
+        return tuple(sorted((k, _normalizar_para_chave(v)) for k, v in valor.items()))
+    if hasattr(valor, "tolist"):
+        # numpy arrays e escalares numpy
+        return _normalizar_para_chave(valor.tolist())
+    return valor
+
+
+def _memoizado(metodo):
+    """Reaproveita a imagem já renderizada para as mesmas entradas (ver ChartService._cache)."""
+    @functools.wraps(metodo)
+    def wrapper(self: "ChartService", *args, **kwargs) -> str:
+        if self.cache_max_bytes <= 0:
+            return metodo(self, *args, **kwargs)
+        chave = self._chave_cache(metodo.__name__, args, kwargs)
+        img = self._cache_get(chave)
+        if img is None:
+            img = metodo(self, *args, **kwargs)
+            self._cache_put(chave, img)
+        return img
+    return wrapper
+
+
+class FigurePool:
+    """
+    Figuras de um tamanho fixo, já com o tema aplicado, reaproveitadas entre gráficos.
+
+    Usa a API orientada a objetos (Figure + FigureCanvasAgg), sem o gerenciador
+    global de figuras do pyplot. Cada figura é emprestada a uma thread por vez;
+    ao ser devolvida, o eixo é limpo e ela volta para a lista de livres (até
+    `max_livres`; as excedentes são descartadas).
+    """
+
+    def __init__(self, figsize: Tuple[float, float], tema: Dict[str, Any], max_livres: int = 4) -> None:
+        self.figsize = figsize
+        self.tema = tema
+        self.max_livres = max_livres
+        self._livres: List[Tuple[Figure, Any]] = []
+        self._lock = threading.Lock()
+        self._stats = {"criadas": 0, "reutilizadas": 0}
+
+    def _criar(self) -> Tuple[Figure, Any]:
+        with _rc_lock, matplotlib.rc_context(self.tema):
+            fig = Figure(figsize=self.figsize)
+            FigureCanvasAgg(fig)
+            ax = fig.add_subplot()
+        return fig, ax
+
+    def _limpar(self, fig: Figure, ax) -> None:
+        with _rc_lock, matplotlib.rc_context(self.tema):
+            ax.clear()
+            ax.set_aspect("auto")
+            fig.legends.clear()
+            fig.texts.clear()
+
+    @contextmanager
+    def figura(self) -> Iterator[Tuple[Figure, Any]]:
+        with self._lock:
+            item = self._livres.pop() if self._livres else None
+            self._stats["reutilizadas" if item else "criadas"] += 1
+        if item is None:
+            item = self._criar()
+        try:
+            yield item
+        except BaseException:
+            # Figura em estado desconhecido: não volta para o pool
+            raise
+        else:
+            self._limpar(*item)
+            with self._lock:
+                if len(self._livres) < self.max_livres:
+                    self._livres.append(item)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "livres": len(self._livres)}
+
 
 class ChartService:
     """
     Serviço de gráficos independente de Flask/Templates.
     Retorna imagens em base64 para incorporação no HTML.
+
+    `formato` define a saída: "png" (rasterizado em `dpi`) ou "svg" (vetorial,
+    sem rasterização; bem menor no HTML e no PDF). `mime_type` dá o tipo para
+    o data URI no template.
+
+    As imagens ficam num cache LRU endereçado pelo conteúdo (tipo de gráfico,
+    rótulos, valores, cores e opções), limitado a `cache_max_bytes`: placeholders
+    e gráficos repetidos entre relatórios só são rasterizados uma vez.
+
+    As figuras vêm de um FigurePool por tamanho (7x3.5 e 4x4), então os
+    métodos podem ser chamados de várias threads ao mesmo tempo.
+
+    Com `processos` > 0, `renderizar_varios` distribui os gráficos de um
+    relatório num ProcessPoolExecutor cujos workers mantêm um ChartService
+    com o mesmo tema aquecido.
     """
-    def __init__(self, primary: str, secondary: str, tertiary: str, bg: str = "#fdfdfd") -> None:
+    FORMATOS = {"png": "image/png", "svg": "image/svg+xml"}
+    TAMANHOS = {"largo": (7, 3.5), "quadrado": (4, 4)}
+
+    def __init__(
+        self,
+        primary: str,
+        secondary: str,
+        tertiary: str,
+        bg: str = "#fdfdfd",
+        cache_max_bytes: int = 32 * 1024 * 1024,
+        formato: str = "png",
+        dpi: int = 150,
+        processos: int = 0
+    ) -> None:
+        if formato not in self.FORMATOS:
+            raise ValueError(f"Formato de gráfico inválido: {formato!r} (use {', '.join(self.FORMATOS)})")
         self.primary = primary
         self.secondary = secondary
         self.tertiary = tertiary
         self.bg = bg
-        sns.set_theme(
-            style="whitegrid",
-            rc={
-                "axes.edgecolor": "#e5e7eb",
-                "grid.color": "#e5e7eb",
-                "text.color": self.tertiary,
-                "axes.labelcolor": self.tertiary,
-                "xtick.color": self.tertiary,
-                "ytick.color": self.tertiary,
-                "figure.facecolor": self.bg,
-                "axes.facecolor": self.bg,
-            },
+        self.formato = formato
+        self.dpi = dpi
+        self.processos = processos
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self.cache_max_bytes = cache_max_bytes
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._cache_bytes = 0
+        self._cache_lock = threading.Lock()
+        self._cache_stats = {"hits": 0, "misses": 0, "evictions": 0}
+        rc = {
+            "axes.edgecolor": "#e5e7eb",
+            "grid.color": "#e5e7eb",
+            "text.color": self.tertiary,
+            "axes.labelcolor": self.tertiary,
+            "xtick.color": self.tertiary,
+            "ytick.color": self.tertiary,
+            "figure.facecolor": self.bg,
+            "axes.facecolor": self.bg,
+        }
+        # Tema do seaborn como dicionário de rcParams, aplicado a cada figura do pool
+        self._tema = {
+            **sns.plotting_context("notebook"),
+            **sns.axes_style("whitegrid"),
+            "axes.prop_cycle": cycler(color=sns.color_palette("deep")),
+            **rc,
+        }
+        # Também global: textos e legendas criados depois leem o rcParams atual
+        sns.set_theme(style="whitegrid", rc=rc)
+        self._pools = {nome: FigurePool(tamanho, self._tema) for nome, tamanho in self.TAMANHOS.items()}
+
+    def _chave_cache(self, metodo: str, args: tuple, kwargs: Dict[str, Any]) -> str:
+        # Tema, cores e formato entram na chave: o mesmo dado com outra paleta é outra imagem
+        entrada = (
+            metodo,
+            (self.primary, self.secondary, self.tertiary, self.bg, self.formato, self.dpi),
+            _normalizar_para_chave(args),
+            _normalizar_para_chave(kwargs),
         )
+        return hashlib.sha256(repr(entrada).encode("utf-8")).hexdigest()
+
+    def _cache_get(self, chave: str) -> Optional[str]:
+        with self._cache_lock:
+            img = self._cache.get(chave)
+            if img is None:
+                self._cache_stats["misses"] += 1
+                return None
+            self._cache.move_to_end(chave)
+            self._cache_stats["hits"] += 1
+            return img
+
+    def _cache_put(self, chave: str, img: str) -> None:
+        tamanho = len(img)
+        if tamanho > self.cache_max_bytes:
+            return
+        with self._cache_lock:
+            if chave in self._cache:
+                return
+            self._cache[chave] = img
+            self._cache_bytes += tamanho
+            while self._cache_bytes > self.cache_max_bytes:
+                _, removida = self._cache.popitem(last=False)
+                self._cache_bytes -= len(removida)
+                self._cache_stats["evictions"] += 1
+
+    def cache_stats(self) -> Dict[str, Any]:
+        with self._cache_lock:
+            stats = {
+                **self._cache_stats,
+                "entradas": len(self._cache),
+                "bytes": self._cache_bytes,
+                "max_bytes": self.cache_max_bytes,
+            }
+        stats["figuras"] = {nome: pool.stats() for nome, pool in self._pools.items()}
+        return stats
+
+    # --- Renderização em processos ---
+
+    def _config_worker(self) -> Dict[str, Any]:
+        # O cache fica só neste processo; os workers apenas desenham
+        return {
+            "primary": self.primary,
+            "secondary": self.secondary,
+            "tertiary": self.tertiary,
+            "bg": self.bg,
+            "formato": self.formato,
+            "dpi": self.dpi,
+            "cache_max_bytes": 0,
+        }
+
+    def _obter_executor(self) -> ProcessPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processos,
+                    # spawn: não herda threads/conexões do servidor web
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_inicializar_worker_graficos,
+                    initargs=(self._config_worker(),),
+                )
+            return self._executor
+
+    def _descartar_executor(self) -> None:
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _renderizar_sem_cache(self, metodo: str, args: tuple, kwargs: Dict[str, Any]) -> str:
+        return getattr(type(self), metodo).__wrapped__(self, *args, **kwargs)
+
+    def renderizar_varios(self, specs: Dict[str, "ChartSpec"]) -> Dict[str, str]:
+        """
+        Renderiza várias ChartSpecs de uma vez e retorna {nome: base64}.
+        O que já está no cache não é redesenhado; o resto vai para o pool de
+        processos (ou roda aqui mesmo, com processos=0 ou um gráfico só).
+        """
+        resultado: Dict[str, str] = {}
+        pendentes: Dict[str, Tuple[str, "ChartSpec"]] = {}
+        for nome, (metodo, args, kwargs) in specs.items():
+            chave = self._chave_cache(metodo, args, kwargs) if self.cache_max_bytes > 0 else ""
+            img = self._cache_get(chave) if chave else None
+            if img is not None:
+                resultado[nome] = img
+            else:
+                pendentes[nome] = (chave, (metodo, args, kwargs))
+
+        futuros = {}
+        if self.processos > 0 and len(pendentes) > 1:
+            try:
+                executor = self._obter_executor()
+                futuros = {
+                    nome: executor.submit(_renderizar_spec, *spec)
+                    for nome, (_, spec) in pendentes.items()
+                }
+            except Exception as e:
+                print(f"Pool de gráficos indisponível, renderizando no processo: {e}")
+                self._descartar_executor()
+
+        for nome, (chave, spec) in pendentes.items():
+            img = None
+            if nome in futuros:
+                try:
+                    img = futuros[nome].result()
+                except BrokenProcessPool as e:
+                    # Worker morreu: recria o pool na próxima vez e desenha aqui
+                    print(f"Worker de gráficos encerrado inesperadamente: {e}")
+                    self._descartar_executor()
+                except Exception as e:
+                    print(f"Erro ao renderizar gráfico '{nome}' no worker: {e}")
+            if img is None:
+                img = self._renderizar_sem_cache(*spec)
+            if chave:
+                self._cache_put(chave, img)
+            resultado[nome] = img
+        return resultado
+
+    def fechar(self) -> None:
+        """Encerra o pool de processos de renderização, se houver."""
+        self._descartar_executor()
+
+    def _figura(self, tamanho: str = "largo"):
+        """Empresta (fig, ax) do pool do tamanho pedido; use com `with`."""
+        return self._pools[tamanho].figura()
+
+    @property
+    def mime_type(self) -> str:
+        return self.FORMATOS[self.formato]
 
     def _fig_to_b64(self, fig) -> str:
         buf = io.BytesIO()
-        fig.savefig(buf, format="png", bbox_inches="tight", dpi=150, transparent=True)
+        if self.formato == "svg":
+            # Sem data e com ids fixos: o mesmo gráfico gera sempre o mesmo SVG
+            # (e o HTML, logo a chave do cache de PDFs, não muda à toa)
+            # fonttype "none": texto fica como <text> (o WeasyPrint desenha), não como curvas
+            with _rc_lock, matplotlib.rc_context({"svg.hashsalt": "chart", "svg.fonttype": "none"}):
+                fig.savefig(buf, format="svg", bbox_inches="tight", transparent=True, metadata={"Date": None})
+        else:
+            fig.savefig(buf, format="png", bbox_inches="tight", dpi=self.dpi, transparent=True)
         buf.seek(0)
-        img = base64.b64encode(buf.read()).decode("utf-8")
-        plt.close(fig)
-        return img
+        return base64.b64encode(buf.read()).decode("utf-8")
 
     @staticmethod
     def _format_compact_value(val: float, _pos=None) -> str:
@@ -61,61 +353,62 @@ class ChartService:
         txt = f"{num:.2f}".rstrip("0").rstrip(".")
         return f"{txt}{suffix}"
 
+    @_memoizado
     def barras_empilhadas(self, df: pd.DataFrame, cores: List[str], width: float = 0.6, legend_cols: int = 3) -> str:
-        fig, ax = plt.subplots(figsize=(7, 3.5))
-        
-        # Validação de dados vazios
-        if df.empty or df.sum().sum() == 0:
-            self._render_placeholdear(ax)
-            return self._fig_to_b64(fig)
+        with self._figura() as (fig, ax):
+            # Validação de dados vazios
+            if df.empty or df.sum().sum() == 0:
+                self._render_placeholder(ax)
+                return self._fig_to_b64(fig)
 
-        df.plot(kind="bar", stacked=True, ax=ax, color=cores, width=width)
-        ax.legend(loc="upper center", bbox_to_anchor=(0.5, -0.25), ncol=legend_cols, frameon=False)
-        sns.despine(left=True)
-        return self._fig_to_b64(fig)
+            df.plot(kind="bar", stacked=True, ax=ax, color=cores, width=width)
+            ax.legend(loc="upper center", bbox_to_anchor=(0.5, -0.25), ncol=legend_cols, frameon=False)
+            sns.despine(ax=ax, left=True)
+            return self._fig_to_b64(fig)
         
+    @_memoizado
     def barras_horizontais(self, labels: List[str], values: List[float], color: str, title: str = "") -> str:
         """Gráfico de barras horizontais simples para rankings (Top 5)"""
-        fig, ax = plt.subplots(figsize=(7, 3.5))
-        
-        # Sanitização e Validação
-        clean_values = [v if pd.notna(v) else 0.0 for v in values]
-        if sum(clean_values) == 0:
-            self._render_placeholder(ax, title)
-            return self._fig_to_b64(fig)
+        with self._figura() as (fig, ax):
+            # Sanitização e Validação
+            clean_values = [v if pd.notna(v) else 0.0 for v in values]
+            if sum(clean_values) == 0:
+                self._render_placeholder(ax, title)
+                return self._fig_to_b64(fig)
 
-        sns.barplot(x=clean_values, y=labels, color=color, ax=ax, orient='h')
-        if title:
-            ax.set_title(title, fontsize=10, pad=10)
-        sns.despine(left=True, bottom=True)
-        return self._fig_to_b64(fig)
+            sns.barplot(x=clean_values, y=labels, color=color, ax=ax, orient='h')
+            if title:
+                ax.set_title(title, fontsize=10, pad=10)
+            sns.despine(ax=ax, left=True, bottom=True)
+            return self._fig_to_b64(fig)
 
+    @_memoizado
     def area_empilhada(self, df: pd.DataFrame, cores: List[str], alpha: float = 0.8, legend_cols: int = 2) -> str:
-        fig, ax = plt.subplots(figsize=(7, 3.5))
-        
-        if df.empty or df.sum().sum() == 0:
-            self._render_placeholder(ax)
+        with self._figura() as (fig, ax):
+            if df.empty or df.sum().sum() == 0:
+                self._render_placeholder(ax)
+                return self._fig_to_b64(fig)
+                
+            for i, col in enumerate(df.columns):
+                ax.fill_between(df.index, df[col], step=None, alpha=alpha, color=cores[i], label=col)
+            ax.legend(loc="upper center", bbox_to_anchor=(0.5, -0.15), ncol=legend_cols, frameon=False)
+            sns.despine(ax=ax, left=True)
             return self._fig_to_b64(fig)
-            
-        for i, col in enumerate(df.columns):
-            ax.fill_between(df.index, df[col], step=None, alpha=alpha, color=cores[i], label=col)
-        ax.legend(loc="upper center", bbox_to_anchor=(0.5, -0.15), ncol=legend_cols, frameon=False)
-        sns.despine(left=True)
-        return self._fig_to_b64(fig)
 
+    @_memoizado
     def linhas_duplas(self, x: Sequence, y1: Sequence[float], y2: Sequence[float], label1: str, label2: str) -> str:
-        fig, ax = plt.subplots(figsize=(7, 3.5))
-        
-        # Sanitização simples (linhas aceitam 0, mas evitamos NaNs que quebram plots)
-        y1 = [v if pd.notna(v) else 0.0 for v in y1]
-        y2 = [v if pd.notna(v) else 0.0 for v in y2]
-
-        sns.lineplot(x=x, y=y1, marker="o", label=label1, ax=ax, color=self.tertiary)
-        sns.lineplot(x=x, y=y2, marker="o", linestyle="--", label=label2, ax=ax, color=self.secondary)
-        ax.legend(frameon=False)
-        sns.despine()
-        return self._fig_to_b64(fig)
+        with self._figura() as (fig, ax):
+            # Sanitização simples (linhas aceitam 0, mas evitamos NaNs que quebram plots)
+            y1 = [v if pd.notna(v) else 0.0 for v in y1]
+            y2 = [v if pd.notna(v) else 0.0 for v in y2]
+
+            sns.lineplot(x=x, y=y1, marker="o", label=label1, ax=ax, color=self.tertiary)
+            sns.lineplot(x=x, y=y2, marker="o", linestyle="--", label=label2, ax=ax, color=self.secondary)
+            ax.legend(frameon=False)
+            sns.despine(ax=ax)
+            return self._fig_to_b64(fig)
         
+    @_memoizado
     def linhas_simples(
         self,
         x: Sequence,
@@ -125,60 +418,117 @@ class ChartService:
         compact_y: bool = False
     ) -> str:
         """Linha simples para evolução"""
-        fig, ax = plt.subplots(figsize=(7, 3.5))
-        
-        y = [round((v if pd.notna(v) else 0.0), 2) for v in y]
-        
-        sns.lineplot(x=x, y=y, marker="o", label=label, ax=ax, color=color or self.primary)
-        if compact_y:
-            ax.yaxis.set_major_formatter(FuncFormatter(self._format_compact_value))
-        ax.legend(frameon=False)
-        sns.despine()
-        return self._fig_to_b64(fig)
+        with self._figura() as (fig, ax):
+            y = [round((v if pd.notna(v) else 0.0), 2) for v in y]
+            
+            sns.lineplot(x=x, y=y, marker="o", label=label, ax=ax, color=color or self.primary)
+            if compact_y:
+                ax.yaxis.set_major_formatter(FuncFormatter(self._format_compact_value))
+            ax.legend(frameon=False)
+            sns.despine(ax=ax)
+            return self._fig_to_b64(fig)
 
+    @_memoizado
     def pizza(self, labels: List[str], values: List[float], donut: bool = False) -> str:
-        fig, ax = plt.subplots(figsize=(4, 4))
-        
-        # Sanitização Crítica: Converter NaNs para 0 e verificar soma
-        clean_values = [v if pd.notna(v) and v >= 0 else 0.0 for v in values]
-        total = sum(clean_values)
-        
-        # Se total for 0, desenha placeholder para evitar erro de divisão por zero (NaN)
-        if total <= 0:
-            ax.text(0, 0, "Sem dados", ha='center', va='center', color=self.tertiary, fontsize=9)
-            ax.axis('off')
-            # Círculo cinza claro para indicar espaço do gráfico
-            circle = plt.Circle((0, 0), 1, color='#f5f5f5')
-            ax.add_artist(circle)
+        with self._figura("quadrado") as (fig, ax):
+            # Sanitização Crítica: Converter NaNs para 0 e verificar soma
+            clean_values = [v if pd.notna(v) and v >= 0 else 0.0 for v in values]
+            total = sum(clean_values)
+            
+            # Se total for 0, desenha placeholder para evitar erro de divisão por zero (NaN)
+            if total <= 0:
+                ax.text(0, 0, "Sem dados", ha='center', va='center', color=self.tertiary, fontsize=9)
+                ax.axis('off')
+                # Círculo cinza claro para indicar espaço do gráfico
+                circle = Circle((0, 0), 1, color='#f5f5f5')
+                ax.add_artist(circle)
+                if donut:
+                    center = Circle((0, 0), 0.70, fc="white")
+                    ax.add_artist(center)
+                
+                # Ajustar limites para garantir que o círculo apareça
+                ax.set_xlim(-1.1, 1.1)
+                ax.set_ylim(-1.1, 1.1)
+                ax.set_aspect('equal')
+                
+                return self._fig_to_b64(fig)
+
+            colors = [self.primary, self.secondary, "#d8e2d8", self.tertiary]
+            wedges, texts, autotexts = ax.pie(
+                clean_values,
+                labels=labels,
+                autopct="%1.0f%%",
+                startangle=90,
+                colors=colors[: len(clean_values)],
+                textprops={"fontsize": 9, "color": self.tertiary},
+            )
             if donut:
-                center = plt.Circle((0, 0), 0.70, fc="white")
+                center = Circle((0, 0), 0.70, fc="white")
                 ax.add_artist(center)
-            
-            # Ajustar limites para garantir que o círculo apareça
-            ax.set_xlim(-1.1, 1.1)
-            ax.set_ylim(-1.1, 1.1)
-            ax.set_aspect('equal')
-            
+                
             return self._fig_to_b64(fig)
 
-        colors = [self.primary, self.secondary, "#d8e2d8", self.tertiary]
-        wedges, texts, autotexts = ax.pie(
-            clean_values,
-            labels=labels,
-            autopct="%1.0f%%",
-            startangle=90,
-            colors=colors[: len(clean_values)],
-            textprops={"fontsize": 9, "color": self.tertiary},
-        )
-        if donut:
-            center = plt.Circle((0, 0), 0.70, fc="white")
-            fig.gca().add_artist(center)
-            
-        return self._fig_to_b64(fig)
-
     def _render_placeholder(self, ax, title: str = ""):
         """Helper interno para renderizar estado vazio"""
         ax.text(0.5, 0.5, "Sem dados disponíveis", ha='center', va='center', color=self.tertiary)
         ax.axis('off')
         if title:
-            ax.set_title(title, fontsize=10, pad=10)
\ No newline at end of file
+            ax.set_title(title, fontsize=10, pad=10)
+
+
+# (nome do método do ChartService, args, kwargs)
+ChartSpec = Tuple[str, Tuple[Any, ...], Dict[str, Any]]
+
+
+# --- Estado de cada processo worker de gráficos (montado uma vez no initializer) ---
+
+_worker_charts: Optional[ChartService] = None
+
+
+def _inicializar_worker_graficos(config: Dict[str, Any]) -> None:
+    global _worker_charts
+    _worker_charts = ChartService(**config)
+
+
+def _renderizar_spec(metodo: str, args: tuple, kwargs: Dict[str, Any]) -> str:
+    return getattr(_worker_charts, metodo)(*args, **kwargs)
+
+
+class LazyCharts(Mapping):
+    """
+    Dicionário de gráficos que só renderiza um gráfico quando ele é lido.
+    Cada entrada é uma ChartSpec; o base64 resultante fica guardado para
+    leituras seguintes. No template, `graficos.nome` funciona como num dict.
+    """
+
+    def __init__(self, charts: ChartService, specs: Dict[str, ChartSpec]) -> None:
+        self._charts = charts
+        self._specs = specs
+        self._renderizados: Dict[str, str] = {}
+
+    def __getitem__(self, nome: str) -> str:
+        if nome not in self._renderizados:
+            metodo, args, kwargs = self._specs[nome]
+            self._renderizados[nome] = getattr(self._charts, metodo)(*args, **kwargs)
+        return self._renderizados[nome]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._specs)
+
+    def __len__(self) -> int:
+        return len(self._specs)
+
+    @property
+    def specs(self) -> Dict[str, ChartSpec]:
+        return self._specs
+
+    def renderizados(self) -> List[str]:
+        """Nomes dos gráficos que já foram renderizados."""
+        return list(self._renderizados)
+
+    def renderizar_todos(self) -> "LazyCharts":
+        """Renderiza de uma vez (em paralelo, se o ChartService tiver processos) o que faltar."""
+        pendentes = {nome: spec for nome, spec in self._specs.items() if nome not in self._renderizados}
+        if pendentes:
+            self._renderizados.update(self._charts.renderizar_varios(pendentes))
+        return self
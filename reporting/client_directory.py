@@ -0,0 +1,203 @@
+from __future__ import annotations
+import heapq
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .data_provider import DataProvider
+
+
+def normalizar_texto(texto: Any) -> str:
+    """Minúsculas e sem acentos ('São João' -> 'sao joao'), para busca."""
+    decomposto = unicodedata.normalize("NFKD", str(texto or "").strip().lower())
+    return "".join(c for c in decomposto if not unicodedata.combining(c))
+
+
+# Separa código, nome e fantasia no texto indexado: nenhuma busca casa através dele
+_SEPARADOR = "\x00"
+# Tamanho máximo dos n-gramas indexados (1 e 2 atendem buscas curtas)
+_N = 3
+
+
+class _Indice:
+    """Foto imutável do cadastro: clientes, textos normalizados, n-gramas e ordenações."""
+
+    def __init__(self, clientes: List[Dict[str, Any]]) -> None:
+        self.clientes = clientes
+        self.codigos = [int(c["codigo"]) for c in clientes]
+        self.textos = [
+            _SEPARADOR.join(
+                normalizar_texto(c.get(campo)) for campo in ("codigo", "nome", "fantasia")
+            )
+            for c in clientes
+        ]
+        self.gramas: Dict[str, Set[int]] = {}
+        for posicao, texto in enumerate(self.textos):
+            for n in range(1, _N + 1):
+                for i in range(len(texto) - n + 1):
+                    grama = texto[i:i + n]
+                    if _SEPARADOR not in grama:
+                        self.gramas.setdefault(grama, set()).add(posicao)
+        self.ordens = {
+            "nome": sorted(range(len(clientes)), key=lambda p: (normalizar_texto(clientes[p]["nome"]), self.codigos[p])),
+            "codigo": sorted(range(len(clientes)), key=lambda p: self.codigos[p]),
+        }
+        # Posição de cada cliente em cada ordenação: ordena só os candidatos de uma busca
+        self.ranks: Dict[str, List[int]] = {}
+        for chave, ordem in self.ordens.items():
+            rank = [0] * len(ordem)
+            for r, p in enumerate(ordem):
+                rank[p] = r
+            self.ranks[chave] = rank
+
+    def candidatos(self, consulta: str) -> Optional[Set[int]]:
+        """Posições que contêm `consulta` (já normalizada); None = sem filtro."""
+        if not consulta:
+            return None
+        n = min(len(consulta), _N)
+        listas = sorted(
+            (self.gramas.get(consulta[i:i + n], set()) for i in range(len(consulta) - n + 1)),
+            key=len,
+        )
+        posicoes = set(listas[0])
+        for lista in listas[1:]:
+            if not posicoes:
+                break
+            posicoes &= lista
+        if len(consulta) > _N:
+            # Os n-gramas só garantem candidatos: confirma a substring inteira
+            posicoes = {p for p in posicoes if consulta in self.textos[p]}
+        return posicoes
+
+
+class ClientDirectory:
+    """
+    Cadastro de clientes (TABEMPRESAS) em memória para o dashboard e a busca.
+
+    Lê a tabela uma vez e recarrega em segundo plano a cada `intervalo`
+    segundos (ou em `atualizar()`). A busca é por substring em código, nome e
+    fantasia, sem diferenciar maiúsculas nem acentos, resolvida por um índice
+    de n-gramas (até trigramas) sem ida ao banco. Uma recarga que volte vazia
+    (falha no banco) não substitui o cadastro já carregado.
+    """
+
+    def __init__(self, data_provider: DataProvider, intervalo: float = 300.0) -> None:
+        self.data_provider = data_provider
+        self.intervalo = intervalo
+        self._indice: Optional[_Indice] = None
+        self._carregado_em: Optional[float] = None
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {"recargas": 0, "falhas": 0, "buscas": 0}
+
+    def atualizar(self) -> int:
+        """Relê o cadastro e troca o índice; retorna quantos clientes foram carregados."""
+        clientes = [
+            dict(c) for c in self.data_provider.listar_clientes()
+            if c.get("codigo") not in (None, "") and c.get("nome")
+        ]
+        if not clientes:
+            with self._lock:
+                self._stats["falhas"] += 1
+            print("Cadastro de clientes vazio ou indisponível; índice mantido")
+            return 0
+        for c in clientes:
+            # O dashboard lê 'fantaisa' (nome da coluna no banco), a API lê 'fantasia'
+            fantasia = c.get("fantasia") or c.get("fantaisa") or ""
+            c["fantasia"] = c["fantaisa"] = fantasia
+        indice = _Indice(clientes)
+        with self._lock:
+            self._indice = indice
+            self._carregado_em = time.time()
+            self._stats["recargas"] += 1
+        return len(clientes)
+
+    def iniciar(self) -> None:
+        """Carrega agora e agenda as recargas periódicas numa thread daemon (só na primeira chamada)."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop, name="client-directory", daemon=True)
+        self._thread.start()
+
+    def _loop(self) -> None:
+        while True:
+            try:
+                self.atualizar()
+            except Exception as e:
+                with self._lock:
+                    self._stats["falhas"] += 1
+                print(f"Erro ao recarregar cadastro de clientes: {e}")
+            if self._parar.wait(self.intervalo):
+                return
+
+    def parar(self) -> None:
+        self._parar.set()
+
+    @property
+    def pronto(self) -> bool:
+        return self._indice is not None
+
+    def _obter_indice(self) -> Optional[_Indice]:
+        if self._indice is None:
+            # Primeira requisição antes da thread terminar a carga: carrega aqui mesmo
+            try:
+                self.atualizar()
+            except Exception as e:
+                print(f"Erro ao carregar cadastro de clientes: {e}")
+        return self._indice
+
+    def pagina(
+        self,
+        query: Optional[str] = None,
+        min_id: Optional[int] = None,
+        max_id: Optional[int] = None,
+        sort: str = "nome",
+        direction: str = "asc",
+        offset: int = 0,
+        limit: int = 15,
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """Mesmo contrato de DataProvider.listar_clientes_pagina, respondido da memória."""
+        indice = self._obter_indice()
+        if indice is None:
+            return [], 0
+        with self._lock:
+            self._stats["buscas"] += 1
+
+        candidatos = indice.candidatos(normalizar_texto(query))
+        chave = "codigo" if sort == "codigo" else "nome"
+        desc = direction == "desc"
+
+        def na_faixa(p: int) -> bool:
+            return (min_id is None or indice.codigos[p] >= min_id) and (max_id is None or indice.codigos[p] <= max_id)
+
+        offset, limit = max(0, offset), max(0, limit)
+        if candidatos is not None:
+            if min_id is not None or max_id is not None:
+                candidatos = [p for p in candidatos if na_faixa(p)]
+            # Só as posições até o fim da página precisam sair ordenadas
+            selecionar = heapq.nlargest if desc else heapq.nsmallest
+            posicoes = selecionar(offset + limit, candidatos, key=indice.ranks[chave].__getitem__)
+            total = len(candidatos)
+        else:
+            ordem = indice.ordens[chave][::-1] if desc else indice.ordens[chave]
+            posicoes = ordem if min_id is None and max_id is None else [p for p in ordem if na_faixa(p)]
+            total = len(posicoes)
+        return [indice.clientes[p] for p in posicoes[offset:offset + limit]], total
+
+    def buscar(self, query: Optional[str] = None, limite: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Clientes que casam com `query` (todos, sem ela), por nome."""
+        return self.pagina(query=query, limit=limite if limite is not None else 1 << 31)[0]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            indice = self._indice
+            return {
+                **self._stats,
+                "clientes": len(indice.clientes) if indice else 0,
+                "gramas": len(indice.gramas) if indice else 0,
+                "carregado_em": self._carregado_em,
+                "intervalo": self.intervalo,
+            }
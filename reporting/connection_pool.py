@@ -0,0 +1,195 @@
+from __future__ import annotations
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+
+class PoolEsgotadoError(RuntimeError):
+    """Nenhuma conexão ficou disponível dentro do tempo de espera."""
+
+
+class PooledConnection:
+    """
+    Proxy para uma conexão do pool.
+    Repassa tudo para a conexão real; close() devolve a conexão ao pool
+    em vez de encerrar o socket, mantendo o padrão try/finally dos providers.
+    """
+
+    def __init__(self, pool: "ConnectionPool", conn: Any) -> None:
+        self._pool = pool
+        self._conn = conn
+        self._devolvida = False
+
+    def __getattr__(self, nome: str) -> Any:
+        return getattr(self._conn, nome)
+
+    def close(self) -> None:
+        if self._devolvida:
+            return
+        self._devolvida = True
+        self._pool._devolver(self._conn)
+
+    def __enter__(self) -> "PooledConnection":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class ConnectionPool:
+    """
+    Pool de conexões thread-safe e limitado.
+
+    - No máximo `max_size` conexões abertas (em uso + ociosas).
+    - Conexões ociosas há mais de `idle_timeout` segundos são recicladas.
+    - Cada checkout valida a conexão com `health_check_sql`; se falhar,
+      a conexão é descartada e outra é aberta.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Any],
+        max_size: int = 5,
+        idle_timeout: float = 300.0,
+        checkout_timeout: float = 30.0,
+        health_check_sql: str = "SELECT 1 FROM RDB$DATABASE",
+    ) -> None:
+        if max_size < 1:
+            raise ValueError("max_size deve ser >= 1")
+        self._factory = factory
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self.health_check_sql = health_check_sql
+
+        self._ociosas: Deque[Tuple[Any, float]] = deque()
+        self._cond = threading.Condition(threading.Lock())
+        self._abertas = 0
+        self._em_uso = 0
+        self._stats = {
+            "criadas": 0,
+            "reutilizadas": 0,
+            "descartadas": 0,
+            "recicladas": 0,
+            "esperas": 0,
+            "esgotado": 0,
+        }
+
+    def acquire(self) -> PooledConnection:
+        """Obtém uma conexão saudável do pool (ou abre uma nova)."""
+        prazo = time.monotonic() + self.checkout_timeout
+        while True:
+            conn = self._reservar(prazo)
+            if conn is None:
+                # Vaga reservada: abre uma conexão nova fora do lock
+                try:
+                    conn = self._factory()
+                except Exception:
+                    with self._cond:
+                        self._abertas -= 1
+                        self._em_uso -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._stats["criadas"] += 1
+                return PooledConnection(self, conn)
+
+            if self._saudavel(conn):
+                with self._cond:
+                    self._stats["reutilizadas"] += 1
+                return PooledConnection(self, conn)
+
+            self._descartar(conn)
+
+    def _reservar(self, prazo: float) -> Optional[Any]:
+        """
+        Retira uma conexão ociosa ou reserva uma vaga para abrir outra.
+        Retorna a conexão ociosa ou None quando a vaga foi reservada.
+        """
+        with self._cond:
+            while True:
+                self._reciclar_expiradas()
+                if self._ociosas:
+                    conn, _ = self._ociosas.pop()
+                    self._em_uso += 1
+                    return conn
+                if self._abertas < self.max_size:
+                    self._abertas += 1
+                    self._em_uso += 1
+                    return None
+
+                restante = prazo - time.monotonic()
+                if restante <= 0:
+                    self._stats["esgotado"] += 1
+                    raise PoolEsgotadoError(
+                        f"Nenhuma conexão disponível após {self.checkout_timeout:g}s "
+                        f"(max_size={self.max_size})"
+                    )
+                self._stats["esperas"] += 1
+                self._cond.wait(restante)
+
+    def _reciclar_expiradas(self) -> None:
+        """Fecha conexões ociosas além do idle_timeout. Chamar com o lock."""
+        limite = time.monotonic() - self.idle_timeout
+        # As mais antigas ficam à esquerda (devolução sempre à direita)
+        while self._ociosas and self._ociosas[0][1] < limite:
+            conn, _ = self._ociosas.popleft()
+            self._abertas -= 1
+            self._stats["recicladas"] += 1
+            self._fechar_silencioso(conn)
+
+    def _saudavel(self, conn: Any) -> bool:
+        try:
+            cur = conn.cursor()
+            cur.execute(self.health_check_sql)
+            cur.fetchone()
+            return True
+        except Exception:
+            return False
+
+    def _devolver(self, conn: Any) -> None:
+        # Encerra a transação corrente para a próxima consulta enxergar dados novos
+        try:
+            conn.rollback()
+        except Exception:
+            self._descartar(conn)
+            return
+        with self._cond:
+            self._em_uso -= 1
+            self._ociosas.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def _descartar(self, conn: Any) -> None:
+        with self._cond:
+            self._em_uso -= 1
+            self._abertas -= 1
+            self._stats["descartadas"] += 1
+            self._cond.notify()
+        self._fechar_silencioso(conn)
+
+    @staticmethod
+    def _fechar_silencioso(conn: Any) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def close_all(self) -> None:
+        """Fecha todas as conexões ociosas; as em uso voltam ao pool normalmente."""
+        with self._cond:
+            ociosas = list(self._ociosas)
+            self._ociosas.clear()
+            self._abertas -= len(ociosas)
+        for conn, _ in ociosas:
+            self._fechar_silencioso(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "max_size": self.max_size,
+                "abertas": self._abertas,
+                "em_uso": self._em_uso,
+                "ociosas": len(self._ociosas),
+                **self._stats,
+            }
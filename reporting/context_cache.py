@@ -0,0 +1,332 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import pickle
+import re
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+def periodo_fechado(anos: List[int], meses: List[int], hoje: Optional[datetime] = None) -> bool:
+    """True quando todas as competências (ano, mês) são anteriores ao mês corrente."""
+    if not anos or not meses:
+        return False
+    hoje = hoje or datetime.now()
+    atual = (hoje.year, hoje.month)
+    return all((ano, mes) < atual for ano in anos for mes in meses)
+
+
+def impressao_contexto(contexto: Dict[str, Any]) -> str:
+    """Hash estável do conteúdo de um contexto de dados (base das ETags HTTP)."""
+    serializado = json.dumps(contexto, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(serializado.encode("utf-8")).hexdigest()[:32]
+
+
+class CacheBackend(ABC):
+    """Armazenamento de bytes com expiração (TTL) por chave."""
+
+    @abstractmethod
+    def get(self, chave: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def set(self, chave: str, valor: bytes, ttl: float) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def limpar(self, prefixo: str = "") -> int:
+        """Remove as entradas cuja chave começa com `prefixo`; retorna quantas."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+class MemoryCacheBackend(CacheBackend):
+    """Cache em memória do processo, com LRU limitado por bytes e por nº de entradas."""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_entradas: int = 1000) -> None:
+        self.max_bytes = max_bytes
+        self.max_entradas = max_entradas
+        self._itens: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._evictions = 0
+
+    def get(self, chave: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            expira_em, valor = item
+            if expira_em < time.time():
+                self._remover(chave)
+                return None
+            self._itens.move_to_end(chave)
+            return valor
+
+    def set(self, chave: str, valor: bytes, ttl: float) -> None:
+        if len(valor) > self.max_bytes:
+            return
+        with self._lock:
+            if chave in self._itens:
+                self._remover(chave)
+            self._itens[chave] = (time.time() + ttl, valor)
+            self._bytes += len(valor)
+            while self._itens and (self._bytes > self.max_bytes or len(self._itens) > self.max_entradas):
+                mais_antiga = next(iter(self._itens))
+                self._remover(mais_antiga)
+                self._evictions += 1
+
+    def _remover(self, chave: str) -> None:
+        _, valor = self._itens.pop(chave)
+        self._bytes -= len(valor)
+
+    def limpar(self, prefixo: str = "") -> int:
+        with self._lock:
+            chaves = [c for c in self._itens if c.startswith(prefixo)]
+            for chave in chaves:
+                self._remover(chave)
+            return len(chaves)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": "memoria",
+                "entradas": len(self._itens),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self._evictions,
+            }
+
+
+class DiskCacheBackend(CacheBackend):
+    """
+    Cache em disco, compartilhado entre processos (ex.: workers do gunicorn).
+    Um arquivo por chave, gravado de forma atômica (arquivo temporário + rename).
+    O mtime marca o último acesso e orienta a remoção LRU quando o diretório
+    passa de `max_bytes`.
+    """
+
+    SUFIXO = ".cache"
+
+    def __init__(self, diretorio: str, max_bytes: int = 512 * 1024 * 1024) -> None:
+        self.diretorio = diretorio
+        self.max_bytes = max_bytes
+        os.makedirs(diretorio, exist_ok=True)
+        self._evictions = 0
+
+    def _caminho(self, chave: str) -> str:
+        nome = re.sub(r"[^A-Za-z0-9_.-]", "_", chave)
+        return os.path.join(self.diretorio, nome + self.SUFIXO)
+
+    def get(self, chave: str) -> Optional[bytes]:
+        caminho = self._caminho(chave)
+        try:
+            with open(caminho, "rb") as f:
+                expira_em, valor = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+            return None
+        if expira_em < time.time():
+            self._apagar(caminho)
+            return None
+        try:
+            os.utime(caminho)
+        except OSError:
+            pass
+        return valor
+
+    def set(self, chave: str, valor: bytes, ttl: float) -> None:
+        if len(valor) > self.max_bytes:
+            return
+        fd, tmp = tempfile.mkstemp(dir=self.diretorio, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump((time.time() + ttl, valor), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._caminho(chave))
+        except OSError:
+            self._apagar(tmp)
+            return
+        self._aplicar_limite()
+
+    def _arquivos(self) -> List[Tuple[float, int, str]]:
+        arquivos = []
+        for entrada in os.scandir(self.diretorio):
+            if entrada.name.endswith(self.SUFIXO):
+                try:
+                    st = entrada.stat()
+                except OSError:
+                    continue
+                arquivos.append((st.st_mtime, st.st_size, entrada.path))
+        return arquivos
+
+    def _aplicar_limite(self) -> None:
+        arquivos = self._arquivos()
+        total = sum(tamanho for _, tamanho, _ in arquivos)
+        if total <= self.max_bytes:
+            return
+        for _, tamanho, caminho in sorted(arquivos):
+            if total <= self.max_bytes:
+                break
+            self._apagar(caminho)
+            total -= tamanho
+            self._evictions += 1
+
+    @staticmethod
+    def _apagar(caminho: str) -> None:
+        try:
+            os.remove(caminho)
+        except OSError:
+            pass
+
+    def limpar(self, prefixo: str = "") -> int:
+        inicio = re.sub(r"[^A-Za-z0-9_.-]", "_", prefixo)
+        removidos = 0
+        for _, _, caminho in self._arquivos():
+            if os.path.basename(caminho).startswith(inicio):
+                self._apagar(caminho)
+                removidos += 1
+        return removidos
+
+    def stats(self) -> Dict[str, Any]:
+        arquivos = self._arquivos()
+        return {
+            "backend": "disco",
+            "diretorio": self.diretorio,
+            "entradas": len(arquivos),
+            "bytes": sum(tamanho for _, tamanho, _ in arquivos),
+            "max_bytes": self.max_bytes,
+            "evictions": self._evictions,
+        }
+
+
+class ContextCache:
+    """
+    Cache dos contextos de dados do relatório, por (cliente, anos, meses, filiais).
+
+    Períodos fechados (meses anteriores ao corrente) não mudam mais e ficam
+    em cache por `ttl_fechado`; o mês corrente expira em `ttl_aberto`.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[CacheBackend] = None,
+        ttl_aberto: float = 300.0,
+        ttl_fechado: float = 7 * 24 * 3600.0,
+    ) -> None:
+        self.backend = backend or MemoryCacheBackend()
+        self.ttl_aberto = ttl_aberto
+        self.ttl_fechado = ttl_fechado
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def _prefixo_cliente(cliente_id: int) -> str:
+        return f"ctx-{cliente_id}-"
+
+    @classmethod
+    def chave(
+        cls,
+        cliente_id: int,
+        anos: List[int],
+        meses: List[int],
+        filiais: Optional[List[int]] = None,
+    ) -> str:
+        def lista(valores: Optional[List[int]], vazio: str) -> str:
+            return ".".join(map(str, sorted(set(valores)))) if valores else vazio
+
+        return (
+            f"{cls._prefixo_cliente(cliente_id)}"
+            f"{lista(anos, 'todos')}-{lista(meses, 'todos')}-{lista(filiais, 'todas')}"
+        )
+
+    def ttl(self, anos: List[int], meses: List[int]) -> float:
+        return self.ttl_fechado if periodo_fechado(anos, meses) else self.ttl_aberto
+
+    def obter(
+        self,
+        cliente_id: int,
+        anos: List[int],
+        meses: List[int],
+        filiais: Optional[List[int]],
+    ) -> Optional[Dict[str, Any]]:
+        """Contexto em cache, ou None (contado como miss)."""
+        valor = self.backend.get(self.chave(cliente_id, anos, meses, filiais))
+        if valor is not None:
+            try:
+                contexto = pickle.loads(valor)
+                with self._lock:
+                    self._hits += 1
+                return contexto
+            except Exception:
+                pass
+
+        with self._lock:
+            self._misses += 1
+        return None
+
+    def impressao(
+        self,
+        cliente_id: int,
+        anos: List[int],
+        meses: List[int],
+        filiais: Optional[List[int]],
+    ) -> Optional[str]:
+        """impressao_contexto do contexto em cache (sem contar hit/miss), ou None."""
+        valor = self.backend.get(self.chave(cliente_id, anos, meses, filiais))
+        if valor is None:
+            return None
+        try:
+            return impressao_contexto(pickle.loads(valor))
+        except Exception:
+            return None
+
+    def obter_ou_calcular(
+        self,
+        cliente_id: int,
+        anos: List[int],
+        meses: List[int],
+        filiais: Optional[List[int]],
+        calcular: Callable[[], Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        """Retorna o contexto em cache ou calcula, armazena e retorna."""
+        contexto = self.obter(cliente_id, anos, meses, filiais)
+        if contexto is not None:
+            return contexto
+
+        contexto = calcular()
+        self.armazenar(cliente_id, anos, meses, filiais, contexto)
+        return contexto
+
+    def armazenar(
+        self,
+        cliente_id: int,
+        anos: List[int],
+        meses: List[int],
+        filiais: Optional[List[int]],
+        contexto: Dict[str, Any],
+    ) -> None:
+        # Contextos montados com falha de consulta não podem ficar dias em cache
+        if contexto.get("completo") is False:
+            return
+        chave = self.chave(cliente_id, anos, meses, filiais)
+        valor = pickle.dumps(contexto, protocol=pickle.HIGHEST_PROTOCOL)
+        self.backend.set(chave, valor, self.ttl(anos, meses))
+
+    def invalidar(self, cliente_id: Optional[int] = None) -> int:
+        """Remove os contextos de um cliente (ou todos); retorna quantos."""
+        prefixo = self._prefixo_cliente(cliente_id) if cliente_id is not None else "ctx-"
+        return self.backend.limpar(prefixo)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            contadores = {"hits": self._hits, "misses": self._misses}
+        return {**contadores, **self.backend.stats()}
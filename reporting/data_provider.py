@@ -1,6 +1,6 @@
 from __future__ import annotations
 from abc import ABC, abstractmethod
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 
 
 class DataProvider(ABC):
@@ -13,6 +13,23 @@ class DataProvider(ABC):
         """Retorna uma lista de clientes disponíveis."""
         raise NotImplementedError
 
+    @abstractmethod
+    def listar_clientes_pagina(
+        self,
+        query: Optional[str] = None,
+        min_id: Optional[int] = None,
+        max_id: Optional[int] = None,
+        sort: str = 'nome',
+        direction: str = 'asc',
+        offset: int = 0,
+        limit: int = 15
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Uma página de clientes (busca em código/nome/fantasia, faixa de código,
+        ordenação por 'nome' ou 'codigo') e o total de clientes do filtro.
+        """
+        raise NotImplementedError
+
     @abstractmethod
     def listar_filiais(self, cliente_id: int) -> List[Dict[str, Any]]:
         """Retorna lista de filiais de um cliente."""
@@ -29,4 +46,20 @@ class DataProvider(ABC):
         """
         Gera/retorna o contexto de DADOS do relatório.
         """
-        raise NotImplementedError
\ No newline at end of file
+        raise NotImplementedError
+
+    def obter_contextos_dados_lote(
+        self,
+        cliente_ids: List[int],
+        anos: List[int],
+        meses: List[int],
+        filiais: Optional[List[int]] = None
+    ) -> Dict[int, Dict[str, Any]]:
+        """
+        Contextos de DADOS de vários clientes com o mesmo período, por id.
+        Providers com acesso a banco devem sobrescrever para buscar em lote.
+        """
+        return {
+            cliente_id: self.obter_contexto_dados(cliente_id, anos, meses, filiais)
+            for cliente_id in cliente_ids
+        }
\ No newline at end of file
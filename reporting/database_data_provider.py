@@ -1,10 +1,18 @@
 ﻿from __future__ import annotations
+import threading
+import time
 import firebirdsql
-from typing import Dict, Any, List, Optional
-from datetime import datetime
+import numpy as np
+from itertools import accumulate
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Set, Tuple, Union
+from datetime import datetime, date
 from decimal import Decimal
 
 from .data_provider import DataProvider
+from .connection_pool import ConnectionPool, PooledConnection
+from .balancete import agregar_balancete
+from .ledger import LedgerFrame, LedgerIndex, LedgerSnapshot, normalizar_codigo
+from .saldo_store import SEM_FILIAL, LinhaSaldo, SaldoStore, competencia
 
 
 class DatabaseDataProvider(DataProvider):
@@ -14,6 +22,16 @@ class DatabaseDataProvider(DataProvider):
     sem lógicas complexas de hierarquia ou herança no Python.
     """
 
+    # Empresas por consulta nos métodos *_lote (CODIGOEMPRESA IN (...))
+    MAX_EMPRESAS_POR_CONSULTA = 100
+
+    # Colunas de obter_balancete, na ordem do SELECT
+    COLUNAS_BALANCETE = (
+        'cod_empresa', 'nome_empresa', 'cod_filial', 'nome_filial', 'nome_fantasia_filial',
+        'cod_conta_contabil', 'saldo_inicial', 'nome_conta', 'tipo_conta', 'natureza',
+        'cod_grupo', 'debito', 'credito', 'saldo',
+    )
+
     def __init__(
         self,
         host: str = "192.168.10.160",
@@ -21,14 +39,27 @@ class DatabaseDataProvider(DataProvider):
         database: str = r"e:\Athenas\rps.fdb",
         user: str = "SYSDBA",
         password: str = "masterkey",
+        pool_size: int = 5,
+        pool_idle_timeout: float = 300.0,
+        saldo_store_db: Optional[str] = None,
+        saldo_store_max_idade: float = 15 * 60.0,
     ) -> None:
         self.host = host
         self.port = port
         self.database = database
         self.user = user
         self.password = password
-
-    def _get_connection(self, charset='ISO8859_1'):
+        self.pool_size = pool_size
+        self.pool_idle_timeout = pool_idle_timeout
+        # Um pool por charset (WIN1252 para cadastros, ISO8859_1 para saldos)
+        self._pools: Dict[str, ConnectionPool] = {}
+        self._pools_lock = threading.Lock()
+        # Base local de saldos mensais (ver SaldoStore); empresas sincronizadas há
+        # mais de saldo_store_max_idade segundos voltam a ser lidas do Firebird
+        self.saldo_store = SaldoStore(saldo_store_db) if saldo_store_db else None
+        self.saldo_store_max_idade = saldo_store_max_idade
+
+    def _abrir_conexao(self, charset: str):
         return firebirdsql.connect(
             host=self.host,
             port=self.port,
@@ -38,6 +69,54 @@ class DatabaseDataProvider(DataProvider):
             charset=charset
         )
 
+    def _pool(self, charset: str) -> ConnectionPool:
+        pool = self._pools.get(charset)
+        if pool is None:
+            with self._pools_lock:
+                pool = self._pools.get(charset)
+                if pool is None:
+                    pool = ConnectionPool(
+                        factory=lambda: self._abrir_conexao(charset),
+                        max_size=self.pool_size,
+                        idle_timeout=self.pool_idle_timeout,
+                    )
+                    self._pools[charset] = pool
+        return pool
+
+    def _get_connection(self, charset='ISO8859_1') -> PooledConnection:
+        """Conexão emprestada do pool; close() devolve ao pool."""
+        return self._pool(charset).acquire()
+
+    def pool_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Estatísticas de uso dos pools de conexão, por charset."""
+        return {charset: pool.stats() for charset, pool in list(self._pools.items())}
+
+    def fechar(self) -> None:
+        """Fecha as conexões ociosas de todos os pools."""
+        for pool in list(self._pools.values()):
+            pool.close_all()
+
+    def _store_para(self, cliente_id: int) -> Optional[SaldoStore]:
+        """SaldoStore, se a empresa estiver sincronizada e dentro da idade máxima."""
+        if self.saldo_store is None:
+            return None
+        try:
+            sincronizado_em = self.saldo_store.sincronizado_em(cliente_id)
+        except Exception as e:
+            print(f"Erro ao consultar base de saldos: {e}")
+            return None
+        if sincronizado_em is None or time.time() - sincronizado_em > self.saldo_store_max_idade:
+            return None
+        return self.saldo_store
+
+    @classmethod
+    def _blocos_empresas(cls, cliente_ids: List[int]) -> Iterable[Tuple[List[int], str]]:
+        """Divide os ids em blocos de até MAX_EMPRESAS_POR_CONSULTA, com a lista para o IN (...)."""
+        ids = list(dict.fromkeys(int(cid) for cid in cliente_ids))
+        for i in range(0, len(ids), cls.MAX_EMPRESAS_POR_CONSULTA):
+            bloco = ids[i:i + cls.MAX_EMPRESAS_POR_CONSULTA]
+            yield bloco, ",".join(map(str, bloco))
+
     def _fmt_brl(self, val: float) -> str:
         if val is None: 
             val = 0.0
@@ -49,6 +128,57 @@ class DatabaseDataProvider(DataProvider):
         col_names = [col[0].lower() for col in cursor.description]
         return dict(zip(col_names, row))
 
+    @staticmethod
+    def _intervalos_periodo(anos: List[int], meses: List[int]) -> List[Tuple[date, date]]:
+        """
+        Converte a seleção (anos, meses) em intervalos [inicio, fim) de datas.
+        Meses contíguos (inclusive dez -> jan do ano seguinte) viram um único intervalo.
+        Sem meses, cada ano selecionado é considerado inteiro.
+        """
+        meses_validos = sorted({m for m in (meses or range(1, 13)) if 1 <= m <= 12})
+        competencias = sorted({(a, m) for a in set(anos) for m in meses_validos})
+        return DatabaseDataProvider._intervalos_competencias(competencias)
+
+    @staticmethod
+    def _intervalos_competencias(competencias: List[Tuple[int, int]]) -> List[Tuple[date, date]]:
+        """Intervalos [inicio, fim) de datas cobrindo as competências (ano, mês), já ordenadas."""
+        intervalos: List[Tuple[date, date]] = []
+        for ano, mes in competencias:
+            inicio = date(ano, mes, 1)
+            fim = date(ano + 1, 1, 1) if mes == 12 else date(ano, mes + 1, 1)
+            if intervalos and intervalos[-1][1] == inicio:
+                intervalos[-1] = (intervalos[-1][0], fim)
+            else:
+                intervalos.append((inicio, fim))
+        return intervalos
+
+    @staticmethod
+    def _competencias(anos: List[int], meses: List[int]) -> List[int]:
+        """Competências AAAAMM da seleção, com a mesma regra de _intervalos_periodo."""
+        meses_validos = {m for m in (meses or range(1, 13)) if 1 <= m <= 12}
+        return sorted({competencia(a, m) for a in set(anos) for m in meses_validos})
+
+    @classmethod
+    def _filtro_periodo(cls, anos: List[int], meses: List[int]) -> Tuple[str, List[Any]]:
+        """
+        Monta o predicado de período sobre S.DATA como faixas `S.DATA >= ? AND S.DATA < ?`,
+        que podem usar o índice da coluna (EXTRACT(...) obriga a varrer a empresa inteira).
+        Retorna (sql, params); sql vazio quando não há filtro.
+        """
+        if not anos:
+            # Sem ano não há como montar faixas de data
+            if meses:
+                return f"EXTRACT(MONTH FROM S.DATA) IN ({','.join(map(str, meses))})", []
+            return "", []
+
+        intervalos = cls._intervalos_periodo(anos, meses)
+        if not intervalos:
+            return "1 = 0", []
+
+        faixas = " OR ".join("(S.DATA >= ? AND S.DATA < ?)" for _ in intervalos)
+        params: List[Any] = [d for intervalo in intervalos for d in intervalo]
+        return f"({faixas})", params
+
     def listar_clientes(self) -> List[Dict[str, Any]]:
         conn = None
         try:
@@ -73,6 +203,75 @@ class DatabaseDataProvider(DataProvider):
         finally:
             if conn: conn.close()
 
+    def listar_clientes_pagina(
+        self,
+        query: Optional[str] = None,
+        min_id: Optional[int] = None,
+        max_id: Optional[int] = None,
+        sort: str = 'nome',
+        direction: str = 'asc',
+        offset: int = 0,
+        limit: int = 15
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Uma página de clientes e o total do filtro, resolvidos no banco:
+        FIRST/SKIP para a página, faixa de código pela chave primária e busca
+        sem distinção de maiúsculas (CONTAINING) em código, nome e fantasia.
+        """
+        sentido = 'DESC' if direction == 'desc' else 'ASC'
+        # Código desempata nomes iguais para a paginação ser estável
+        ordem = f"CODIGO {sentido}" if sort == 'codigo' else f"NOME {sentido}, CODIGO {sentido}"
+
+        def consultar(cursor, coluna_fantasia: str) -> Tuple[List[Dict[str, Any]], int]:
+            filtros = ["CODIGO IS NOT NULL", "NOME IS NOT NULL", "NOME <> ''"]
+            params: List[Any] = []
+            if min_id is not None:
+                filtros.append("CODIGO >= ?")
+                params.append(int(min_id))
+            if max_id is not None:
+                filtros.append("CODIGO <= ?")
+                params.append(int(max_id))
+            if query:
+                filtros.append(
+                    f"(CAST(CODIGO AS VARCHAR(20)) CONTAINING ? OR NOME CONTAINING ? OR {coluna_fantasia} CONTAINING ?)"
+                )
+                params.extend([query] * 3)
+            where = " AND ".join(filtros)
+
+            cursor.execute(f"SELECT COUNT(*) FROM TABEMPRESAS WHERE {where}", tuple(params))
+            total = int(cursor.fetchone()[0] or 0)
+
+            cursor.execute(
+                f"SELECT FIRST {max(0, int(limit))} SKIP {max(0, int(offset))} CODIGO, NOME, {coluna_fantasia} "
+                f"FROM TABEMPRESAS WHERE {where} ORDER BY {ordem}",
+                tuple(params),
+            )
+            clientes = []
+            for codigo, nome, fantasia in cursor.fetchall():
+                fantasia = str(fantasia).strip() if fantasia else ''
+                # 'fantaisa' é o nome da coluna no banco e o que o dashboard lê
+                clientes.append({
+                    'codigo': codigo,
+                    'nome': str(nome).strip() if nome else '',
+                    'fantasia': fantasia,
+                    'fantaisa': fantasia,
+                })
+            return clientes, total
+
+        conn = None
+        try:
+            conn = self._get_connection(charset='WIN1252')
+            try:
+                return consultar(conn.cursor(), 'FANTAISA')
+            except Exception:
+                if conn: conn.rollback()
+                return consultar(conn.cursor(), 'FANTASIA')
+        except Exception as e:
+            print(f"Erro ao listar página de clientes: {e}")
+            return [], 0
+        finally:
+            if conn: conn.close()
+
     def listar_filiais(self, codigo_empresa: int) -> List[Dict[str, Any]]:
         conn = None
         try:
@@ -110,17 +309,29 @@ class DatabaseDataProvider(DataProvider):
             if conn: conn.close()
 
     @staticmethod
-    def calcular_capex(dados_filtrados: List[Dict[str, Any]]) -> float:
+    def calcular_capex(dados_filtrados: Union[List[Dict[str, Any]], LedgerFrame, LedgerIndex]) -> float:
         """
         Calcula o CAPEX (Capital Expenditure) a partir de uma lista de contas
-        já filtrada por período.
+        já filtrada por período (ou do LedgerFrame / LedgerIndex dessas contas).
 
         Regras:
         - Apenas contas analíticas (TIPO_CONTA == 'Analitica')
         - Incluir contas que começam com 1.2.03 (Imobilizado) e 1.2.04 (Intangível)
         - Excluir contas redutoras: 1.2.03.10 (Depreciação) e 1.2.04.03 (Amortização)
         - Somar a coluna DEBITO das contas restantes
+        - Total arredondado em 2 casas (valores DECIMAL(15, 2)), nos dois caminhos
         """
+        if isinstance(dados_filtrados, LedgerFrame):
+            dados_filtrados = LedgerIndex(dados_filtrados)
+        if isinstance(dados_filtrados, LedgerIndex):
+            # As redutoras são subconjuntos dos prefixos incluídos: basta subtrair
+            indice = dados_filtrados
+            return round(
+                indice.somar('1203', 'debito') + indice.somar('1204', 'debito')
+                - indice.somar('120310', 'debito') - indice.somar('120403', 'debito'),
+                2,
+            )
+
         total = 0.0
         for conta in dados_filtrados:
             tipo = conta.get('tipo', '') or conta.get('tipo_conta', '')
@@ -140,7 +351,7 @@ class DatabaseDataProvider(DataProvider):
 
             total += conta.get('debito', 0.0)
 
-        return total
+        return round(total, 2)
 
     @staticmethod
     def _determinar_periodo_anterior(
@@ -174,10 +385,12 @@ class DatabaseDataProvider(DataProvider):
         cliente_id: int,
         anos: List[int],
         meses: List[int],
-        filiais: Optional[List[int]] = None
+        filiais: Optional[List[int]] = None,
+        snapshot: Optional[LedgerSnapshot] = None
     ) -> Dict[str, Any]:
         """
         Calcula o CAPEX do Período Atual e do Período Anterior.
+        Reaproveita o `snapshot` do relatório quando informado.
 
         Retorna um dicionário com:
         - capex_atual: valor formatado como moeda
@@ -186,16 +399,11 @@ class DatabaseDataProvider(DataProvider):
         - capex_anterior_raw: valor numérico
         - variacao_percentual: string com a variação % entre os períodos
         """
-        # --- Período Atual ---
-        dados_atual = self.obter_dados_brutos(cliente_id, anos, meses, filiais)
-        capex_atual = self.calcular_capex(dados_atual)
+        if snapshot is None:
+            snapshot = self.obter_snapshot(cliente_id, anos, meses, filiais)
 
-        # --- Período Anterior ---
-        periodo_ant = self._determinar_periodo_anterior(anos, meses)
-        dados_anterior = self.obter_dados_brutos(
-            cliente_id, periodo_ant["anos"], periodo_ant["meses"], filiais
-        )
-        capex_anterior = self.calcular_capex(dados_anterior)
+        capex_atual = self.calcular_capex(snapshot.indice_atual)
+        capex_anterior = self.calcular_capex(snapshot.indice_anterior)
 
         # --- Variação percentual ---
         if capex_anterior > 0:
@@ -229,123 +437,191 @@ class DatabaseDataProvider(DataProvider):
         - Em cada mês do ano filtrado, soma apenas o movimento daquele mês,
           acumulando sobre o total do mês anterior.
         """
-        conn = None
-        try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
-            totais = [0.0] * 12
-            movimentos_mensais = [0.0] * 12
-
-            data_inicio_ano = datetime(ano, 1, 1)
-
-            # 1) Base histórica: tudo que veio antes do ano filtrado
-            sql_base = """
-                SELECT
-                  S.CODIGOCONTACONTABIL AS COD_CONTA,
-                  P.NOME AS NOME_CONTA,
-                  CASE
-                    WHEN P.NATUREZA = 1 THEN
-                      SUM(CAST(S.VALORDEBITO AS DECIMAL(15, 2))) - SUM(CAST(S.VALORCREDITO AS DECIMAL(15, 2)))
-                    ELSE
-                      SUM(CAST(S.VALORCREDITO AS DECIMAL(15, 2))) - SUM(CAST(S.VALORDEBITO AS DECIMAL(15, 2)))
-                  END AS SALDO
-                FROM TABSALDOCONTABIL S
-                JOIN TABPLANOCONTAS P ON P.CODIGO = S.CODIGOCONTACONTABIL AND P.CODIGOPLANOCONTAS = 11
-                WHERE S.INICIAL NOT IN (2, 4, 5)
-                  AND S.CODIGOEMPRESA = ?
-                  AND S.DATA < ?
-                                    AND P.TIPO <> 1
-                  AND SUBSTRING(S.CODIGOCONTACONTABIL FROM 1 FOR 1) = '1'
-            """
-            params_base = [cliente_id, data_inicio_ano]
-
-            if filiais:
-                filiais_str = ",".join(map(str, filiais))
-                sql_base += f" AND S.CODIGOFILIAL IN ({filiais_str})"
-
-            sql_base += """
-                GROUP BY
-                  S.CODIGOCONTACONTABIL,
-                  P.NOME,
-                  P.NATUREZA
-            """
-
-            cursor.execute(sql_base, tuple(params_base))
-            rows_base = cursor.fetchall()
+        return self.obter_series_mensais(cliente_id, ano, ['1'], filiais, acumulado=True)['1']
 
-            saldo_base = 0.0
-            for r in rows_base:
-                nome_conta = str(r[1]).strip() if r[1] else ''
-                saldo = float(r[2]) if r[2] else 0.0
-                if nome_conta.startswith('(-)'):
-                    saldo = -saldo
-                saldo_base += saldo
-
-            # 2) Movimentos por mês do ano filtrado
-            sql_mov = """
-                SELECT
-                  EXTRACT(MONTH FROM S.DATA) AS MES,
-                  S.CODIGOCONTACONTABIL AS COD_CONTA,
-                  P.NOME AS NOME_CONTA,
-                  CASE
-                    WHEN P.NATUREZA = 1 THEN
-                      SUM(CAST(S.VALORDEBITO AS DECIMAL(15, 2))) - SUM(CAST(S.VALORCREDITO AS DECIMAL(15, 2)))
-                    ELSE
-                      SUM(CAST(S.VALORCREDITO AS DECIMAL(15, 2))) - SUM(CAST(S.VALORDEBITO AS DECIMAL(15, 2)))
-                  END AS SALDO
-                FROM TABSALDOCONTABIL S
-                JOIN TABPLANOCONTAS P ON P.CODIGO = S.CODIGOCONTACONTABIL AND P.CODIGOPLANOCONTAS = 11
-                WHERE S.INICIAL NOT IN (2, 4, 5)
-                  AND S.CODIGOEMPRESA = ?
-                  AND EXTRACT(YEAR FROM S.DATA) = ?
-                                    AND P.TIPO <> 1
-                  AND SUBSTRING(S.CODIGOCONTACONTABIL FROM 1 FOR 1) = '1'
-            """
-            params_mov = [cliente_id, ano]
-
-            if filiais:
-                filiais_str = ",".join(map(str, filiais))
-                sql_mov += f" AND S.CODIGOFILIAL IN ({filiais_str})"
+    @staticmethod
+    def _montar_series(
+        linhas: Iterable[Tuple[int, str, float]],
+        prefixos: List[str],
+        acumulados: Set[str],
+    ) -> Dict[str, List[float]]:
+        """
+        Distribui as linhas (mês, código da conta, saldo) pelos prefixos, que podem
+        se sobrepor. Mês 0 é a base anterior ao ano, somada só nas séries acumuladas.
+        """
+        bases = {prefixo: 0.0 for prefixo in prefixos}
+        movimentos = {prefixo: [0.0] * 12 for prefixo in prefixos}
+        for mes, codigo, saldo in linhas:
+            if not 0 <= mes <= 12:
+                continue
+            codigo = normalizar_codigo(codigo)
+            for prefixo in prefixos:
+                if not codigo.startswith(prefixo):
+                    continue
+                if mes == 0:
+                    bases[prefixo] += saldo
+                else:
+                    movimentos[prefixo][mes - 1] += saldo
+
+        series = {}
+        for prefixo in prefixos:
+            if prefixo in acumulados:
+                series[prefixo] = list(accumulate(movimentos[prefixo], initial=bases[prefixo]))[1:]
+            else:
+                series[prefixo] = movimentos[prefixo]
+        return series
 
-            sql_mov += """
-                GROUP BY
-                  EXTRACT(MONTH FROM S.DATA),
-                  S.CODIGOCONTACONTABIL,
-                  P.NOME,
-                  P.NATUREZA
-                ORDER BY
-                  EXTRACT(MONTH FROM S.DATA),
-                  S.CODIGOCONTACONTABIL
-            """
+    def obter_series_mensais(
+        self,
+        cliente_id: int,
+        ano: int,
+        prefixos: List[str],
+        filiais: Optional[List[int]] = None,
+        acumulado: Union[bool, Iterable[str]] = False
+    ) -> Dict[str, List[float]]:
+        """
+        Séries de 12 meses do ano para vários prefixos de conta (normalizados,
+        ex.: '1', '23', '3110'), numa única varredura. Só contas analíticas, com
+        o sinal das redutoras "(-)".
 
-            cursor.execute(sql_mov, tuple(params_mov))
-            rows_mov = cursor.fetchall()
+        `acumulado`: False -> movimento de cada mês; True -> saldo acumulado
+        (base histórica anterior ao ano + movimentos) para todos os prefixos;
+        uma coleção de prefixos -> acumula só esses.
+        """
+        return self.obter_series_mensais_lote([cliente_id], ano, prefixos, filiais, acumulado)[int(cliente_id)]
 
-            for r in rows_mov:
-                mes = int(r[0]) if r[0] else 0
-                if mes < 1 or mes > 12:
+    def obter_series_mensais_lote(
+        self,
+        cliente_ids: List[int],
+        ano: int,
+        prefixos: List[str],
+        filiais: Optional[List[int]] = None,
+        acumulado: Union[bool, Iterable[str]] = False,
+        falhas: Optional[Set[int]] = None
+    ) -> Dict[int, Dict[str, List[float]]]:
+        """
+        obter_series_mensais para vários clientes: as empresas sem base local
+        de saldos são lidas em blocos de `CODIGOEMPRESA IN (...)`. Se a consulta
+        de um bloco falhar, suas empresas recebem séries zeradas e, quando
+        `falhas` é dado, entram nele.
+        """
+        prefixos = list(dict.fromkeys(normalizar_codigo(p) for p in prefixos if normalizar_codigo(p)))
+        if acumulado is True:
+            acumulados = set(prefixos)
+        elif acumulado is False:
+            acumulados = set()
+        else:
+            acumulados = {normalizar_codigo(p) for p in acumulado} & set(prefixos)
+        # O 1º dígito do código é o mesmo com ou sem pontuação: filtra por ele no banco
+        # e casa o prefixo completo (normalizado) aqui
+        grupos = sorted({p[0] for p in prefixos})
+        grupos_com_base = sorted({p[0] for p in acumulados})
+        ids = list(dict.fromkeys(int(cid) for cid in cliente_ids))
+
+        def vazio() -> Dict[str, List[float]]:
+            return {prefixo: [0.0] * 12 for prefixo in prefixos}
+
+        if not prefixos:
+            return {cid: vazio() for cid in ids}
+
+        resultado: Dict[int, Dict[str, List[float]]] = {}
+        pendentes: List[int] = []
+        for cid in ids:
+            store = self._store_para(cid)
+            if store is not None:
+                try:
+                    linhas = store.movimentos_mensais(cid, ano, grupos, grupos_com_base, filiais)
+                    resultado[cid] = self._montar_series(linhas, prefixos, acumulados)
                     continue
+                except Exception as e:
+                    print(f"Erro ao obter séries mensais da base de saldos: {e}")
+            pendentes.append(cid)
 
-                nome_conta = str(r[2]).strip() if r[2] else ''
-                saldo = float(r[3]) if r[3] else 0.0
-                if nome_conta.startswith('(-)'):
-                    saldo = -saldo
+        data_inicio_ano = date(ano, 1, 1)
+        data_fim_ano = date(ano + 1, 1, 1)
 
-                movimentos_mensais[mes - 1] += saldo
+        def em(lista: List[str]) -> str:
+            return "(" + " OR ".join("S.CODIGOCONTACONTABIL STARTING WITH ?" for _ in lista) + ")" if lista else "1 = 0"
 
-            # 3) Série acumulada: base histórica + incrementos mês a mês
-            acumulado = saldo_base
-            for i in range(12):
-                acumulado += movimentos_mensais[i]
-                totais[i] = acumulado
+        for bloco, empresas_str in self._blocos_empresas(pendentes):
+            conn = None
+            try:
+                conn = self._get_connection()
+                cursor = conn.cursor()
 
-            return totais
-
-        except Exception as e:
-            print(f"Erro ao obter evolução dos ativos: {e}")
-            return [0.0] * 12
-        finally:
-            if conn: conn.close()
+                # Mês 0 = tudo antes do ano (base das séries acumuladas), calculado na
+                # tabela derivada para poder agrupar por ele
+                sql = f"""
+                    SELECT
+                      X.EMPRESA,
+                      X.MES,
+                      X.COD_CONTA,
+                      X.NOME_CONTA,
+                      CASE
+                        WHEN X.NATUREZA = 1 THEN SUM(X.DEBITO) - SUM(X.CREDITO)
+                        ELSE SUM(X.CREDITO) - SUM(X.DEBITO)
+                      END AS SALDO
+                    FROM (
+                      SELECT
+                        S.CODIGOEMPRESA AS EMPRESA,
+                        CASE WHEN S.DATA < ? THEN 0 ELSE EXTRACT(MONTH FROM S.DATA) END AS MES,
+                        S.CODIGOCONTACONTABIL AS COD_CONTA,
+                        P.NOME AS NOME_CONTA,
+                        P.NATUREZA,
+                        CAST(S.VALORDEBITO AS DECIMAL(15, 2)) AS DEBITO,
+                        CAST(S.VALORCREDITO AS DECIMAL(15, 2)) AS CREDITO
+                      FROM TABSALDOCONTABIL S
+                      JOIN TABPLANOCONTAS P ON P.CODIGO = S.CODIGOCONTACONTABIL AND P.CODIGOPLANOCONTAS = 11
+                      WHERE S.INICIAL NOT IN (2, 4, 5)
+                        AND S.CODIGOEMPRESA IN ({empresas_str})
+                        AND S.DATA < ?
+                        AND P.TIPO <> 1
+                        AND ((S.DATA >= ? AND {em(grupos)}) OR (S.DATA < ? AND {em(grupos_com_base)}))
+                """
+                params: List[Any] = [
+                    data_inicio_ano, data_fim_ano,
+                    data_inicio_ano, *grupos, data_inicio_ano, *grupos_com_base,
+                ]
+
+                if filiais:
+                    filiais_str = ",".join(map(str, filiais))
+                    sql += f" AND S.CODIGOFILIAL IN ({filiais_str})"
+
+                sql += """
+                    ) X
+                    GROUP BY
+                      X.EMPRESA,
+                      X.MES,
+                      X.COD_CONTA,
+                      X.NOME_CONTA,
+                      X.NATUREZA
+                """
+
+                cursor.execute(sql, tuple(params))
+
+                linhas: Dict[int, List[Tuple[int, str, float]]] = {cid: [] for cid in bloco}
+                for r in cursor.fetchall():
+                    nome_conta = str(r[3]).strip() if r[3] else ''
+                    saldo = float(r[4]) if r[4] else 0.0
+                    if nome_conta.startswith('(-)'):
+                        saldo = -saldo
+                    linhas.setdefault(int(r[0]), []).append(
+                        (int(r[1]) if r[1] is not None else -1, str(r[2]).strip() if r[2] else '', saldo)
+                    )
+
+                for cid in bloco:
+                    resultado[cid] = self._montar_series(linhas[cid], prefixos, acumulados)
+
+            except Exception as e:
+                print(f"Erro ao obter séries mensais: {e}")
+                for cid in bloco:
+                    resultado[cid] = vazio()
+                if falhas is not None:
+                    falhas.update(bloco)
+            finally:
+                if conn: conn.close()
+
+        return resultado
 
     def obter_dados_brutos(
         self,
@@ -353,11 +629,20 @@ class DatabaseDataProvider(DataProvider):
         anos: List[int],
         meses: List[int],
         filiais: Optional[List[int]] = None
-    ) -> List[Dict[str, Any]]:
+    ) -> LedgerFrame:
         """
         Executa o SELECT bruto agrupado diretamente no banco.
         Igual à consulta validada via DBeaver/Power BI.
         """
+        store = self._store_para(cliente_id) if anos else None
+        if store is not None:
+            try:
+                return LedgerFrame.de_contas(
+                    store.totais_por_conta(cliente_id, self._competencias(anos, meses), filiais)
+                )
+            except Exception as e:
+                print(f"Erro ao obter dados brutos da base de saldos: {e}")
+
         conn = None
         try:
             conn = self._get_connection()
@@ -387,14 +672,11 @@ class DatabaseDataProvider(DataProvider):
             if filiais:
                 filiais_str = ",".join(map(str, filiais))
                 sql += f" AND S.CODIGOFILIAL IN ({filiais_str})"
-                
-            if anos:
-                anos_str = ",".join(map(str, anos))
-                sql += f" AND EXTRACT(YEAR FROM S.DATA) IN ({anos_str})"
-                
-            if meses:
-                meses_str = ",".join(map(str, meses))
-                sql += f" AND EXTRACT(MONTH FROM S.DATA) IN ({meses_str})"
+
+            filtro_sql, filtro_params = self._filtro_periodo(anos, meses)
+            if filtro_sql:
+                sql += f" AND {filtro_sql}"
+                params.extend(filtro_params)
 
             sql += """
                 GROUP BY
@@ -408,151 +690,449 @@ class DatabaseDataProvider(DataProvider):
 
             cursor.execute(sql, tuple(params))
             rows = cursor.fetchall()
-            
-            dados = []
-            for r in rows:
-                codigo = str(r[0]).strip() if r[0] else ''
-                nome = str(r[1]).strip() if r[1] else ''
-                saldo = float(r[6]) if r[6] else 0.0
-                if nome.startswith('(-)'):
-                    saldo = -saldo
-                dados.append({
-                    'codigo': codigo,
-                    'nome': nome,
-                    'tipo': str(r[2]).strip(),
-                    'natureza': str(r[3]).strip(),
-                    'debito': float(r[4]) if r[4] else 0.0,
-                    'credito': float(r[5]) if r[5] else 0.0,
-                    'saldo': saldo
-                })
-            
-            return dados
+
+            return LedgerFrame.de_contas(rows)
 
         except Exception as e:
             print(f"Erro ao obter dados brutos: {e}")
+            return LedgerFrame.de_contas([])
+        finally:
+            if conn: conn.close()
+
+    # --- Fonte da base local de saldos (SaldoStore.sincronizar) ---
+
+    def obter_plano_contas(self) -> List[Tuple[str, str, int, int]]:
+        """(código, nome, tipo, natureza) de todas as contas do plano 11."""
+        conn = None
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT P.CODIGO, P.NOME, P.TIPO, P.NATUREZA FROM TABPLANOCONTAS P WHERE P.CODIGOPLANOCONTAS = 11"
+            )
+            return [
+                (str(r[0]).strip(), str(r[1]).strip() if r[1] else '', r[2], r[3])
+                for r in cursor.fetchall()
+                if r[0]
+            ]
+        except Exception as e:
+            print(f"Erro ao obter plano de contas: {e}")
             return []
         finally:
             if conn: conn.close()
 
+    def obter_assinaturas_mensais(self, cliente_id: int) -> Dict[int, str]:
+        """
+        Assinatura de cada competência (AAAAMM) da empresa: nº de linhas, somas e
+        soma de hashes das linhas. Muda quando qualquer lançamento do mês muda.
+        Levanta exceção em caso de erro (a sincronização não pode tomar "vazio" por verdade).
+        """
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT
+                  EXTRACT(YEAR FROM S.DATA) * 100 + EXTRACT(MONTH FROM S.DATA) AS COMPETENCIA,
+                  COUNT(*),
+                  SUM(CAST(S.VALORDEBITO AS DECIMAL(15, 2))),
+                  SUM(CAST(S.VALORCREDITO AS DECIMAL(15, 2))),
+                  SUM(MOD(HASH(
+                    S.CODIGOCONTACONTABIL || '|' || COALESCE(CAST(S.CODIGOFILIAL AS VARCHAR(10)), '') || '|' ||
+                    COALESCE(S.VALORDEBITO, 0) || '|' || COALESCE(S.VALORCREDITO, 0)
+                  ), 1000000007))
+                FROM TABSALDOCONTABIL S
+                WHERE S.INICIAL NOT IN (2, 4, 5)
+                  AND S.CODIGOEMPRESA = ?
+                GROUP BY 1
+            """, (cliente_id,))
+            return {
+                int(r[0]): f"{r[1]}:{r[2] or 0}:{r[3] or 0}:{r[4] or 0}"
+                for r in cursor.fetchall()
+                if r[0]
+            }
+        finally:
+            conn.close()
+
+    def obter_saldos_mensais(self, cliente_id: int, competencias: List[int]) -> List[LinhaSaldo]:
+        """
+        Débito/crédito (em centavos) por (competência, filial, conta) nas competências pedidas.
+        Levanta exceção em caso de erro, como obter_assinaturas_mensais.
+        """
+        if not competencias:
+            return []
+        intervalos = self._intervalos_competencias(sorted({(c // 100, c % 100) for c in competencias}))
+        faixas = " OR ".join("(S.DATA >= ? AND S.DATA < ?)" for _ in intervalos)
+        params: List[Any] = [cliente_id, *(d for intervalo in intervalos for d in intervalo)]
+
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT
+                  EXTRACT(YEAR FROM S.DATA) * 100 + EXTRACT(MONTH FROM S.DATA) AS COMPETENCIA,
+                  S.CODIGOFILIAL,
+                  S.CODIGOCONTACONTABIL,
+                  SUM(CAST(S.VALORDEBITO AS DECIMAL(15, 2))),
+                  SUM(CAST(S.VALORCREDITO AS DECIMAL(15, 2)))
+                FROM TABSALDOCONTABIL S
+                WHERE S.INICIAL NOT IN (2, 4, 5)
+                  AND S.CODIGOEMPRESA = ?
+                  AND ({faixas})
+                GROUP BY 1, 2, 3
+            """, tuple(params))
+
+            def centavos(valor) -> int:
+                return int(round(Decimal(str(valor)) * 100)) if valor else 0
+
+            return [
+                (
+                    int(r[0]),
+                    int(r[1]) if r[1] is not None else SEM_FILIAL,
+                    str(r[2]).strip(),
+                    centavos(r[3]),
+                    centavos(r[4]),
+                )
+                for r in cursor.fetchall()
+                if r[2]
+            ]
+        finally:
+            conn.close()
+
+    def obter_snapshot(
+        self,
+        cliente_id: int,
+        anos: List[int],
+        meses: List[int],
+        filiais: Optional[List[int]] = None
+    ) -> LedgerSnapshot:
+        """
+        Busca numa única varredura os dados brutos do Período Atual e do
+        Período Anterior, separados por uma flag de período.
+        """
+        return self.obter_snapshots_lote([cliente_id], anos, meses, filiais)[int(cliente_id)]
+
+    def obter_snapshots_lote(
+        self,
+        cliente_ids: List[int],
+        anos: List[int],
+        meses: List[int],
+        filiais: Optional[List[int]] = None
+    ) -> Dict[int, LedgerSnapshot]:
+        """
+        obter_snapshot para vários clientes: as empresas sem base local de
+        saldos são lidas em blocos de `CODIGOEMPRESA IN (...)`, com a empresa
+        como mais uma coluna do agrupamento, e separadas aqui.
+        """
+        periodo_atual = {"anos": list(anos or []), "meses": list(meses or [])}
+        periodo_ant = self._determinar_periodo_anterior(anos, meses)
+
+        resultado: Dict[int, LedgerSnapshot] = {}
+        pendentes: List[int] = []
+        for cid in dict.fromkeys(int(c) for c in cliente_ids):
+            store = self._store_para(cid) if anos else None
+            if store is not None:
+                try:
+                    comp_atual = self._competencias(anos, meses)
+                    # Como no CASE da consulta: mês nos dois recortes conta só no atual
+                    comp_ant = [
+                        c for c in self._competencias(periodo_ant["anos"], periodo_ant["meses"])
+                        if c not in comp_atual
+                    ]
+                    resultado[cid] = LedgerSnapshot(
+                        atual=LedgerFrame.de_contas(store.totais_por_conta(cid, comp_atual, filiais)),
+                        anterior=LedgerFrame.de_contas(store.totais_por_conta(cid, comp_ant, filiais)),
+                        periodo_atual=periodo_atual,
+                        periodo_anterior=periodo_ant,
+                    )
+                    continue
+                except Exception as e:
+                    print(f"Erro ao obter snapshot da base de saldos: {e}")
+            pendentes.append(cid)
+
+        filtro_atual, params_atual = self._filtro_periodo(anos, meses)
+        filtro_ant, params_ant = self._filtro_periodo(periodo_ant["anos"], periodo_ant["meses"])
+        if not filtro_atual:
+            # Sem filtro de período os dois recortes se sobrepõem: busca em separado
+            for cid in pendentes:
+                resultado[cid] = LedgerSnapshot(
+                    atual=self.obter_dados_brutos(cid, anos, meses, filiais),
+                    anterior=self.obter_dados_brutos(
+                        cid, periodo_ant["anos"], periodo_ant["meses"], filiais
+                    ),
+                    periodo_atual=periodo_atual,
+                    periodo_anterior=periodo_ant,
+                )
+            return resultado
+
+        for bloco, empresas_str in self._blocos_empresas(pendentes):
+            conn = None
+            try:
+                conn = self._get_connection()
+                cursor = conn.cursor()
+
+                # A flag é calculada na tabela derivada para poder agrupar por ela
+                sql = f"""
+                    SELECT
+                      X.EMPRESA,
+                      X.PERIODO_ATUAL,
+                      X.COD_CONTA,
+                      X.NOME_CONTA,
+                      CASE WHEN X.TIPO = 1 THEN 'Sintetica' ELSE 'Analitica' END AS TIPO_CONTA,
+                      CASE WHEN X.NATUREZA = 1 THEN 'Devedora' ELSE 'Credora' END AS NATUREZA,
+                      SUM(X.DEBITO) AS DEBITO,
+                      SUM(X.CREDITO) AS CREDITO,
+                      CASE
+                        WHEN X.NATUREZA = 1 THEN SUM(X.DEBITO) - SUM(X.CREDITO)
+                        ELSE SUM(X.CREDITO) - SUM(X.DEBITO)
+                      END AS SALDO
+                    FROM (
+                      SELECT
+                        S.CODIGOEMPRESA AS EMPRESA,
+                        CASE WHEN {filtro_atual} THEN 1 ELSE 0 END AS PERIODO_ATUAL,
+                        S.CODIGOCONTACONTABIL AS COD_CONTA,
+                        P.NOME AS NOME_CONTA,
+                        P.TIPO,
+                        P.NATUREZA,
+                        CAST(S.VALORDEBITO AS DECIMAL(15, 2)) AS DEBITO,
+                        CAST(S.VALORCREDITO AS DECIMAL(15, 2)) AS CREDITO
+                      FROM TABSALDOCONTABIL S
+                      JOIN TABPLANOCONTAS P ON P.CODIGO = S.CODIGOCONTACONTABIL AND P.CODIGOPLANOCONTAS = 11
+                      WHERE S.INICIAL NOT IN (2, 4, 5)
+                        AND S.CODIGOEMPRESA IN ({empresas_str})
+                        AND (({filtro_atual}) OR ({filtro_ant}))
+                """
+                params: List[Any] = [*params_atual, *params_atual, *params_ant]
+
+                if filiais:
+                    filiais_str = ",".join(map(str, filiais))
+                    sql += f" AND S.CODIGOFILIAL IN ({filiais_str})"
+
+                sql += """
+                    ) X
+                    GROUP BY
+                      X.EMPRESA,
+                      X.PERIODO_ATUAL,
+                      X.COD_CONTA,
+                      X.NOME_CONTA,
+                      X.TIPO,
+                      X.NATUREZA
+                    ORDER BY
+                      X.COD_CONTA
+                """
+
+                cursor.execute(sql, tuple(params))
+                rows = cursor.fetchall()
+
+                # Um frame para o bloco inteiro, repartido por (empresa, período) pelas posições
+                frame = LedgerFrame.de_linhas(
+                    rows,
+                    ('empresa', 'periodo_atual', *LedgerFrame.COLUNAS_CONTA),
+                    textos=('codigo', 'nome', 'tipo', 'natureza'),
+                    valores=('debito', 'credito', 'saldo'),
+                )
+                frame.inverter_redutoras('nome', 'saldo')
+                frame.df['empresa'] = frame.df['empresa'].astype('int64')
+                frame.df['periodo_atual'] = frame.df['periodo_atual'].astype('int64')
+                posicoes = frame.df.groupby(['empresa', 'periodo_atual'], sort=False).indices
+                vazio = np.array([], dtype=np.int64)
+
+                for cid in bloco:
+                    resultado[cid] = LedgerSnapshot(
+                        atual=frame.linhas(posicoes.get((cid, 1), vazio), LedgerFrame.COLUNAS_CONTA),
+                        anterior=frame.linhas(posicoes.get((cid, 0), vazio), LedgerFrame.COLUNAS_CONTA),
+                        periodo_atual=periodo_atual,
+                        periodo_anterior=periodo_ant,
+                    )
+
+            except Exception as e:
+                print(f"Erro ao obter snapshot contábil: {e}")
+                for cid in bloco:
+                    resultado[cid] = LedgerSnapshot([], [], periodo_atual, periodo_ant, completo=False)
+            finally:
+                if conn: conn.close()
+
+        return resultado
+
+    def _consulta_balancete(
+        self,
+        cliente_id: int,
+        anos: List[int],
+        meses: List[int],
+        filiais: Optional[List[int]] = None
+    ) -> Tuple[str, List[Any]]:
+        """SQL e parâmetros do balancete (uma linha por filial e conta)."""
+        sql = """
+            SELECT
+              E.CODIGO AS COD_EMPRESA,
+              E.NOME AS NOME_EMPRESA,
+              F.CODIGO AS COD_FILIAL,
+              F.NOME AS NOME_FILIAL,
+              F.FANTASIA AS NOME_FANTASIA_FILIAL,
+              S.CODIGOCONTACONTABIL AS COD_CONTA_CONTABIL,
+              MIN(S.INICIAL) AS SALDO_INICIAL,
+              P.NOME AS NOME_CONTA,
+              CASE
+                WHEN P.TIPO = 1 THEN 'Sintetica'
+                ELSE 'Analitica'
+              END AS TIPO_CONTA,
+              CASE
+                WHEN P.NATUREZA = 1 THEN 'Devedora'
+                ELSE 'Credora'
+              END AS NATUREZA,
+              SUBSTRING(S.CODIGOCONTACONTABIL FROM 1 FOR 1) AS COD_GRUPO,
+              SUM(CAST(S.VALORDEBITO AS DECIMAL(15, 2))) AS DEBITO,
+              SUM(CAST(S.VALORCREDITO AS DECIMAL(15, 2))) AS CREDITO,
+              CASE
+                WHEN P.NATUREZA = 1 THEN 
+                  SUM(CAST(S.VALORDEBITO AS DECIMAL(15, 2))) - SUM(CAST(S.VALORCREDITO AS DECIMAL(15, 2)))
+                ELSE 
+                  SUM(CAST(S.VALORCREDITO AS DECIMAL(15, 2))) - SUM(CAST(S.VALORDEBITO AS DECIMAL(15, 2)))
+              END AS SALDO
+            FROM
+              TABSALDOCONTABIL S
+            JOIN TABPLANOCONTAS P 
+              ON P.CODIGO = S.CODIGOCONTACONTABIL                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                               
+            JOIN TABEMPRESAS E 
+              ON E.CODIGO = S.CODIGOEMPRESA 
+            LEFT JOIN TABFILIAL F 
+              ON E.CODIGO = F.CODIGOEMPRESA AND F.CODIGO = S.CODIGOFILIAL
+            WHERE
+              S.INICIAL NOT IN (2, 4, 5)
+              AND S.CODIGOEMPRESA = ?
+        """
+        params = [cliente_id]
+
+        if filiais:
+            filiais_str = ",".join(map(str, filiais))
+            sql += f" AND S.CODIGOFILIAL IN ({filiais_str})"
+
+        filtro_sql, filtro_params = self._filtro_periodo(anos, meses)
+        if filtro_sql:
+            sql += f" AND {filtro_sql}"
+            params.extend(filtro_params)
+
+        sql += """
+            GROUP BY
+              E.CODIGO,\
+              E.NOME,
+              F.CODIGO,
+              F.NOME,
+              F.FANTASIA,
+              S.CODIGOCONTACONTABIL,
+              P.NOME,
+              P.TIPO,
+              P.NATUREZA,
+              SUBSTRING(S.CODIGOCONTACONTABIL FROM 1 FOR 1)
+            ORDER BY
+              S.CODIGOCONTACONTABIL
+        """
+        return sql, params
+
+    @staticmethod
+    def _frame_balancete(rows: List[Any]) -> LedgerFrame:
+        balancete = LedgerFrame.de_linhas(rows, DatabaseDataProvider.COLUNAS_BALANCETE, textos=(
+            'nome_empresa', 'nome_filial', 'nome_fantasia_filial', 'cod_conta_contabil',
+            'nome_conta', 'tipo_conta', 'natureza', 'cod_grupo',
+        ), valores=('saldo_inicial', 'debito', 'credito', 'saldo'))
+        balancete.inverter_redutoras('nome_conta', 'saldo')
+        return balancete
+
     def obter_balancete(
         self,
         cliente_id: int,
         anos: List[int],
         meses: List[int],
         filiais: Optional[List[int]] = None
-    ) -> List[Dict[str, Any]]:
+    ) -> LedgerFrame:
         """
         Retorna os dados do balancete contábil conforme consulta SQL.
         Aplica os filtros de ano, meses e filiais selecionados no relatório.
+        As linhas vêm em colunas (LedgerFrame); `registros()` gera os dicts da API.
         """
         conn = None
         try:
             conn = self._get_connection()
             cursor = conn.cursor()
-
-            sql = """
-                SELECT
-                  E.CODIGO AS COD_EMPRESA,
-                  E.NOME AS NOME_EMPRESA,
-                  F.CODIGO AS COD_FILIAL,
-                  F.NOME AS NOME_FILIAL,
-                  F.FANTASIA AS NOME_FANTASIA_FILIAL,
-                  S.CODIGOCONTACONTABIL AS COD_CONTA_CONTABIL,
-                  MIN(S.INICIAL) AS SALDO_INICIAL,
-                  P.NOME AS NOME_CONTA,
-                  CASE
-                    WHEN P.TIPO = 1 THEN 'Sintetica'
-                    ELSE 'Analitica'
-                  END AS TIPO_CONTA,
-                  CASE
-                    WHEN P.NATUREZA = 1 THEN 'Devedora'
-                    ELSE 'Credora'
-                  END AS NATUREZA,
-                  SUBSTRING(S.CODIGOCONTACONTABIL FROM 1 FOR 1) AS COD_GRUPO,
-                  SUM(CAST(S.VALORDEBITO AS DECIMAL(15, 2))) AS DEBITO,
-                  SUM(CAST(S.VALORCREDITO AS DECIMAL(15, 2))) AS CREDITO,
-                  CASE
-                    WHEN P.NATUREZA = 1 THEN 
-                      SUM(CAST(S.VALORDEBITO AS DECIMAL(15, 2))) - SUM(CAST(S.VALORCREDITO AS DECIMAL(15, 2)))
-                    ELSE 
-                      SUM(CAST(S.VALORCREDITO AS DECIMAL(15, 2))) - SUM(CAST(S.VALORDEBITO AS DECIMAL(15, 2)))
-                  END AS SALDO
-                FROM
-                  TABSALDOCONTABIL S
-                JOIN TABPLANOCONTAS P 
-                  ON P.CODIGO = S.CODIGOCONTACONTABIL                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                               
-                JOIN TABEMPRESAS E 
-                  ON E.CODIGO = S.CODIGOEMPRESA 
-                LEFT JOIN TABFILIAL F 
-                  ON E.CODIGO = F.CODIGOEMPRESA AND F.CODIGO = S.CODIGOFILIAL
-                WHERE
-                  S.INICIAL NOT IN (2, 4, 5)
-                  AND S.CODIGOEMPRESA = ?
-            """
-            params = [cliente_id]
-
-            if filiais:
-                filiais_str = ",".join(map(str, filiais))
-                sql += f" AND S.CODIGOFILIAL IN ({filiais_str})"
-
-            if anos:
-                anos_str = ",".join(map(str, anos))
-                sql += f" AND EXTRACT(YEAR FROM S.DATA) IN ({anos_str})"
-
-            if meses:
-                meses_str = ",".join(map(str, meses))
-                sql += f" AND EXTRACT(MONTH FROM S.DATA) IN ({meses_str})"
-
-            sql += """
-                GROUP BY
-                  E.CODIGO,\
-                  E.NOME,
-                  F.CODIGO,
-                  F.NOME,
-                  F.FANTASIA,
-                  S.CODIGOCONTACONTABIL,
-                  P.NOME,
-                  P.TIPO,
-                  P.NATUREZA,
-                  SUBSTRING(S.CODIGOCONTACONTABIL FROM 1 FOR 1)
-                ORDER BY
-                  S.CODIGOCONTACONTABIL
-            """
-
+            sql, params = self._consulta_balancete(cliente_id, anos, meses, filiais)
             cursor.execute(sql, tuple(params))
-            rows = cursor.fetchall()
-
-            balancete = []
-            for r in rows:
-                nome_conta = str(r[7]).strip() if r[7] else ''
-                saldo = float(r[13]) if r[13] else 0.0
-                if nome_conta.startswith('(-)'):
-                    saldo = -saldo
-                balancete.append({
-                    'cod_empresa': r[0],
-                    'nome_empresa': str(r[1]).strip() if r[1] else '',
-                    'cod_filial': r[2],
-                    'nome_filial': str(r[3]).strip() if r[3] else '',
-                    'nome_fantasia_filial': str(r[4]).strip() if r[4] else '',
-                    'cod_conta_contabil': str(r[5]).strip() if r[5] else '',
-                    'saldo_inicial': float(r[6]) if r[6] else 0.0,
-                    'nome_conta': nome_conta,
-                    'tipo_conta': str(r[8]).strip() if r[8] else '',
-                    'natureza': str(r[9]).strip() if r[9] else '',
-                    'cod_grupo': str(r[10]).strip() if r[10] else '',
-                    'debito': float(r[11]) if r[11] else 0.0,
-                    'credito': float(r[12]) if r[12] else 0.0,
-                    'saldo': saldo,
-                })
-
-            return balancete
+            return self._frame_balancete(cursor.fetchall())
 
         except Exception as e:
             print(f"Erro ao obter balancete: {e}")
-            return []
+            return LedgerFrame.de_linhas([], self.COLUNAS_BALANCETE)
         finally:
             if conn: conn.close()
 
+    def iterar_balancete(
+        self,
+        cliente_id: int,
+        anos: List[int],
+        meses: List[int],
+        filiais: Optional[List[int]] = None,
+        tamanho_lote: int = 1000,
+        agrupar_por: str = 'filial',
+        nivel: Optional[int] = None
+    ) -> Iterator[LedgerFrame]:
+        """
+        Balancete em lotes de até `tamanho_lote` linhas, nas colunas de
+        colunas_balancete(agrupar_por). Sem agregação (filial, sem nível) as
+        linhas de obter_balancete vêm direto do cursor (fetchmany): a memória
+        fica no tamanho de um lote, não do balancete. Com agregação
+        (agregar_balancete) os lotes do cursor são consolidados antes de sair.
+        A conexão fica presa até o consumidor esgotar (ou fechar) o gerador.
+        Erros sobem para quem consome, que já pode ter enviado parte das linhas.
+        """
+        lotes = self._lotes_balancete(cliente_id, anos, meses, filiais, tamanho_lote)
+        if agrupar_por == 'filial' and nivel is None:
+            yield from lotes
+            return
+        balancete = agregar_balancete(lotes, agrupar_por, nivel)
+        for inicio in range(0, len(balancete), tamanho_lote):
+            yield balancete.linhas(np.arange(inicio, min(inicio + tamanho_lote, len(balancete))))
+
+    def _lotes_balancete(
+        self,
+        cliente_id: int,
+        anos: List[int],
+        meses: List[int],
+        filiais: Optional[List[int]],
+        tamanho_lote: int
+    ) -> Iterator[LedgerFrame]:
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            sql, params = self._consulta_balancete(cliente_id, anos, meses, filiais)
+            cursor.execute(sql, tuple(params))
+            while True:
+                rows = cursor.fetchmany(tamanho_lote)
+                if not rows:
+                    return
+                yield self._frame_balancete(rows)
+        finally:
+            conn.close()
+
+    def obter_nomes_clientes(self, cliente_ids: List[int], falhas: Optional[Set[int]] = None) -> Dict[int, str]:
+        """
+        Nome (TABEMPRESAS) de cada cliente encontrado, em blocos de `CODIGO IN (...)`.
+        Os clientes de um bloco cuja consulta falhou entram em `falhas`, quando dado.
+        """
+        nomes: Dict[int, str] = {}
+        for bloco, empresas_str in self._blocos_empresas(cliente_ids):
+            conn = None
+            try:
+                conn = self._get_connection()
+                cur = conn.cursor()
+                cur.execute(f"SELECT CODIGO, NOME FROM TABEMPRESAS WHERE CODIGO IN ({empresas_str})")
+                for codigo, nome in cur.fetchall():
+                    nomes[int(codigo)] = str(nome).strip() if nome else ''
+            except Exception as e:
+                print(f"Erro ao obter nomes dos clientes: {e}")
+                if falhas is not None:
+                    falhas.update(bloco)
+            finally:
+                if conn: conn.close()
+        return nomes
+
     def obter_contexto_dados(
         self, 
         cliente_id: int, 
@@ -563,35 +1143,62 @@ class DatabaseDataProvider(DataProvider):
         """
         Consome os dados brutos do SELECT e apenas soma os totais para o Dashboard.
         """
-        nome_cliente = f"Empresa {cliente_id}"
-        conn = None
-        try:
-            conn = self._get_connection()
-            cur = conn.cursor()
-            cur.execute("SELECT NOME FROM TABEMPRESAS WHERE CODIGO = ?", (cliente_id,))
-            row = cur.fetchone()
-            if row: nome_cliente = str(row[0]).strip()
-        except:
-            pass
-        finally:
-            if conn: conn.close()
+        return self.obter_contextos_dados_lote([cliente_id], anos, meses, filiais)[int(cliente_id)]
 
-        # 1. Puxa os dados 100% brutos da consulta
-        dados_contabeis = self.obter_dados_brutos(cliente_id, anos, meses, filiais)
-        
-        # 2. Função "burra e direta" para somar pelo prefixo da conta
-        def somar_em(dados: List[Dict[str, Any]], prefixo: str) -> float:
-            total = 0.0
-            for conta in dados:
-                if conta.get('tipo') == 'Sintetica':
-                    continue
-                cod_limpo = ''.join(c for c in conta['codigo'] if c.isdigit())
-                if cod_limpo.startswith(prefixo):
-                    total += conta['saldo']
-            return total
+    def obter_contextos_dados_lote(
+        self,
+        cliente_ids: List[int],
+        anos: List[int],
+        meses: List[int],
+        filiais: Optional[List[int]] = None
+    ) -> Dict[int, Dict[str, Any]]:
+        """
+        Contextos de vários clientes com o mesmo período: nomes, snapshots e
+        séries mensais são buscados em lote (poucas consultas por bloco de
+        empresas, não por cliente) e os KPIs calculados em memória.
+        """
+        ids = list(dict.fromkeys(int(cid) for cid in cliente_ids))
+        # Nome provisório ("Empresa N") por falha de consulta não pode ir para o cache
+        falhas: Set[int] = set()
+        nomes = self.obter_nomes_clientes(ids, falhas=falhas)
 
-        def somar(prefixo: str) -> float:
-            return somar_em(dados_contabeis, prefixo)
+        # 1. Puxa os dados 100% brutos (período atual e anterior numa só consulta)
+        snapshots = self.obter_snapshots_lote(ids, anos, meses, filiais)
+
+        # Todas as séries dos gráficos de evolução numa única varredura:
+        # ativos e PL acumulados (saldo), vendas e despesas pelo movimento do mês
+        ano_referencia = anos[0] if anos else datetime.now().year
+        series = self.obter_series_mensais_lote(
+            ids, ano_referencia, ['1', '23', '3110', '3150', '3180', '5'], filiais, acumulado=['1', '23'],
+            falhas=falhas
+        )
+
+        return {
+            cid: self._montar_contexto_dados(
+                cid, nomes.get(cid) or f"Empresa {cid}", snapshots[cid], series[cid], anos, meses, filiais,
+                completo=cid not in falhas
+            )
+            for cid in ids
+        }
+
+    def _montar_contexto_dados(
+        self,
+        cliente_id: int,
+        nome_cliente: str,
+        snapshot: LedgerSnapshot,
+        series: Dict[str, List[float]],
+        anos: List[int],
+        meses: List[int],
+        filiais: Optional[List[int]] = None,
+        completo: bool = True
+    ) -> Dict[str, Any]:
+        """
+        KPIs, indicadores e séries dos gráficos a partir dos dados já buscados.
+        completo=False (alguma consulta falhou) impede o contexto de ir para o cache.
+        """
+        # 2. Soma pelo prefixo da conta via índice (códigos normalizados uma única vez)
+        somar = snapshot.indice_atual.somar
+        somar_ant = snapshot.indice_anterior.somar
 
         # --- KPIs extraídos diretamente da soma das contas ---
         receita_bruta_3110 = abs(somar('3110'))
@@ -599,14 +1206,10 @@ class DatabaseDataProvider(DataProvider):
         impostos_vendas_3180 = abs(somar('3180'))
         vendas_liquidas = receita_bruta_3110 - cancelamentos_3150 - impostos_vendas_3180
 
-        periodo_ant = self._determinar_periodo_anterior(anos, meses)
-        dados_contabeis_ant = self.obter_dados_brutos(
-            cliente_id, periodo_ant["anos"], periodo_ant["meses"], filiais
-        )
         vendas_liquidas_ant = (
-            abs(somar_em(dados_contabeis_ant, '3110'))
-            - abs(somar_em(dados_contabeis_ant, '3150'))
-            - abs(somar_em(dados_contabeis_ant, '3180'))
+            abs(somar_ant('3110'))
+            - abs(somar_ant('3150'))
+            - abs(somar_ant('3180'))
         )
         if abs(vendas_liquidas_ant) > 0:
             vendas_liquidas_variacao_raw = ((vendas_liquidas - vendas_liquidas_ant) / abs(vendas_liquidas_ant)) * 100
@@ -694,11 +1297,14 @@ class DatabaseDataProvider(DataProvider):
         periodo_display = f"{','.join(map(str, meses))}/{','.join(map(str, anos))}" if meses and anos else "Todo o período"
 
         # --- CAPEX com comparação de período ---
-        capex_data = self.obter_capex(cliente_id, anos, meses, filiais)
-        ano_referencia = anos[0] if anos else datetime.now().year
-        ativos_evo = self.obter_ativos_evolucao(cliente_id, ano_referencia, filiais)
+        capex_data = self.obter_capex(cliente_id, anos, meses, filiais, snapshot=snapshot)
+        vendas_evo = [
+            abs(bruta) - abs(cancelamentos) - abs(impostos_vendas)
+            for bruta, cancelamentos, impostos_vendas in zip(series['3110'], series['3150'], series['3180'])
+        ]
 
         return {
+            "completo": snapshot.completo and completo,
             "dados": {
                 "cliente_id": cliente_id,
                 "cliente_nome": nome_cliente,
@@ -777,11 +1383,10 @@ class DatabaseDataProvider(DataProvider):
                 "tabela_roe": []
             },
             "graficos_data": {
-                # Ativos recebe série mensal real; demais séries temporais permanecem zeradas
-                "vendas_evo": [0.0]*12, 
-                "custos_evo": [0.0]*12,  
-                "ativos_evo": ativos_evo,
-                "pl_evo": [0.0]*12,      
+                "vendas_evo": vendas_evo,
+                "custos_evo": [abs(v) for v in series['5']],
+                "ativos_evo": series['1'],
+                "pl_evo": series['23'],
                 "composicao_ativo": [ativo_circ, ativo_n_circ],
                 "composicao_passivo": [passivo_circ, passivo_n_circ],
                 "custos_detalhe": [abs(somar('53050')), abs(somar('53350')), desp_tributarias]
@@ -0,0 +1,126 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+from flask import Flask, Response, make_response, request
+
+
+class HttpCache:
+    """
+    Validadores (ETag) e Cache-Control das rotas de relatório e API.
+
+    A ETag sai do hash das `partes` informadas pela rota (parâmetros e a
+    impressão digital dos dados) + versão + mtime de templates e folhas de
+    estilo. Se o cliente já tem essa versão (If-None-Match), `responder`
+    devolve 304 sem chamar `gerar`, ou seja, sem renderizar template, gráficos
+    ou PDF. Períodos fechados recebem `max-age` longo; os abertos, `no-cache`
+    (o navegador sempre revalida, mas só baixa de novo se mudou).
+    """
+
+    def __init__(
+        self,
+        versao: str = "1",
+        arquivos: Optional[List[str]] = None,
+        max_age_fechado: int = 24 * 3600,
+        compartilhado: bool = True,
+    ) -> None:
+        self.versao = versao
+        self.arquivos = list(arquivos or [])
+        self.max_age_fechado = max_age_fechado
+        # public: o proxy também pode guardar; private: só o navegador
+        self.compartilhado = compartilhado
+
+    def _assinatura_arquivos(self) -> str:
+        partes = []
+        for caminho in self.arquivos:
+            try:
+                partes.append(f"{caminho}:{os.path.getmtime(caminho)}")
+            except OSError:
+                partes.append(f"{caminho}:-")
+        return "|".join(partes)
+
+    def etag(self, *partes: Any) -> str:
+        h = hashlib.sha256()
+        h.update(f"v{self.versao}\n{self._assinatura_arquivos()}\n".encode("utf-8"))
+        h.update(json.dumps(partes, sort_keys=True, default=str).encode("utf-8"))
+        return h.hexdigest()[:32]
+
+    def cache_control(self, fechado: bool) -> str:
+        if not fechado:
+            return "no-cache"
+        escopo = "public" if self.compartilhado else "private"
+        return f"{escopo}, max-age={self.max_age_fechado}"
+
+    def validar(self, etag: Optional[str], fechado: bool = False, vary: Optional[str] = None) -> Optional[Response]:
+        """304 se o cliente já tem `etag` (None = ainda desconhecida); senão None."""
+        if etag is not None and request.if_none_match.contains(etag):
+            return self._nao_modificado(etag, self.cache_control(fechado), vary)
+        return None
+
+    def responder(
+        self,
+        etag: Optional[str],
+        gerar: Callable[[], Any],
+        fechado: bool = False,
+        vary: Optional[str] = None,
+    ) -> Response:
+        """
+        304 se o cliente já tem `etag`; senão a resposta de `gerar()` com ETag e
+        Cache-Control. Com etag=None ela é calculada do corpo gerado (poupa só a
+        transferência); em stream não há corpo para isso e a resposta vai com
+        no-cache, sem ETag. `vary` sai também no 304. Respostas de erro passam
+        sem cabeçalhos de cache.
+        """
+        cache_control = self.cache_control(fechado)
+        nao_modificado = self.validar(etag, fechado, vary)
+        if nao_modificado is not None:
+            return nao_modificado
+
+        response = make_response(gerar())
+        if response.status_code != 200:
+            return response
+        if vary:
+            response.headers["Vary"] = vary
+        if etag is None:
+            if response.is_streamed:
+                response.headers["Cache-Control"] = self.cache_control(False)
+                return response
+            etag = hashlib.sha256(response.get_data()).hexdigest()[:32]
+            if request.if_none_match.contains(etag):
+                return self._nao_modificado(etag, cache_control, vary)
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = cache_control
+        return response
+
+    @staticmethod
+    def _nao_modificado(etag: str, cache_control: str, vary: Optional[str] = None) -> Response:
+        response = make_response("", 304)
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = cache_control
+        if vary:
+            response.headers["Vary"] = vary
+        return response
+
+
+def versionar_estaticos(app: Flask) -> None:
+    """
+    Acrescenta `?v=<mtime>` às URLs de 'static' e 'serve_img' geradas por
+    url_for: o arquivo pode ficar em cache por muito tempo e uma nova versão
+    muda a URL.
+    """
+    pastas: Dict[str, str] = {
+        "static": app.static_folder or os.path.join(app.root_path, "static"),
+        "serve_img": os.path.join(app.root_path, "img"),
+    }
+
+    @app.url_defaults
+    def _versao_arquivo(endpoint: str, values: Dict[str, Any]) -> None:
+        pasta = pastas.get(endpoint)
+        if pasta is None or "filename" not in values or "v" in values:
+            return
+        try:
+            values["v"] = int(os.path.getmtime(os.path.join(pasta, values["filename"])))
+        except OSError:
+            pass
@@ -0,0 +1,253 @@
+from __future__ import annotations
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+
+class FilaCheiaError(RuntimeError):
+    """A fila já tem `max_fila` jobs pendentes ou em execução."""
+
+
+# executar(job_id, progresso) -> caminho do arquivo de resultado
+# progresso(concluidos, falhas) atualiza o andamento do job
+Progresso = Callable[[int, int], None]
+Executor = Callable[[str, Progresso], str]
+
+
+class JobQueue:
+    """
+    Fila local de jobs (sem broker externo).
+
+    O estado dos jobs fica numa tabela SQLite, consultável por qualquer thread
+    ou processo; a execução roda num ThreadPoolExecutor limitado a `max_workers`.
+    Jobs pendentes + em execução nunca passam de `max_fila`.
+    Resultados mais antigos que `ttl_resultado` são apagados.
+
+    Cada job guarda o processo dono (host:pid), que renova `atualizado_em` dos
+    seus jobs pendentes e em execução a cada `timeout_inativo / 3` segundos.
+    Um job sem esse sinal há mais de `timeout_inativo` (processo morto ou
+    reiniciado antes de terminá-lo) é marcado como erro, esteja pendente ou em
+    execução: só o dono executaria o job, então ele não andaria mais. Jobs de
+    processos vivos nunca expiram, por mais que esperem vaga. O status só
+    avança (pendente -> executando -> concluido/erro).
+
+    Diretórios, tabela e threads só são criados no primeiro uso: construir a
+    fila no import de um módulo não tem efeito colateral (os workers spawn
+    reimportam o main.py).
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        dir_resultados: str,
+        max_workers: int = 2,
+        max_fila: int = 20,
+        ttl_resultado: float = 24 * 3600.0,
+        timeout_inativo: float = 30 * 60.0,
+    ) -> None:
+        self.db_path = db_path
+        self.dir_resultados = dir_resultados
+        self.max_workers = max_workers
+        self.max_fila = max_fila
+        self.ttl_resultado = ttl_resultado
+        self.timeout_inativo = timeout_inativo
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._ativos = 0
+        self._dono = ""
+        self._parar = threading.Event()
+
+    def _preparar(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+                os.makedirs(self.dir_resultados, exist_ok=True)
+                self._criar_tabela()
+                # Definido no primeiro uso: depois de um fork o pid já é o do processo que roda os jobs
+                self._dono = f"{socket.gethostname()}:{os.getpid()}"
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job")
+                threading.Thread(target=self._bater, name="job-heartbeat", daemon=True).start()
+            return self._executor
+
+    def _bater(self) -> None:
+        """Renova atualizado_em dos jobs ativos deste processo enquanto ele estiver vivo."""
+        while not self._parar.wait(self.timeout_inativo / 3):
+            try:
+                with self._conectar() as conn:
+                    conn.execute(
+                        "UPDATE jobs SET atualizado_em = ? "
+                        "WHERE status IN ('pendente', 'executando') AND dono = ?",
+                        (time.time(), self._dono),
+                    )
+            except Exception as e:
+                print(f"Erro ao renovar jobs ativos: {e}")
+
+    def parar(self) -> None:
+        self._parar.set()
+
+    @contextmanager
+    def _conectar(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _criar_tabela(self) -> None:
+        with self._conectar() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    tipo TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    params TEXT,
+                    total INTEGER NOT NULL DEFAULT 0,
+                    concluidos INTEGER NOT NULL DEFAULT 0,
+                    falhas INTEGER NOT NULL DEFAULT 0,
+                    arquivo TEXT,
+                    erro TEXT,
+                    criado_em REAL NOT NULL,
+                    iniciado_em REAL,
+                    atualizado_em REAL,
+                    finalizado_em REAL,
+                    dono TEXT
+                )
+            """)
+            colunas = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "dono" not in colunas:
+                conn.execute("ALTER TABLE jobs ADD COLUMN dono TEXT")
+
+    def _atualizar(self, job_id: str, de_status: Optional[str] = None, **campos: Any) -> bool:
+        """Atualiza o job (só se ainda estiver em `de_status`, quando dado); True se atualizou."""
+        campos["atualizado_em"] = time.time()
+        colunas = ", ".join(f"{nome} = ?" for nome in campos)
+        sql = f"UPDATE jobs SET {colunas} WHERE id = ?"
+        params = [*campos.values(), job_id]
+        if de_status is not None:
+            sql += " AND status = ?"
+            params.append(de_status)
+        with self._conectar() as conn:
+            return conn.execute(sql, params).rowcount > 0
+
+    def enfileirar(self, tipo: str, params: Dict[str, Any], total: int, executar: Executor) -> str:
+        """Registra o job e agenda a execução; levanta FilaCheiaError se a fila estiver cheia."""
+        executor = self._preparar()
+        self.limpar_expirados()
+        with self._lock:
+            if self._ativos >= self.max_fila:
+                raise FilaCheiaError(f"Fila cheia ({self.max_fila} jobs pendentes ou em execução)")
+            self._ativos += 1
+
+        job_id = uuid.uuid4().hex
+        try:
+            with self._conectar() as conn:
+                conn.execute(
+                    "INSERT INTO jobs (id, tipo, status, params, total, criado_em, atualizado_em, dono) "
+                    "VALUES (?, ?, 'pendente', ?, ?, ?, ?, ?)",
+                    (job_id, tipo, json.dumps(params), total, time.time(), time.time(), self._dono),
+                )
+            executor.submit(self._rodar, job_id, executar)
+        except Exception:
+            with self._lock:
+                self._ativos -= 1
+            raise
+        return job_id
+
+    def _rodar(self, job_id: str, executar: Executor) -> None:
+        try:
+            if not self._atualizar(job_id, de_status="pendente", status="executando", iniciado_em=time.time()):
+                return
+
+            def progresso(concluidos: int, falhas: int) -> None:
+                self._atualizar(job_id, concluidos=concluidos, falhas=falhas)
+
+            try:
+                arquivo = executar(job_id, progresso)
+            except Exception as e:
+                print(f"Erro no job {job_id}: {e}")
+                self._atualizar(
+                    job_id, de_status="executando",
+                    status="erro", erro=f"{type(e).__name__}: {e}", finalizado_em=time.time(),
+                )
+                return
+            if not self._atualizar(
+                job_id, de_status="executando", status="concluido", arquivo=arquivo, finalizado_em=time.time()
+            ):
+                # Já encerrado por outro caminho: o resultado não seria mais servido nem apagado
+                try:
+                    os.remove(arquivo)
+                except OSError:
+                    pass
+        finally:
+            with self._lock:
+                self._ativos -= 1
+
+    def caminho_resultado(self, job_id: str, extensao: str = ".zip") -> str:
+        return os.path.join(self.dir_resultados, f"{job_id}{extensao}")
+
+    def obter(self, job_id: str) -> Optional[Dict[str, Any]]:
+        self._preparar()
+        with self._conectar() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["params"] = json.loads(job["params"]) if job["params"] else {}
+        job["progresso"] = round(
+            (job["concluidos"] + job["falhas"]) / job["total"] * 100, 1
+        ) if job["total"] else 0.0
+        return job
+
+    def limpar_expirados(self) -> int:
+        """
+        Apaga jobs finalizados (e seus arquivos) mais antigos que ttl_resultado
+        e encerra como erro os pendentes ou em execução cujo processo dono
+        parou de dar sinal de vida. Os deste processo estão vivos por definição
+        e ficam de fora.
+        """
+        self._preparar()
+        agora = time.time()
+        limite = agora - self.ttl_resultado
+        with self._conectar() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'erro', erro = 'Interrompido (sem atualização)', finalizado_em = ? "
+                "WHERE status IN ('pendente', 'executando') AND atualizado_em < ? "
+                "AND (dono IS NULL OR dono != ?)",
+                (agora, agora - self.timeout_inativo, self._dono),
+            )
+            rows = conn.execute(
+                "SELECT id, arquivo FROM jobs WHERE status IN ('concluido', 'erro') AND finalizado_em < ?",
+                (limite,),
+            ).fetchall()
+            for row in rows:
+                if row["arquivo"]:
+                    try:
+                        os.remove(row["arquivo"])
+                    except OSError:
+                        pass
+            conn.executemany("DELETE FROM jobs WHERE id = ?", [(row["id"],) for row in rows])
+        return len(rows)
+
+    def stats(self) -> Dict[str, Any]:
+        self._preparar()
+        with self._conectar() as conn:
+            por_status = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        with self._lock:
+            ativos = self._ativos
+        return {
+            "max_workers": self.max_workers,
+            "max_fila": self.max_fila,
+            "ativos": ativos,
+            "por_status": por_status,
+        }
@@ -0,0 +1,100 @@
+from __future__ import annotations
+import json
+import zlib
+from typing import Any, Iterable, Iterator, Optional, Sequence
+
+from .ledger import LedgerFrame
+
+try:
+    import brotli
+except ImportError:
+    # Opcional: sem o pacote 'brotli' a negociação fica só no gzip
+    brotli = None
+
+
+# Formatos de linhas_em_stream
+FORMATOS = ("json", "ndjson", "colunas")
+
+
+def _dumps(valor: Any) -> str:
+    return json.dumps(valor, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def linhas_em_stream(
+    lotes: Iterable[LedgerFrame],
+    colunas: Sequence[str],
+    formato: str = "json",
+) -> Iterator[bytes]:
+    """
+    Serializa os lotes à medida que chegam do cursor, sem montar a resposta inteira.
+
+    - json: {"dados": [{...}, ...], "total": N} (mesmo conteúdo da resposta antiga)
+    - ndjson: um objeto por linha e, no fim, {"total": N}
+    - colunas: {"colunas": [...]} na primeira linha, depois uma lista de
+      valores por linha e, no fim, {"total": N}; os nomes não se repetem
+
+    Se a leitura falhar no meio, as linhas já enviadas ficam e o fim traz
+    {"erro": ...} (no json, a chave "erro" junto de "total").
+    """
+    total = 0
+    erro: Optional[str] = None
+    if formato == "colunas":
+        yield (_dumps({"colunas": list(colunas)}) + "\n").encode("utf-8")
+    elif formato == "json":
+        yield b'{"dados":['
+    try:
+        for lote in lotes:
+            if formato == "colunas":
+                pedaco = "".join(_dumps(linha) + "\n" for linha in lote.listas(colunas))
+            elif formato == "ndjson":
+                pedaco = "".join(_dumps(linha) + "\n" for linha in lote.registros())
+            else:
+                pedaco = ",".join(_dumps(linha) for linha in lote.registros())
+                if total and pedaco:
+                    pedaco = "," + pedaco
+            total += len(lote)
+            if pedaco:
+                yield pedaco.encode("utf-8")
+    except Exception as e:
+        print(f"Erro ao transmitir linhas: {e}")
+        erro = str(e)
+
+    fim = {"total": total} if erro is None else {"total": total, "erro": erro}
+    if formato == "json":
+        yield ("]," + _dumps(fim)[1:]).encode("utf-8")
+    else:
+        yield (_dumps(fim) + "\n").encode("utf-8")
+
+
+def codificacao_aceita(accept_encodings) -> Optional[str]:
+    """'br' (se o pacote brotli existir), 'gzip' ou None, conforme o Accept-Encoding."""
+    if brotli is not None and accept_encodings.quality("br") > 0:
+        return "br"
+    if accept_encodings.quality("gzip") > 0:
+        return "gzip"
+    return None
+
+
+def comprimir_stream(partes: Iterable[bytes], codificacao: Optional[str]) -> Iterator[bytes]:
+    """
+    Comprime pedaço a pedaço. Cada pedaço é descarregado (sync flush) ao ser
+    escrito, para o navegador descomprimir e usar as linhas já recebidas.
+    """
+    if codificacao is None:
+        yield from partes
+        return
+    if codificacao == "br":
+        compressor = brotli.Compressor(quality=5)
+        for parte in partes:
+            saida = compressor.process(parte) + compressor.flush()
+            if saida:
+                yield saida
+        yield compressor.finish()
+        return
+    # wbits=31: formato gzip (cabeçalho + CRC), não zlib cru
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for parte in partes:
+        saida = compressor.compress(parte) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if saida:
+            yield saida
+    yield compressor.flush()
@@ -0,0 +1,242 @@
+from __future__ import annotations
+from typing import Dict, Any, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+
+def normalizar_codigo(codigo: str) -> str:
+    """Mantém só os dígitos do código da conta ('3.1.10.001' -> '3110001')."""
+    return ''.join(c for c in (codigo or '') if c.isdigit())
+
+
+def _categoria_limpa(valores: Sequence[Any]) -> pd.Categorical:
+    """Textos do banco como categórico: cada valor distinto é convertido e limpo uma vez."""
+    codigos, distintos = pd.factorize(np.array(valores, dtype=object), use_na_sentinel=True)
+    # O último item atende o sentinela -1 (NULL); valores que só diferiam nos espaços se fundem
+    limpos = np.array([str(v).strip() if v else '' for v in distintos] + [''], dtype=object)
+    codigos_limpos, categorias = pd.factorize(limpos)
+    return pd.Categorical.from_codes(codigos_limpos[codigos], categories=categorias)
+
+
+def mapear_distintos(valores: Sequence[Any], funcao) -> np.ndarray:
+    """`funcao` aplicada a cada valor distinto de `valores` (e não a cada linha); NULL vira ''."""
+    codigos, distintos = pd.factorize(np.asarray(valores, dtype=object), use_na_sentinel=True)
+    return np.array([funcao(v) for v in distintos] + [funcao('')], dtype=object)[codigos]
+
+
+def _ordenavel(serie: pd.Series) -> pd.Series:
+    # Categóricos ordenam pela ordem das categorias (a de chegada); como texto, pelo valor
+    return serie.astype(object) if isinstance(serie.dtype, pd.CategoricalDtype) else serie
+
+
+class LedgerFrame:
+    """
+    Linhas do razão em colunas (DataFrame): valores em float64 e textos
+    (códigos, nomes, filiais) como categóricos, convertidos uma vez por valor
+    distinto e não por linha. Somas, filtros e agrupamentos rodam vetorizados;
+    dicts por linha só são montados na borda da API, em `registros()`.
+    """
+
+    # Colunas do recorte por conta (dados brutos / snapshot)
+    COLUNAS_CONTA = ('codigo', 'nome', 'tipo', 'natureza', 'debito', 'credito', 'saldo')
+
+    def __init__(self, df: pd.DataFrame) -> None:
+        self.df = df
+
+    @classmethod
+    def de_linhas(
+        cls,
+        linhas: Iterable[Sequence[Any]],
+        colunas: Sequence[str],
+        textos: Sequence[str] = (),
+        valores: Sequence[str] = (),
+    ) -> LedgerFrame:
+        """
+        Monta a partir das tuplas do cursor. `textos` viram categóricos limpos,
+        `valores` (DECIMAL) viram float64 com NULL = 0; o resto fica como veio.
+        """
+        linhas = list(linhas)
+        dados = list(zip(*linhas)) if linhas else [()] * len(colunas)
+        df = {}
+        for nome, coluna in zip(colunas, dados):
+            if nome in textos:
+                df[nome] = _categoria_limpa(coluna)
+            elif nome in valores:
+                df[nome] = np.fromiter((float(v) if v else 0.0 for v in coluna), dtype=np.float64, count=len(coluna))
+            else:
+                df[nome] = np.array(coluna, dtype=object)
+        return cls(pd.DataFrame(df, columns=list(colunas)))
+
+    @classmethod
+    def de_contas(cls, linhas: Iterable[Sequence[Any]]) -> LedgerFrame:
+        """
+        Linhas (COD, NOME, TIPO, NATUREZA, DEBITO, CREDITO, SALDO) do banco,
+        com o sinal do saldo invertido nas contas redutoras "(-)".
+        """
+        frame = cls.de_linhas(
+            linhas,
+            cls.COLUNAS_CONTA,
+            textos=('codigo', 'nome', 'tipo', 'natureza'),
+            valores=('debito', 'credito', 'saldo'),
+        )
+        frame.inverter_redutoras('nome', 'saldo')
+        return frame
+
+    @classmethod
+    def concatenar(cls, frames: Iterable[LedgerFrame], colunas: Sequence[str]) -> LedgerFrame:
+        """Junta os lotes (ex.: os de um fetchmany) num frame só."""
+        dfs = [frame.df for frame in frames]
+        if not dfs:
+            return cls.de_linhas([], colunas)
+        return cls(pd.concat(dfs, ignore_index=True))
+
+    def agregar(
+        self,
+        chaves: Sequence[str],
+        primeiros: Sequence[str] = (),
+        somas: Sequence[str] = (),
+    ) -> LedgerFrame:
+        """
+        Uma linha por combinação de `chaves` (groupby vetorizado): `somas`
+        somadas e `primeiros` com o primeiro valor do grupo. Chaves NULL formam
+        grupo próprio e continuam NULL. Sai ordenado pelas chaves, na ordem dada.
+        """
+        chaves = list(chaves)
+        if not len(self.df):
+            return LedgerFrame(self.df[chaves + list(primeiros) + list(somas)].copy())
+        grupos = self.df.groupby(chaves, sort=False, dropna=False, observed=True).ngroup().to_numpy()
+        agregacoes = {**{c: 'first' for c in chaves + list(primeiros)}, **{c: 'sum' for c in somas}}
+        df = self.df.groupby(grupos).agg(agregacoes)
+        return LedgerFrame(df.sort_values(chaves, key=_ordenavel, ignore_index=True))
+
+    def inverter_redutoras(self, coluna_nome: str, coluna_saldo: str) -> None:
+        redutora = self.df[coluna_nome].str.startswith('(-)').to_numpy(dtype=bool)
+        self.df[coluna_saldo] = np.where(redutora, -self.df[coluna_saldo].to_numpy(), self.df[coluna_saldo].to_numpy())
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    def linhas(
+        self,
+        posicoes: Union[np.ndarray, List[int]],
+        colunas: Optional[Sequence[str]] = None,
+    ) -> LedgerFrame:
+        """Subconjunto pelas posições (ex.: de um groupby(...).indices), opcionalmente só com `colunas`."""
+        df = self.df.iloc[posicoes] if colunas is None else self.df.iloc[posicoes][list(colunas)]
+        return LedgerFrame(df.reset_index(drop=True))
+
+    def codigos_normalizados(self, coluna: str = 'codigo') -> np.ndarray:
+        """Código de cada linha só com dígitos, normalizando cada código distinto uma vez."""
+        categorias = self.df[coluna].cat
+        normalizados = [normalizar_codigo(c) for c in categorias.categories.to_numpy(dtype=object)]
+        return np.array(normalizados + [''], dtype=object)[categorias.codes.to_numpy()]
+
+    def registros(self) -> List[Dict[str, Any]]:
+        """Lista de dicts (uma por linha), para serializar na resposta da API."""
+        return self.df.to_dict('records')
+
+    def listas(self, colunas: Optional[Sequence[str]] = None) -> List[List[Any]]:
+        """Uma lista de valores por linha, na ordem de `colunas` (formato colunar da API)."""
+        df = self.df if colunas is None else self.df[list(colunas)]
+        return df.to_numpy(dtype=object).tolist()
+
+
+class LedgerIndex:
+    """
+    Índice de somas por prefixo de conta, montado uma vez por conjunto de dados.
+
+    Os códigos (apenas contas analíticas) são normalizados e ordenados uma única vez;
+    para cada campo guarda-se a soma acumulada. Todas as contas de um prefixo ocupam
+    uma faixa contígua da lista ordenada, então o total de qualquer prefixo sai de
+    duas buscas binárias e uma subtração: O(log n), com memo por prefixo.
+    Com um LedgerFrame a montagem toda é vetorizada (máscara, argsort, cumsum).
+    """
+
+    CAMPOS = ('saldo', 'debito', 'credito')
+
+    def __init__(self, contas: Union[LedgerFrame, Iterable[Dict[str, Any]]]) -> None:
+        if isinstance(contas, LedgerFrame):
+            df = contas.df
+            analiticas = (df['tipo'] != 'Sintetica').to_numpy(dtype=bool)
+            codigos = contas.codigos_normalizados()[analiticas]
+            valores = {campo: df[campo].to_numpy(dtype=np.float64)[analiticas] for campo in self.CAMPOS}
+        else:
+            analiticas = [conta for conta in contas if conta.get('tipo') != 'Sintetica']
+            codigos = np.array([normalizar_codigo(conta.get('codigo', '')) for conta in analiticas], dtype=object)
+            valores = {
+                campo: np.array([conta.get(campo, 0.0) for conta in analiticas], dtype=np.float64)
+                for campo in self.CAMPOS
+            }
+
+        codigos = codigos.astype(str)
+        ordem = np.argsort(codigos, kind='stable')
+        self._codigos: np.ndarray = codigos[ordem]
+        self._acumulados: Dict[str, np.ndarray] = {
+            campo: np.concatenate(([0.0], np.cumsum(valores[campo][ordem])))
+            for campo in self.CAMPOS
+        }
+        self._memo: Dict[tuple, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._codigos)
+
+    def _faixa(self, prefixo: str) -> tuple:
+        # Códigos só têm dígitos: qualquer caractere acima de '9' fecha a faixa do prefixo
+        inicio, fim = np.searchsorted(self._codigos, [prefixo, prefixo + ':'])
+        return int(inicio), int(fim)
+
+    def somar(self, prefixo: str, campo: str = 'saldo') -> float:
+        """Total de `campo` das contas analíticas cujo código começa com `prefixo`."""
+        chave = (prefixo, campo)
+        total = self._memo.get(chave)
+        if total is None:
+            inicio, fim = self._faixa(prefixo)
+            acumulado = self._acumulados[campo]
+            # Valores são DECIMAL(15, 2): arredondar elimina o resíduo da subtração em float
+            total = round(float(acumulado[fim] - acumulado[inicio]), 2) if fim > inicio else 0.0
+            self._memo[chave] = total
+        return total
+
+
+class LedgerSnapshot:
+    """
+    Recorte do razão (TABSALDOCONTABIL agrupado por conta) usado por um relatório.
+    Guarda o Período Atual e o Período Anterior, buscados uma única vez,
+    para que KPIs, CAPEX e variações trabalhem sobre as mesmas linhas.
+    """
+
+    def __init__(
+        self,
+        atual: Union[LedgerFrame, List[Dict[str, Any]]],
+        anterior: Union[LedgerFrame, List[Dict[str, Any]]],
+        periodo_atual: Dict[str, List[int]],
+        periodo_anterior: Dict[str, List[int]],
+        completo: bool = True,
+    ) -> None:
+        self.atual = atual
+        self.anterior = anterior
+        self.periodo_atual = periodo_atual
+        self.periodo_anterior = periodo_anterior
+        # False quando a consulta falhou e as listas vieram vazias por isso
+        self.completo = completo
+        self._indice_atual: Optional[LedgerIndex] = None
+        self._indice_anterior: Optional[LedgerIndex] = None
+
+    @property
+    def indice_atual(self) -> LedgerIndex:
+        if self._indice_atual is None:
+            self._indice_atual = LedgerIndex(self.atual)
+        return self._indice_atual
+
+    @property
+    def indice_anterior(self) -> LedgerIndex:
+        if self._indice_anterior is None:
+            self._indice_anterior = LedgerIndex(self.anterior)
+        return self._indice_anterior
+
+    def __repr__(self) -> str:
+        return (
+            f"LedgerSnapshot(atual={len(self.atual)} contas, "
+            f"anterior={len(self.anterior)} contas)"
+        )
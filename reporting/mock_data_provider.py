@@ -1,5 +1,5 @@
 ﻿from __future__ import annotations
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 
 from .data_provider import DataProvider
 
@@ -19,6 +19,31 @@ class MockDataProvider(DataProvider):
     def listar_clientes(self) -> List[Dict[str, Any]]:
         return self._clientes
 
+    def listar_clientes_pagina(
+        self,
+        query: Optional[str] = None,
+        min_id: Optional[int] = None,
+        max_id: Optional[int] = None,
+        sort: str = 'nome',
+        direction: str = 'asc',
+        offset: int = 0,
+        limit: int = 15
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        clientes = self._clientes
+        if query:
+            q = query.lower()
+            clientes = [
+                c for c in clientes
+                if q in str(c["codigo"]).lower() or q in c["nome"].lower() or q in c["fantasia"].lower()
+            ]
+        if min_id is not None:
+            clientes = [c for c in clientes if c["codigo"] >= min_id]
+        if max_id is not None:
+            clientes = [c for c in clientes if c["codigo"] <= max_id]
+        chave = (lambda c: c["codigo"]) if sort == 'codigo' else (lambda c: c["nome"].lower())
+        clientes = sorted(clientes, key=chave, reverse=(direction == 'desc'))
+        return clientes[offset:offset + limit], len(clientes)
+
     def listar_filiais(self, cliente_id: int) -> List[Dict[str, Any]]:
         return [{"codigo": 1, "nome": "Matriz", "fantasia": "Matriz"}]
 
@@ -0,0 +1,162 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class PdfArtifactCache:
+    """
+    Armazém de PDFs já renderizados, endereçados pelo conteúdo.
+
+    A chave é o hash do HTML renderizado + mtime das folhas de estilo + versão
+    do template: se nada disso mudou, o PDF gerado seria idêntico e os bytes
+    guardados são devolvidos sem passar pelo WeasyPrint.
+
+    Os arquivos ficam em `diretorio/<chave>.pdf`; `index.json` guarda tamanho e
+    último acesso de cada entrada para a remoção LRU acima de `max_bytes`.
+    """
+
+    INDICE = "index.json"
+
+    def __init__(
+        self,
+        diretorio: str,
+        arquivos_css: List[str],
+        versao_template: str = "1",
+        max_bytes: int = 1024 * 1024 * 1024,
+    ) -> None:
+        self.diretorio = diretorio
+        self.arquivos_css = list(arquivos_css)
+        self.versao_template = versao_template
+        self.max_bytes = max_bytes
+        os.makedirs(diretorio, exist_ok=True)
+        self._lock = threading.Lock()
+        self._indice: Dict[str, Dict[str, float]] = self._carregar_indice()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    # --- Chave ---
+
+    def _assinatura_css(self) -> str:
+        partes = []
+        for caminho in self.arquivos_css:
+            try:
+                partes.append(f"{caminho}:{os.path.getmtime(caminho)}")
+            except OSError:
+                partes.append(f"{caminho}:-")
+        return "|".join(partes)
+
+    def chave(self, html: str) -> str:
+        h = hashlib.sha256()
+        h.update(f"v{self.versao_template}\n{self._assinatura_css()}\n".encode("utf-8"))
+        h.update(html.encode("utf-8"))
+        return h.hexdigest()
+
+    # --- Índice ---
+
+    def _caminho_indice(self) -> str:
+        return os.path.join(self.diretorio, self.INDICE)
+
+    def _caminho(self, chave: str) -> str:
+        return os.path.join(self.diretorio, f"{chave}.pdf")
+
+    def _carregar_indice(self) -> Dict[str, Dict[str, float]]:
+        try:
+            with open(self._caminho_indice(), "r", encoding="utf-8") as f:
+                indice = json.load(f)
+        except (OSError, ValueError):
+            indice = {}
+        # Descarta entradas cujo arquivo sumiu
+        return {c: meta for c, meta in indice.items() if os.path.exists(self._caminho(c))}
+
+    def _salvar_indice(self) -> None:
+        fd, tmp = tempfile.mkstemp(dir=self.diretorio, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self._indice, f)
+            os.replace(tmp, self._caminho_indice())
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+    # --- Operações ---
+
+    def get(self, chave: str) -> Optional[bytes]:
+        try:
+            with open(self._caminho(chave), "rb") as f:
+                dados = f.read()
+        except OSError:
+            with self._lock:
+                self._stats["misses"] += 1
+                self._indice.pop(chave, None)
+            return None
+
+        with self._lock:
+            self._stats["hits"] += 1
+            self._indice[chave] = {"tamanho": len(dados), "ultimo_acesso": time.time()}
+        return dados
+
+    def put(self, chave: str, pdf_bytes: bytes) -> None:
+        if len(pdf_bytes) > self.max_bytes:
+            return
+        fd, tmp = tempfile.mkstemp(dir=self.diretorio, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(pdf_bytes)
+            os.replace(tmp, self._caminho(chave))
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            self._indice[chave] = {"tamanho": len(pdf_bytes), "ultimo_acesso": time.time()}
+            self._aplicar_limite()
+            self._salvar_indice()
+
+    def registrar_acesso(self, chave: str, tamanho: int) -> None:
+        """Conta um hit servido por outro processo (ex.: worker de lote) que leu o arquivo."""
+        with self._lock:
+            self._stats["hits"] += 1
+            self._indice[chave] = {"tamanho": tamanho, "ultimo_acesso": time.time()}
+
+    def _aplicar_limite(self) -> None:
+        """Remove as entradas menos acessadas até caber em max_bytes. Chamar com o lock."""
+        total = sum(meta["tamanho"] for meta in self._indice.values())
+        if total <= self.max_bytes:
+            return
+        for chave, meta in sorted(self._indice.items(), key=lambda item: item[1]["ultimo_acesso"]):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self._caminho(chave))
+            except OSError:
+                pass
+            del self._indice[chave]
+            total -= meta["tamanho"]
+            self._stats["evictions"] += 1
+
+    def obter_ou_gerar(self, html: str, gerar: Callable[[], bytes]) -> Tuple[str, bytes]:
+        """Retorna (chave, pdf_bytes), chamando `gerar` apenas em caso de miss."""
+        chave = self.chave(html)
+        pdf_bytes = self.get(chave)
+        if pdf_bytes is None:
+            pdf_bytes = gerar()
+            self.put(chave, pdf_bytes)
+        return chave, pdf_bytes
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                "entradas": len(self._indice),
+                "bytes": sum(meta["tamanho"] for meta in self._indice.values()),
+                "max_bytes": self.max_bytes,
+            }
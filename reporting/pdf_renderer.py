@@ -0,0 +1,232 @@
+from __future__ import annotations
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+# @import de folhas remotas (ex.: Google Fonts): as fontes vêm de `fontes_dir`, quando existe
+_IMPORT_REMOTO = re.compile(
+    r"@import\s+(?:url\(\s*['\"]?https?://[^)]*\)|['\"]https?://[^'\"]*['\"])[^;]*;",
+    re.IGNORECASE,
+)
+
+# Sem `fontes_dir` o @import do Google Fonts fica e estes hosts passam pelo fetcher
+_HOSTS_FONTES_REMOTAS = ("fonts.googleapis.com", "fonts.gstatic.com")
+
+_EXTENSOES_FONTE = {".ttf": "truetype", ".otf": "opentype", ".woff": "woff", ".woff2": "woff2"}
+_PESOS = {
+    "thin": 100, "extralight": 200, "light": 300, "regular": 400, "normal": 400,
+    "medium": 500, "semibold": 600, "bold": 700, "extrabold": 800, "black": 900,
+}
+
+
+def remover_imports_remotos(css: str) -> str:
+    return _IMPORT_REMOTO.sub("", css)
+
+
+def css_fontes_locais(fontes_dir: str) -> str:
+    """
+    @font-face para as fontes de `fontes_dir`.
+
+    Se existir `fonts.css` no diretório ele é usado como está; senão as regras
+    são montadas pelo nome dos arquivos no formato do Google Fonts
+    (`Inter-SemiBold.ttf`, `Poppins-BoldItalic.woff2`, `Inter-600.ttf`).
+    """
+    manual = os.path.join(fontes_dir, "fonts.css")
+    if os.path.isfile(manual):
+        with open(manual, "r", encoding="utf-8") as f:
+            return f.read()
+
+    regras = []
+    for nome in sorted(os.listdir(fontes_dir)):
+        base, ext = os.path.splitext(nome)
+        if ext.lower() not in _EXTENSOES_FONTE:
+            continue
+        familia, _, variante = base.partition("-")
+        variante = variante.lower()
+        italico = variante.endswith("italic")
+        variante = variante[: -len("italic")] if italico else variante
+        peso = int(variante) if variante.isdigit() else _PESOS.get(variante or "regular", 400)
+        regras.append(
+            "@font-face {"
+            f" font-family: '{familia}';"
+            f" src: url('{nome}') format('{_EXTENSOES_FONTE[ext.lower()]}');"
+            f" font-weight: {peso};"
+            f" font-style: {'italic' if italico else 'normal'};"
+            " }"
+        )
+    return "\n".join(regras)
+
+
+class PdfRenderer:
+    """
+    Renderizador WeasyPrint com estado aquecido entre PDFs.
+
+    As folhas de estilo são lidas e parseadas uma vez, junto com uma
+    FontConfiguration compartilhada e as fontes locais de `fontes_dir`; cada
+    PDF só paga o layout. Todos os recursos do HTML são resolvidos localmente
+    pelo url_fetcher: `/static/...` e `/img/...` vêm do disco (sem requisição
+    ao próprio servidor), `data:` passa direto e o resto (CDNs) é bloqueado,
+    a menos que `permitir_rede=True`.
+
+    Sem `fontes_dir` (diretório ausente) o @import do Google Fonts é mantido e
+    só os hosts dele são liberados: as fontes são baixadas uma vez por
+    processo, ao parsear as folhas, em vez de o PDF cair nas fontes do sistema.
+    """
+
+    def __init__(
+        self,
+        static_dir: str,
+        arquivos_css: List[str],
+        img_dir: Optional[str] = None,
+        fontes_dir: Optional[str] = None,
+        permitir_rede: bool = False,
+    ) -> None:
+        from weasyprint import CSS
+        from weasyprint.text.fonts import FontConfiguration
+
+        self.static_dir = os.path.abspath(static_dir)
+        self.arquivos_css = list(arquivos_css)
+        self.img_dir = os.path.abspath(img_dir) if img_dir else None
+        self.fontes_dir = os.path.abspath(fontes_dir) if fontes_dir and os.path.isdir(fontes_dir) else None
+        self.permitir_rede = permitir_rede
+        if fontes_dir and self.fontes_dir is None:
+            print(
+                f"Aviso: diretório de fontes do PDF não encontrado ({fontes_dir}); "
+                "usando o @import do Google Fonts"
+            )
+
+        # CSS do próprio projeto servido da memória (já sem @import remoto)
+        self._css_local: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+        self._stats = {"pdfs": 0, "bloqueados": 0}
+
+        self.url_fetcher = _criar_url_fetcher(self._resolver)
+        self.font_config = FontConfiguration()
+
+        self.stylesheets = []
+        if self.fontes_dir:
+            self.stylesheets.append(CSS(
+                string=css_fontes_locais(self.fontes_dir),
+                base_url=self.fontes_dir + os.sep,
+                font_config=self.font_config,
+                url_fetcher=self.url_fetcher,
+            ))
+        for caminho in self.arquivos_css:
+            self.stylesheets.append(CSS(
+                string=self._ler_css(caminho).decode("utf-8"),
+                base_url=os.path.abspath(caminho),
+                font_config=self.font_config,
+                url_fetcher=self.url_fetcher,
+            ))
+
+    def _ler_css(self, caminho: str) -> bytes:
+        caminho = os.path.abspath(caminho)
+        with self._lock:
+            conteudo = self._css_local.get(caminho)
+        if conteudo is None:
+            with open(caminho, "r", encoding="utf-8") as f:
+                conteudo = f.read()
+            if self.fontes_dir:
+                conteudo = remover_imports_remotos(conteudo)
+            conteudo = conteudo.encode("utf-8")
+            with self._lock:
+                self._css_local[caminho] = conteudo
+        return conteudo
+
+    def _caminho_local(self, url: str) -> Optional[str]:
+        """Caminho no disco para URLs /static/... e /img/... (de qualquer host) ou file:// dentro dos diretórios."""
+        partes = urlsplit(url)
+        caminho = unquote(partes.path)
+        if partes.scheme == "file":
+            candidato = os.path.abspath(caminho)
+            raizes = [self.static_dir, self.img_dir, self.fontes_dir]
+            raizes += [os.path.dirname(os.path.abspath(c)) for c in self.arquivos_css]
+            if any(raiz and os.path.commonpath([raiz, candidato]) == raiz for raiz in raizes):
+                return candidato
+            return None
+        for prefixo, raiz in (("/static/", self.static_dir), ("/img/", self.img_dir)):
+            if raiz and caminho.startswith(prefixo):
+                candidato = os.path.abspath(os.path.join(raiz, caminho[len(prefixo):]))
+                # Não deixa "../" sair do diretório servido
+                if os.path.commonpath([raiz, candidato]) == raiz:
+                    return candidato
+        return None
+
+    def _resolver(self, url: str) -> Tuple[str, Any]:
+        """
+        Decide como atender uma URL: ("conteudo", (bytes, mime)), ("arquivo", caminho)
+        ou ("padrao", url) para o fetcher do WeasyPrint. Levanta ValueError se bloqueada.
+        """
+        if url.startswith("data:"):
+            return "padrao", url
+        caminho = self._caminho_local(url)
+        if caminho is not None:
+            if caminho.lower().endswith(".css"):
+                return "conteudo", (self._ler_css(caminho), "text/css")
+            return "arquivo", caminho
+        partes = urlsplit(url)
+        if partes.scheme in ("http", "https") and (
+            self.permitir_rede or (self.fontes_dir is None and partes.hostname in _HOSTS_FONTES_REMOTAS)
+        ):
+            return "padrao", url
+        with self._lock:
+            self._stats["bloqueados"] += 1
+        if url.lower().split("?")[0].endswith(".css"):
+            # Folha externa (ex.: CDN de ícones): segue sem ela, sem esperar timeout
+            return "conteudo", (b"", "text/css")
+        raise ValueError(f"Recurso externo bloqueado no PDF: {url}")
+
+    def renderizar(self, html: str, base_url: Optional[str] = None) -> bytes:
+        from weasyprint import HTML
+
+        pdf_bytes = HTML(string=html, base_url=base_url, url_fetcher=self.url_fetcher).write_pdf(
+            stylesheets=self.stylesheets,
+            font_config=self.font_config,
+        )
+        with self._lock:
+            self._stats["pdfs"] += 1
+        return pdf_bytes
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                "folhas": len(self.stylesheets),
+                "fontes_dir": self.fontes_dir,
+            }
+
+
+def _criar_url_fetcher(resolver):
+    """Adapta `resolver` à API de url_fetcher da versão instalada do WeasyPrint."""
+    from weasyprint.urls import path2url
+
+    try:
+        from weasyprint.urls import URLFetcher, URLFetcherResponse
+    except ImportError:
+        # WeasyPrint < 68: o fetcher é uma função que retorna um dict
+        from weasyprint import default_url_fetcher
+
+        def fetcher(url: str, timeout: int = 10, ssl_context=None) -> Dict[str, Any]:
+            tipo, valor = resolver(url)
+            if tipo == "conteudo":
+                conteudo, mime = valor
+                return {"string": conteudo, "mime_type": mime, "encoding": "utf-8", "redirected_url": url}
+            if tipo == "arquivo":
+                return default_url_fetcher(path2url(valor), timeout=timeout, ssl_context=ssl_context)
+            return default_url_fetcher(valor, timeout=timeout, ssl_context=ssl_context)
+
+        return fetcher
+
+    class _FetcherLocal(URLFetcher):
+        def fetch(self, url, headers=None):
+            tipo, valor = resolver(url)
+            if tipo == "conteudo":
+                conteudo, mime = valor
+                return URLFetcherResponse(url, conteudo, {"Content-Type": f"{mime}; charset=utf-8"})
+            if tipo == "arquivo":
+                return super().fetch(path2url(valor), headers)
+            return super().fetch(valor, headers)
+
+    return _FetcherLocal()
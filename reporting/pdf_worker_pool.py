@@ -0,0 +1,147 @@
+from __future__ import annotations
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional
+
+
+class PdfPoolOcupadoError(RuntimeError):
+    """Todos os workers estão ocupados e a fila de espera está cheia."""
+
+
+# --- Estado de cada processo worker (montado uma vez no initializer) ---
+
+_renderer = None
+
+
+def _inicializar_worker(config: Dict[str, Any]) -> None:
+    global _renderer
+    from .pdf_renderer import PdfRenderer
+
+    _renderer = PdfRenderer(**config)
+
+
+def _renderizar_pdf(html: str, base_url: Optional[str]) -> bytes:
+    return _renderer.renderizar(html, base_url=base_url)
+
+
+class PdfWorkerPool:
+    """
+    Layout do WeasyPrint fora do processo web.
+
+    Cada worker mantém um PdfRenderer aquecido (folhas de estilo, fontes) e
+    recebe HTML já renderizado, devolvendo os bytes do PDF. No máximo
+    `max_workers` PDFs rodam ao mesmo tempo e outros `max_fila` esperam; acima
+    disso `renderizar` aguarda até `espera_vaga` segundos por uma vaga e então
+    levanta PdfPoolOcupadoError (o chamador responde 503).
+    Com max_workers=0 o PDF é gerado no próprio processo, um por vez: o
+    PdfRenderer (e a FontConfiguration do WeasyPrint) não é seguro entre threads.
+    """
+
+    def __init__(
+        self,
+        config_renderer: Dict[str, Any],
+        max_workers: int = 2,
+        max_fila: int = 8,
+        espera_vaga: float = 5.0,
+        timeout: float = 120.0,
+    ) -> None:
+        self.config_renderer = config_renderer
+        self.max_workers = max_workers
+        self.max_fila = max_fila
+        self.espera_vaga = espera_vaga
+        self.timeout = timeout
+        self._vagas = threading.BoundedSemaphore(max(1, max_workers) + max_fila)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._renderer_local = None
+        # Serializa o uso do renderer local (max_workers=0) entre as threads do servidor
+        self._lock_local = threading.Lock()
+        self._lock = threading.Lock()
+        self._stats = {"pdfs": 0, "recusados": 0, "erros": 0, "em_andamento": 0}
+
+    def _obter_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    # spawn: não herda threads/conexões do servidor web
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_inicializar_worker,
+                    initargs=(self.config_renderer,),
+                )
+            return self._executor
+
+    def _descartar_executor(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _obter_renderer_local(self):
+        with self._lock:
+            if self._renderer_local is None:
+                from .pdf_renderer import PdfRenderer
+                self._renderer_local = PdfRenderer(**self.config_renderer)
+            return self._renderer_local
+
+    def _contar(self, campo: str, delta: int = 1) -> None:
+        with self._lock:
+            self._stats[campo] += delta
+
+    def _liberar_vaga(self, _futuro: Optional[Future] = None) -> None:
+        self._contar("em_andamento", -1)
+        self._vagas.release()
+
+    def renderizar(self, html: str, base_url: Optional[str] = None) -> bytes:
+        """HTML -> bytes do PDF, num worker. Levanta PdfPoolOcupadoError se não houver vaga."""
+        if not self._vagas.acquire(timeout=self.espera_vaga):
+            self._contar("recusados")
+            raise PdfPoolOcupadoError(
+                f"Geração de PDF ocupada ({self.max_workers} em execução, {self.max_fila} na fila)"
+            )
+        self._contar("em_andamento")
+
+        if self.max_workers <= 0:
+            try:
+                with self._lock_local:
+                    pdf_bytes = self._obter_renderer_local().renderizar(html, base_url=base_url)
+            except Exception:
+                self._contar("erros")
+                raise
+            finally:
+                self._liberar_vaga()
+            self._contar("pdfs")
+            return pdf_bytes
+
+        try:
+            futuro = self._obter_executor().submit(_renderizar_pdf, html, base_url)
+        except Exception:
+            self._liberar_vaga()
+            raise
+        # A vaga só volta quando o worker termina, mesmo que a requisição desista antes
+        futuro.add_done_callback(self._liberar_vaga)
+
+        try:
+            pdf_bytes = futuro.result(timeout=self.timeout)
+        except BrokenProcessPool:
+            # Worker morreu (ex.: falta de memória): recria o pool na próxima chamada
+            self._descartar_executor()
+            self._contar("erros")
+            raise
+        except Exception:
+            self._contar("erros")
+            raise
+        self._contar("pdfs")
+        return pdf_bytes
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                "max_workers": self.max_workers,
+                "max_fila": self.max_fila,
+            }
+
+    def fechar(self) -> None:
+        self._descartar_executor()
@@ -1,11 +1,12 @@
 from __future__ import annotations
-from typing import Dict, Any, List, Optional, Union
+from typing import Dict, Any, List, Optional, Tuple, Union
 import pandas as pd
 import numpy as np
 from datetime import datetime
 
 from .data_provider import DataProvider
-from .chart_service import ChartService
+from .chart_service import ChartService, LazyCharts
+from .context_cache import ContextCache, impressao_contexto
 
 
 class ReportService:
@@ -13,24 +14,78 @@ class ReportService:
     Serviço de relatório: compõe o contexto visual usando dados reais do DataProvider.
     """
 
-    def __init__(self, data_provider: DataProvider, chart_service: ChartService) -> None:
+    def __init__(
+        self,
+        data_provider: DataProvider,
+        chart_service: ChartService,
+        context_cache: Optional[ContextCache] = None
+    ) -> None:
         self.data_provider = data_provider
         self.charts = chart_service
+        self.context_cache = context_cache
 
-    def montar_contexto(
-        self, 
-        cliente_id: int, 
-        periodo: Optional[str] = None,
-        year: Optional[int] = None,
-        months: Optional[List[int]] = None,
-        branches: Optional[List[int]] = None
+    def obter_dados(
+        self,
+        cliente_id: int,
+        anos: List[int],
+        meses: List[int],
+        filiais: Optional[List[int]] = None
     ) -> Dict[str, Any]:
-        
+        """Contexto de dados do provider, passando pelo cache quando configurado."""
+        def calcular() -> Dict[str, Any]:
+            return self.data_provider.obter_contexto_dados(
+                cliente_id=cliente_id,
+                anos=anos,
+                meses=meses,
+                filiais=filiais
+            )
+
+        if self.context_cache is None:
+            return calcular()
+        return self.context_cache.obter_ou_calcular(cliente_id, anos, meses, filiais, calcular)
+
+    def obter_dados_lote(
+        self,
+        cliente_ids: List[int],
+        anos: List[int],
+        meses: List[int],
+        filiais: Optional[List[int]] = None
+    ) -> Dict[int, Dict[str, Any]]:
         """
-        Monta o contexto do relatório. Aceita tanto o formato legado (periodo string)
-        quanto o novo formato (listas de ints).
+        obter_dados para vários clientes: os que não estão no cache são
+        buscados de uma vez em obter_contextos_dados_lote.
         """
-        
+        contextos: Dict[int, Dict[str, Any]] = {}
+        faltantes: List[int] = []
+        for cliente_id in cliente_ids:
+            contexto = None
+            if self.context_cache is not None:
+                contexto = self.context_cache.obter(cliente_id, anos, meses, filiais)
+            if contexto is None:
+                faltantes.append(cliente_id)
+            else:
+                contextos[cliente_id] = contexto
+
+        if faltantes:
+            novos = self.data_provider.obter_contextos_dados_lote(
+                cliente_ids=faltantes,
+                anos=anos,
+                meses=meses,
+                filiais=filiais
+            )
+            for cliente_id, contexto in novos.items():
+                if self.context_cache is not None:
+                    self.context_cache.armazenar(cliente_id, anos, meses, filiais, contexto)
+                contextos[cliente_id] = contexto
+        return contextos
+
+    @staticmethod
+    def _periodo_query(
+        periodo: Optional[str],
+        year: Optional[int],
+        months: Optional[List[int]]
+    ) -> Tuple[List[int], List[int]]:
+        """(anos, meses) da consulta a partir do formato legado ou do novo."""
         anos_query = [datetime.now().year]
         meses_query = [datetime.now().month]
         
@@ -55,15 +110,74 @@ class ReportService:
                         anos_query = [int(ano_str)]
             except Exception:
                 pass
+        return anos_query, meses_query
 
-        raw_context = self.data_provider.obter_contexto_dados(
+    def montar_contexto(
+        self, 
+        cliente_id: int, 
+        periodo: Optional[str] = None,
+        year: Optional[int] = None,
+        months: Optional[List[int]] = None,
+        branches: Optional[List[int]] = None,
+        incluir_graficos: bool = True
+    ) -> Dict[str, Any]:
+        
+        """
+        Monta o contexto do relatório. Aceita tanto o formato legado (periodo string)
+        quanto o novo formato (listas de ints).
+
+        Os gráficos são renderizados sob demanda, só quando o template lê cada um
+        (o modo web usa ApexCharts e não lê nenhum). Com incluir_graficos=False
+        (endpoints JSON) `graficos` vem vazio.
+        """
+        
+        anos_query, meses_query = self._periodo_query(periodo, year, months)
+
+        raw_context = self.obter_dados(
             cliente_id=cliente_id,
             anos=anos_query,
             meses=meses_query,
             filiais=branches
         )
-        
+        return self._contexto_visual(raw_context, incluir_graficos)
+
+    def versao_em_cache(
+        self,
+        cliente_id: int,
+        year: Optional[int] = None,
+        months: Optional[List[int]] = None,
+        branches: Optional[List[int]] = None
+    ) -> Optional[str]:
+        """
+        `versao_dados` que montar_contexto devolveria, se o contexto já estiver
+        no cache; None quando só montando (e consultando o banco) para saber.
+        """
+        if self.context_cache is None:
+            return None
+        anos_query, meses_query = self._periodo_query(None, year, months)
+        return self.context_cache.impressao(cliente_id, anos_query, meses_query, branches)
+
+    def montar_contextos_lote(
+        self,
+        cliente_ids: List[int],
+        year: Optional[int] = None,
+        months: Optional[List[int]] = None,
+        branches: Optional[List[int]] = None,
+        incluir_graficos: bool = True
+    ) -> Dict[int, Dict[str, Any]]:
+        """montar_contexto de vários clientes, com os dados buscados em lote."""
+        anos_query, meses_query = self._periodo_query(None, year, months)
+        dados_lote = self.obter_dados_lote(cliente_ids, anos_query, meses_query, branches)
+        return {
+            cliente_id: self._contexto_visual(raw_context, incluir_graficos)
+            for cliente_id, raw_context in dados_lote.items()
+        }
+
+    def _contexto_visual(self, raw_context: Dict[str, Any], incluir_graficos: bool = True) -> Dict[str, Any]:
+        """Séries do front e gráficos (preguiçosos) a partir do contexto de dados."""
         dados = raw_context["dados"]
+        # Muda sempre que os dados mudam: as rotas usam como base da ETag
+        versao_dados = impressao_contexto(raw_context)
         g_data = raw_context.get("graficos_data", {})
 
         meses_labels = ["Jan", "Fev", "Mar", "Abr", "Mai", "Jun", "Jul", "Ago", "Set", "Out", "Nov", "Dez"]
@@ -133,37 +247,50 @@ class ReportService:
             }
         }
 
-        graficos = {
-            "ativos_evolucao_valor": self.charts.linhas_simples(
+        if not incluir_graficos:
+            return {"dados": dados, "graficos": {}, "raw_data": raw_data_front, "versao_dados": versao_dados}
+
+        def grafico(metodo: str, *args, **kwargs):
+            return (metodo, args, kwargs)
+
+        graficos = LazyCharts(self.charts, {
+            "ativos_evolucao_valor": grafico(
+                "linhas_simples",
                 meses_labels,
                 total_ativos,
                 label="Total Ativos (Movimento)",
                 color=self.charts.primary,
                 compact_y=True,
             ),
-            "ativos_composicao_perc": self.charts.pizza(
-                ["Circulante", "Não Circulante"], comp_ativo, donut=False
+            "ativos_composicao_perc": grafico(
+                "pizza", ["Circulante", "Não Circulante"], comp_ativo, donut=False
             ),
-            "passivos_stack": self.charts.pizza(
-                ["Passivo Circ.", "Passivo N. Circ."], comp_passivo, donut=True
+            "passivos_stack": grafico(
+                "pizza", ["Passivo Circ.", "Passivo N. Circ."], comp_passivo, donut=True
             ),
-            "rentabilidade_line": self.charts.linhas_duplas(
-                meses_labels, pl_line, [x*0.1 for x in pl_line], label1="PL", label2="Lucro (Est.)"
+            "rentabilidade_line": grafico(
+                "linhas_duplas", meses_labels, pl_line, [x*0.1 for x in pl_line], label1="PL", label2="Lucro (Est.)"
             ),
-            "vendas_line": self.charts.linhas_duplas(
-                meses_labels, vendas_atual, vendas_anterior, label1="2024", label2="2023"
+            "vendas_line": grafico(
+                "linhas_duplas", meses_labels, vendas_atual, vendas_anterior, label1="2024", label2="2023"
             ),
-            "top_produtos_faturamento": self.charts.barras_horizontais(
-                ["N/A View Contábil"], [0], color=self.charts.primary, title="Dados Indisponíveis"
+            "top_produtos_faturamento": grafico(
+                "barras_horizontais", ["N/A View Contábil"], [0], color=self.charts.primary, title="Dados Indisponíveis"
             ),
-            "top_produtos_quantidade": self.charts.barras_horizontais(
-                ["N/A View Contábil"], [0], color=self.charts.secondary, title="Dados Indisponíveis"
+            "top_produtos_quantidade": grafico(
+                "barras_horizontais", ["N/A View Contábil"], [0], color=self.charts.secondary, title="Dados Indisponíveis"
             ),
-            "custos_pie": self.charts.pizza(custos_labels_plot, custos_values_plot, donut=True),
-            "fornecedores_pie": self.charts.pizza(["Div.", "Outros"], [70, 30], donut=True),
-            "equity_vs_ativos": self.charts.linhas_duplas(
-                meses_labels, pl_line, total_ativos, label1="Patrimônio Líquido", label2="Ativos Totais"
+            "custos_pie": grafico("pizza", custos_labels_plot, custos_values_plot, donut=True),
+            "fornecedores_pie": grafico("pizza", ["Div.", "Outros"], [70, 30], donut=True),
+            "equity_vs_ativos": grafico(
+                "linhas_duplas", meses_labels, pl_line, total_ativos, label1="Patrimônio Líquido", label2="Ativos Totais"
             ),
-        }
+        })
 
-        return {"dados": dados, "graficos": graficos, "raw_data": raw_data_front}
\ No newline at end of file
+        return {
+            "dados": dados,
+            "graficos": graficos,
+            "graficos_mime": self.charts.mime_type,
+            "raw_data": raw_data_front,
+            "versao_dados": versao_dados,
+        }
\ No newline at end of file
@@ -0,0 +1,316 @@
+from __future__ import annotations
+import argparse
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# (competencia AAAAMM, filial, conta, debito em centavos, credito em centavos)
+LinhaSaldo = Tuple[int, int, str, int, int]
+
+# TABSALDOCONTABIL.CODIGOFILIAL nulo (a chave primária não aceita NULL)
+SEM_FILIAL = -1
+
+
+def competencia(ano: int, mes: int) -> int:
+    return ano * 100 + mes
+
+
+class SaldoStore:
+    """
+    Saldos contábeis materializados por (empresa, filial, conta, competência).
+
+    Uma base SQLite local com os débitos/créditos mensais já agregados (em
+    centavos) e o plano de contas. Qualquer período, comparação ano a ano ou
+    evolução acumulada vira uma consulta indexada pequena, sem varrer
+    TABSALDOCONTABIL.
+
+    `sincronizar` é incremental: para cada empresa compara a assinatura de
+    cada mês no Firebird (nº de linhas, somas e hash das linhas) com a última
+    guardada e só busca de novo os meses que mudaram.
+    """
+
+    def __init__(self, db_path: str) -> None:
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._criar_tabelas()
+
+    @contextmanager
+    def _conectar(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _criar_tabelas(self) -> None:
+        with self._conectar() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS saldos_mensais (
+                    empresa INTEGER NOT NULL,
+                    competencia INTEGER NOT NULL,
+                    filial INTEGER NOT NULL,
+                    conta TEXT NOT NULL,
+                    debito INTEGER NOT NULL,
+                    credito INTEGER NOT NULL,
+                    PRIMARY KEY (empresa, competencia, filial, conta)
+                ) WITHOUT ROWID;
+
+                CREATE TABLE IF NOT EXISTS contas (
+                    conta TEXT PRIMARY KEY,
+                    nome TEXT NOT NULL,
+                    tipo INTEGER,
+                    natureza INTEGER
+                );
+
+                CREATE TABLE IF NOT EXISTS assinaturas (
+                    empresa INTEGER NOT NULL,
+                    competencia INTEGER NOT NULL,
+                    assinatura TEXT NOT NULL,
+                    PRIMARY KEY (empresa, competencia)
+                );
+
+                CREATE TABLE IF NOT EXISTS empresas (
+                    empresa INTEGER PRIMARY KEY,
+                    sincronizado_em REAL NOT NULL
+                );
+            """)
+
+    # --- Consultas ---
+
+    def sincronizado_em(self, empresa: int) -> Optional[float]:
+        with self._conectar() as conn:
+            row = conn.execute("SELECT sincronizado_em FROM empresas WHERE empresa = ?", (empresa,)).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _filtro_filiais(filiais: Optional[List[int]]) -> Tuple[str, List[int]]:
+        if not filiais:
+            return "", []
+        return f" AND s.filial IN ({','.join('?' * len(filiais))})", list(filiais)
+
+    @staticmethod
+    def _saldo(natureza: int, debito: float, credito: float) -> float:
+        return debito - credito if natureza == 1 else credito - debito
+
+    def totais_por_conta(
+        self,
+        empresa: int,
+        competencias: Sequence[int],
+        filiais: Optional[List[int]] = None,
+    ) -> List[Tuple[str, str, str, str, float, float, float]]:
+        """
+        Débito, crédito e saldo por conta no conjunto de competências, no mesmo
+        formato das linhas do Firebird: (COD, NOME, TIPO, NATUREZA, DEBITO, CREDITO, SALDO).
+        """
+        if not competencias:
+            return []
+        filtro_filial, params_filial = self._filtro_filiais(filiais)
+        sql = f"""
+            SELECT s.conta, c.nome, c.tipo, c.natureza, SUM(s.debito), SUM(s.credito)
+            FROM saldos_mensais s
+            JOIN contas c ON c.conta = s.conta
+            WHERE s.empresa = ?
+              AND s.competencia IN ({','.join('?' * len(competencias))})
+              {filtro_filial}
+            GROUP BY s.conta, c.nome, c.tipo, c.natureza
+            ORDER BY s.conta
+        """
+        with self._conectar() as conn:
+            rows = conn.execute(sql, (empresa, *competencias, *params_filial)).fetchall()
+
+        linhas = []
+        for conta, nome, tipo, natureza, debito, credito in rows:
+            debito, credito = debito / 100, credito / 100
+            linhas.append((
+                conta,
+                nome,
+                "Sintetica" if tipo == 1 else "Analitica",
+                "Devedora" if natureza == 1 else "Credora",
+                debito,
+                credito,
+                round(self._saldo(natureza, debito, credito), 2),
+            ))
+        return linhas
+
+    def movimentos_mensais(
+        self,
+        empresa: int,
+        ano: int,
+        grupos: Sequence[str],
+        grupos_com_base: Sequence[str] = (),
+        filiais: Optional[List[int]] = None,
+    ) -> List[Tuple[int, str, float]]:
+        """
+        Saldo do movimento por (mês, conta) das contas analíticas do ano, já
+        com o sinal das redutoras "(-)". `grupos` são os primeiros dígitos das
+        contas desejadas; para as de `grupos_com_base` vem também o mês 0, com
+        tudo o que é anterior a 01/01 do ano (base para séries acumuladas).
+        """
+        grupos = sorted(set(grupos) | set(grupos_com_base))
+        if not grupos:
+            return []
+        grupos_com_base = sorted(set(grupos_com_base))
+        inicio, fim = competencia(ano, 1), competencia(ano + 1, 1)
+        filtro_filial, params_filial = self._filtro_filiais(filiais)
+
+        def em(lista: Sequence[str]) -> str:
+            return f"substr(s.conta, 1, 1) IN ({','.join('?' * len(lista))})" if lista else "0"
+
+        sql = f"""
+            SELECT
+              CASE WHEN s.competencia < ? THEN 0 ELSE s.competencia % 100 END AS mes,
+              s.conta,
+              c.natureza,
+              c.nome LIKE '(-)%' AS redutora,
+              SUM(s.debito),
+              SUM(s.credito)
+            FROM saldos_mensais s
+            JOIN contas c ON c.conta = s.conta
+            WHERE s.empresa = ?
+              AND s.competencia < ?
+              AND ((s.competencia >= ? AND {em(grupos)}) OR (s.competencia < ? AND {em(grupos_com_base)}))
+              AND COALESCE(c.tipo, 0) <> 1
+              {filtro_filial}
+            GROUP BY 1, 2, 3, 4
+        """
+        params = (inicio, empresa, fim, inicio, *grupos, inicio, *grupos_com_base, *params_filial)
+        with self._conectar() as conn:
+            rows = conn.execute(sql, params).fetchall()
+
+        linhas = []
+        for mes, conta, natureza, redutora, debito, credito in rows:
+            saldo = self._saldo(natureza, debito / 100, credito / 100)
+            linhas.append((mes, conta, -saldo if redutora else saldo))
+        return linhas
+
+    # --- Sincronização ---
+
+    def sincronizar(self, fonte: Any, empresas: Optional[List[int]] = None, meses_por_lote: int = 12) -> Dict[str, int]:
+        """
+        Atualiza a base a partir de `fonte` (um DatabaseDataProvider) e retorna contadores.
+
+        Sem `empresas`, sincroniza todas as de `fonte.listar_clientes()`.
+        Meses novos ou alterados são buscados em lotes de `meses_por_lote`;
+        meses que sumiram do Firebird são apagados.
+        """
+        resumo = {"empresas": 0, "meses_atualizados": 0, "meses_removidos": 0, "linhas": 0, "erros": 0}
+
+        plano = fonte.obter_plano_contas()
+        if plano:
+            with self._conectar() as conn:
+                conn.execute("DELETE FROM contas")
+                conn.executemany("INSERT INTO contas (conta, nome, tipo, natureza) VALUES (?, ?, ?, ?)", plano)
+
+        if empresas is None:
+            empresas = [int(c["codigo"]) for c in fonte.listar_clientes()]
+
+        for empresa in empresas:
+            try:
+                atualizados, removidos, linhas = self._sincronizar_empresa(fonte, empresa, meses_por_lote)
+            except Exception as e:
+                print(f"Erro ao sincronizar saldos da empresa {empresa}: {e}")
+                resumo["erros"] += 1
+                continue
+            resumo["empresas"] += 1
+            resumo["meses_atualizados"] += atualizados
+            resumo["meses_removidos"] += removidos
+            resumo["linhas"] += linhas
+        return resumo
+
+    def _sincronizar_empresa(self, fonte: Any, empresa: int, meses_por_lote: int) -> Tuple[int, int, int]:
+        assinaturas = fonte.obter_assinaturas_mensais(empresa)
+        with self._conectar() as conn:
+            guardadas = dict(conn.execute(
+                "SELECT competencia, assinatura FROM assinaturas WHERE empresa = ?", (empresa,)
+            ).fetchall())
+
+        mudaram = sorted(c for c, a in assinaturas.items() if guardadas.get(c) != a)
+        removidas = [c for c in guardadas if c not in assinaturas]
+        total_linhas = 0
+
+        for i in range(0, len(mudaram), meses_por_lote):
+            lote = mudaram[i:i + meses_por_lote]
+            linhas = fonte.obter_saldos_mensais(empresa, lote)
+            marcadores = ",".join("?" * len(lote))
+            # Linhas e assinaturas do lote na mesma transação
+            with self._conectar() as conn:
+                conn.execute(
+                    f"DELETE FROM saldos_mensais WHERE empresa = ? AND competencia IN ({marcadores})",
+                    (empresa, *lote),
+                )
+                conn.executemany(
+                    "INSERT INTO saldos_mensais (empresa, competencia, filial, conta, debito, credito) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [(empresa, *linha) for linha in linhas],
+                )
+                conn.executemany(
+                    "INSERT OR REPLACE INTO assinaturas (empresa, competencia, assinatura) VALUES (?, ?, ?)",
+                    [(empresa, c, assinaturas[c]) for c in lote],
+                )
+            total_linhas += len(linhas)
+
+        with self._conectar() as conn:
+            if removidas:
+                marcadores = ",".join("?" * len(removidas))
+                conn.execute(
+                    f"DELETE FROM saldos_mensais WHERE empresa = ? AND competencia IN ({marcadores})",
+                    (empresa, *removidas),
+                )
+                conn.execute(
+                    f"DELETE FROM assinaturas WHERE empresa = ? AND competencia IN ({marcadores})",
+                    (empresa, *removidas),
+                )
+            conn.execute(
+                "INSERT OR REPLACE INTO empresas (empresa, sincronizado_em) VALUES (?, ?)",
+                (empresa, time.time()),
+            )
+        return len(mudaram), len(removidas), total_linhas
+
+    def stats(self) -> Dict[str, Any]:
+        with self._conectar() as conn:
+            empresas, ultima = conn.execute("SELECT COUNT(*), MAX(sincronizado_em) FROM empresas").fetchone()
+            meses = conn.execute("SELECT COUNT(*) FROM assinaturas").fetchone()[0]
+        try:
+            tamanho = os.path.getsize(self.db_path)
+        except OSError:
+            tamanho = 0
+        return {
+            "empresas": empresas,
+            "meses": meses,
+            "ultima_sincronizacao": ultima,
+            "bytes": tamanho,
+        }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Sincronização pela linha de comando (ex.: agendada no cron a cada poucos minutos)."""
+    from .database_data_provider import DatabaseDataProvider
+
+    parser = argparse.ArgumentParser(description="Atualiza a base local de saldos mensais a partir do Firebird.")
+    parser.add_argument("db", help="Arquivo SQLite da base de saldos (ex.: .cache/saldos.sqlite3)")
+    parser.add_argument("--empresas", help="Códigos separados por vírgula (padrão: todas)")
+    parser.add_argument("--host", default="192.168.10.160")
+    parser.add_argument("--port", type=int, default=3050)
+    parser.add_argument("--database", default=r"e:\Athenas\rps.fdb")
+    parser.add_argument("--user", default="SYSDBA")
+    parser.add_argument("--password", default="masterkey")
+    args = parser.parse_args(argv)
+
+    empresas = [int(e) for e in args.empresas.split(",") if e.strip()] if args.empresas else None
+    fonte = DatabaseDataProvider(
+        host=args.host, port=args.port, database=args.database, user=args.user, password=args.password
+    )
+    inicio = time.perf_counter()
+    try:
+        resumo = SaldoStore(args.db).sincronizar(fonte, empresas)
+    finally:
+        fonte.fechar()
+    print(f"{resumo} em {time.perf_counter() - inicio:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
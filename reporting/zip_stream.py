@@ -0,0 +1,58 @@
+from __future__ import annotations
+import io
+import zipfile
+from typing import Iterable, Iterator, Tuple
+
+
+class _SaidaStream(io.RawIOBase):
+    """
+    Destino não-posicionável para o ZipFile: acumula o que foi escrito até ser drenado.
+    Sem seek(), o zipfile grava cada entrada com data descriptor e nunca volta atrás,
+    então os bytes já drenados podem seguir para o cliente.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._pendente = bytearray()
+        self._posicao = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, dados) -> int:
+        self._pendente += dados
+        self._posicao += len(dados)
+        return len(dados)
+
+    def tell(self) -> int:
+        return self._posicao
+
+    def flush(self) -> None:
+        pass
+
+    def drenar(self) -> bytes:
+        dados = bytes(self._pendente)
+        self._pendente.clear()
+        return dados
+
+
+def zip_em_stream(
+    entradas: Iterable[Tuple[str, bytes]],
+    compressao: int = zipfile.ZIP_STORED,
+) -> Iterator[bytes]:
+    """
+    Gera um ZIP em pedaços, entregando cada entrada assim que ela é produzida.
+    A memória fica limitada à maior entrada, não à soma do arquivo.
+    ZIP_STORED é o padrão: PDFs já são comprimidos e recomprimir só gasta CPU.
+    """
+    saida = _SaidaStream()
+    with zipfile.ZipFile(saida, "w", compression=compressao) as zf:
+        for nome, dados in entradas:
+            zf.writestr(nome, dados)
+            pedaco = saida.drenar()
+            if pedaco:
+                yield pedaco
+    # Diretório central, escrito no close()
+    final = saida.drenar()
+    if final:
+        yield final
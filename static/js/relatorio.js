@@ -643,15 +643,20 @@ document.getElementById('periodFilterModal')?.addEventListener('click', (e) => {
 
 let balanceteData = [];
 let balanceteMode = 'empresa'; // 'empresa' (consolidado) ou 'filial'
+let balanceteCache = {};       // linhas já baixadas de cada modo, enquanto o modal está aberto
+let balanceteCarga = 0;        // descarta pedaços de uma carga anterior (modo trocado, modal reaberto)
+let balanceteAbort = null;
 
 function openBalancete() {
   const modal = document.getElementById('balanceteModal');
   if (!modal) return;
   modal.classList.add('active');
   
-  document.getElementById('balanceteLoading').style.display = 'flex';
-  document.getElementById('balanceteError').style.display = 'none';
-  document.getElementById('balanceteTableWrapper').style.display = 'none';
+  // Reset toggle para modo empresa
+  balanceteCache = {};
+  balanceteMode = 'empresa';
+  document.getElementById('balanceteToggle').checked = false;
+  updateToggleLabels();
   
   loadBalancete();
 }
@@ -662,36 +667,109 @@ function closeBalancete() {
 }
 
 function loadBalancete() {
+  const mode = balanceteMode;
+  const carga = ++balanceteCarga;
+  if (balanceteAbort) balanceteAbort.abort();
+  balanceteAbort = null;
+
+  document.getElementById('balanceteError').style.display = 'none';
+  if (balanceteCache[mode]) {
+    balanceteData = balanceteCache[mode];
+    applyBalanceteView();
+    document.getElementById('balanceteLoading').style.display = 'none';
+    document.getElementById('balanceteTableWrapper').style.display = 'flex';
+    return;
+  }
+
+  document.getElementById('balanceteLoading').style.display = 'flex';
+  document.getElementById('balanceteTableWrapper').style.display = 'none';
+  balanceteData = [];
+
   const clientId = getClientId();
   const params = new URLSearchParams(window.location.search);
   
-  // Usar os mesmos filtros já aplicados na URL
-  const queryString = params.toString();
-  const url = `/api/balancete/${clientId}${queryString ? '?' + queryString : ''}`;
-  
-  fetch(url)
+  // Usar os mesmos filtros já aplicados na URL; o servidor consolida (empresa) ou
+  // manda o detalhe por filial, e as linhas chegam em stream (colunar)
+  params.set('formato', 'colunas');
+  params.set('group_by', mode);
+  const url = `/api/balancete/${clientId}?${params.toString()}`;
+  balanceteAbort = new AbortController();
+
+  let colunas = [];
+  let fim = null;
+
+  fetch(url, { signal: balanceteAbort.signal })
     .then(response => {
       if (!response.ok) throw new Error('Erro na resposta');
-      return response.json();
+      return lerNdjson(response, linhas => {
+        if (carga !== balanceteCarga) return;
+        const novas = [];
+        linhas.forEach(linha => {
+          if (Array.isArray(linha)) {
+            const row = {};
+            colunas.forEach((col, i) => { row[col] = linha[i]; });
+            novas.push(row);
+          } else if (linha.colunas) {
+            colunas = linha.colunas;
+          } else {
+            fim = linha;
+          }
+        });
+        if (novas.length) appendBalanceteRows(novas);
+      });
     })
-    .then(data => {
-      balanceteData = data.dados || [];
-      // Reset toggle para modo empresa
-      balanceteMode = 'empresa';
-      document.getElementById('balanceteToggle').checked = false;
-      updateToggleLabels();
+    .then(() => {
+      if (carga !== balanceteCarga) return;
+      if (!fim || fim.erro) throw new Error(fim ? fim.erro : 'Resposta incompleta');
+      balanceteCache[mode] = balanceteData;
+      balanceteAbort = null;
       applyBalanceteView();
-      
       document.getElementById('balanceteLoading').style.display = 'none';
       document.getElementById('balanceteTableWrapper').style.display = 'flex';
     })
     .catch(error => {
+      if (carga !== balanceteCarga) return;
       console.error('Erro ao carregar balancete:', error);
       document.getElementById('balanceteLoading').style.display = 'none';
+      document.getElementById('balanceteTableWrapper').style.display = 'none';
       document.getElementById('balanceteError').style.display = 'flex';
     });
 }
 
+// Lê uma resposta NDJSON à medida que chega, entregando as linhas completas de cada pedaço
+function lerNdjson(response, onLinhas) {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let resto = '';
+
+  function ler() {
+    return reader.read().then(({ done, value }) => {
+      resto += decoder.decode(value, { stream: !done });
+      const partes = resto.split('\n');
+      resto = done ? '' : partes.pop();
+      const linhas = partes.filter(l => l.trim()).map(l => JSON.parse(l));
+      if (linhas.length) onLinhas(linhas);
+      if (!done) return ler();
+    });
+  }
+  return ler();
+}
+
+// Mostra as linhas já recebidas sem esperar o fim do download
+function appendBalanceteRows(novas) {
+  const primeiras = balanceteData.length === 0;
+  for (const row of novas) balanceteData.push(row);
+
+  if (primeiras) {
+    applyBalanceteView();
+    document.getElementById('balanceteLoading').style.display = 'none';
+    document.getElementById('balanceteTableWrapper').style.display = 'flex';
+  } else {
+    appendBalanceteTableRows(novas, balanceteMode === 'filial');
+    document.getElementById('balanceteCount').textContent = `${balanceteData.length} registros encontrados`;
+  }
+}
+
 function formatBRL(val) {
   if (val === null || val === undefined) val = 0;
   return val.toLocaleString('pt-BR', { style: 'currency', currency: 'BRL' });
@@ -703,43 +781,18 @@ const MESES_NOMES_BALANCETE = {
   9: 'Set', 10: 'Out', 11: 'Nov', 12: 'Dez'
 };
 
-function consolidarPorEmpresa(dados) {
-  const mapa = {};
-  dados.forEach(row => {
-    const chave = row.cod_conta_contabil;
-    if (!mapa[chave]) {
-      mapa[chave] = {
-        cod_conta_contabil: row.cod_conta_contabil,
-        nome_conta: row.nome_conta,
-        tipo_conta: row.tipo_conta,
-        natureza: row.natureza,
-        cod_grupo: row.cod_grupo,
-        saldo_inicial: 0,
-        debito: 0,
-        credito: 0,
-        saldo: 0,
-      };
-    }
-    mapa[chave].saldo_inicial += row.saldo_inicial || 0;
-    mapa[chave].debito += row.debito || 0;
-    mapa[chave].credito += row.credito || 0;
-    mapa[chave].saldo += row.saldo || 0;
-  });
-  return Object.values(mapa).sort((a, b) => a.cod_conta_contabil.localeCompare(b.cod_conta_contabil));
-}
-
 function onBalanceteToggle() {
   const checked = document.getElementById('balanceteToggle').checked;
   balanceteMode = checked ? 'filial' : 'empresa';
   updateToggleLabels();
-  applyBalanceteView();
+  loadBalancete();
 }
 
 function setBalanceteMode(mode) {
   balanceteMode = mode;
   document.getElementById('balanceteToggle').checked = (mode === 'filial');
   updateToggleLabels();
-  applyBalanceteView();
+  loadBalancete();
 }
 
 function updateToggleLabels() {
@@ -755,9 +808,8 @@ function updateToggleLabels() {
 }
 
 function applyBalanceteView() {
-  const dados = balanceteMode === 'empresa' ? consolidarPorEmpresa(balanceteData) : balanceteData;
-  renderBalanceteTable(dados, balanceteMode);
-  document.getElementById('balanceteCount').textContent = `${dados.length} registros encontrados`;
+  renderBalanceteTable(balanceteData, balanceteMode);
+  document.getElementById('balanceteCount').textContent = `${balanceteData.length} registros encontrados`;
 }
 
 function renderBalanceteTable(dados, mode) {
@@ -787,6 +839,13 @@ function renderBalanceteTable(dados, mode) {
     return;
   }
   
+  appendBalanceteTableRows(dados, isFilial);
+}
+
+function appendBalanceteTableRows(dados, isFilial) {
+  const tbody = document.getElementById('balanceteBody');
+  const fragment = document.createDocumentFragment();
+
   dados.forEach(row => {
     const tr = document.createElement('tr');
     if (row.tipo_conta === 'Sintetica') tr.classList.add('sintetica');
@@ -805,8 +864,9 @@ function renderBalanceteTable(dados, mode) {
       <td class="text-right">${formatBRL(row.credito)}</td>
       <td class="text-right ${saldoClass}">${formatBRL(row.saldo)}</td>
     `;
-    tbody.appendChild(tr);
+    fragment.appendChild(tr);
   });
+  tbody.appendChild(fragment);
 }
 
 function exportBalanceteCSV() {
@@ -815,7 +875,7 @@ function exportBalanceteCSV() {
     return;
   }
   
-  const exportData = balanceteMode === 'empresa' ? consolidarPorEmpresa(balanceteData) : balanceteData;
+  const exportData = balanceteData;
   const isFilial = balanceteMode === 'filial';
   
   const headers = isFilial
@@ -0,0 +1,130 @@
+"""
+Agregação do balancete no servidor (agregar_balancete): por filial, por
+empresa (somando as filiais, lote a lote), por grupo e até o nível N do plano.
+
+Uso:
+    python -m pytest -q tests
+"""
+from __future__ import annotations
+import os
+import sys
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from reporting.balancete import agregar_balancete, colunas_balancete, conta_no_nivel, nivel_conta  # noqa: E402
+from reporting.database_data_provider import DatabaseDataProvider  # noqa: E402
+
+
+def _linha(filial, conta, nome, tipo, grupo, saldo, debito=0.0, credito=0.0):
+    # Mesma ordem de DatabaseDataProvider.COLUNAS_BALANCETE
+    return (
+        1, "Empresa Teste", filial, f"Filial {filial}", f"Fantasia {filial}",
+        conta, 0.0, nome, tipo, "D", grupo, debito, credito, saldo,
+    )
+
+
+# Sintéticas com saldo 999: se entrarem nas somas o total sai errado
+LINHAS = [
+    _linha(1, "1", "ATIVO", "Sintetica", "1", 999.0),
+    _linha(1, "1.1", "CIRCULANTE", "Sintetica", "1", 999.0),
+    _linha(1, "1.1.01", "Caixa", "Analitica", "1", 100.0, debito=100.0),
+    _linha(2, "1.1.01", "Caixa", "Analitica", "1", 50.0, debito=50.0),
+    _linha(1, "1.1.02", "Bancos", "Analitica", "1", 200.0),
+    _linha(2, "1.2.03.01", "Máquinas", "Analitica", "1", 1000.0),
+    _linha(1, "2", "PASSIVO", "Sintetica", "2", 999.0),
+    _linha(1, "2.1.01", "Fornecedores", "Analitica", "2", 300.0, credito=300.0),
+    _linha(2, "2.1.02", "(-) Adiantamentos", "Analitica", "2", 0.1),
+]
+
+
+def _lotes(tamanho=len(LINHAS)):
+    return [
+        DatabaseDataProvider._frame_balancete(LINHAS[i:i + tamanho])
+        for i in range(0, len(LINHAS), tamanho)
+    ]
+
+
+def _por_conta(frame, chave="cod_conta_contabil"):
+    return {registro[chave]: registro for registro in frame.registros()}
+
+
+def test_nivel_da_conta():
+    assert nivel_conta("1.2.03.10") == 4
+    assert nivel_conta("") == 0
+    assert conta_no_nivel("1.2.03.10", 2) == "1.2"
+
+
+def test_filial_mantem_o_detalhe():
+    frame = agregar_balancete(_lotes(4), "filial")
+    assert list(frame.df.columns) == list(colunas_balancete("filial"))
+    assert len(frame) == len(LINHAS)
+
+
+def test_empresa_soma_as_filiais():
+    frame = agregar_balancete(_lotes(), "empresa")
+    assert list(frame.df.columns) == list(colunas_balancete("empresa"))
+    contas = _por_conta(frame)
+    assert list(contas) == ["1", "1.1", "1.1.01", "1.1.02", "1.2.03.01", "2", "2.1.01", "2.1.02"]
+    assert contas["1.1.01"]["saldo"] == 150.0
+    assert contas["1.1.01"]["debito"] == 150.0
+    assert contas["1.1.01"]["nome_conta"] == "Caixa"
+    # Redutora com o sinal já invertido na leitura
+    assert contas["2.1.02"]["saldo"] == -0.1
+
+
+@pytest.mark.parametrize("tamanho", [1, 2, 3])
+def test_empresa_em_lotes_igual_ao_lote_unico(tamanho):
+    # Cada lote é reduzido por conta ao chegar; a mesma conta em lotes diferentes soma no fim
+    esperado = agregar_balancete(_lotes(), "empresa").registros()
+    assert agregar_balancete(_lotes(tamanho), "empresa").registros() == esperado
+
+
+def test_grupo_soma_so_as_analiticas():
+    frame = agregar_balancete(_lotes(2), "grupo")
+    assert list(frame.df.columns) == list(colunas_balancete("grupo"))
+    grupos = _por_conta(frame, "cod_grupo")
+    assert grupos["1"]["saldo"] == 1350.0
+    assert grupos["1"]["nome_grupo"] == "ATIVO"
+    assert grupos["2"]["saldo"] == 299.9
+    assert grupos["2"]["nome_grupo"] == "PASSIVO"
+
+
+def test_grupo_nao_aceita_nivel():
+    with pytest.raises(ValueError):
+        agregar_balancete(_lotes(), "grupo", nivel=2)
+
+
+def test_empresa_ate_o_nivel_2():
+    contas = _por_conta(agregar_balancete(_lotes(3), "empresa", nivel=2))
+    assert list(contas) == ["1", "1.1", "1.2", "2", "2.1"]
+    # Somas das analíticas abaixo, sem contar o saldo das sintéticas do banco
+    assert contas["1"]["saldo"] == 1350.0
+    assert contas["1.1"]["saldo"] == 350.0
+    assert contas["1.1"]["nome_conta"] == "CIRCULANTE"
+    # 1.2 não vem do banco: sintética sem nome
+    assert contas["1.2"]["saldo"] == 1000.0
+    assert contas["1.2"]["nome_conta"] == ""
+    assert contas["1.2"]["tipo_conta"] == "Sintetica"
+    assert contas["2.1"]["saldo"] == 299.9
+
+
+def test_nivel_1_fica_so_com_os_grupos_de_conta():
+    contas = _por_conta(agregar_balancete(_lotes(), "empresa", nivel=1))
+    assert list(contas) == ["1", "2"]
+    assert contas["1"]["nome_conta"] == "ATIVO"
+
+
+def test_filial_ate_o_nivel_1():
+    frame = agregar_balancete(_lotes(), "filial", nivel=1)
+    saldos = {(r["cod_filial"], r["cod_conta_contabil"]): r["saldo"] for r in frame.registros()}
+    assert saldos == {(1, "1"): 300.0, (2, "1"): 1050.0, (1, "2"): 300.0, (2, "2"): -0.1}
+
+
+def test_sem_linhas():
+    for agrupar_por in ("filial", "empresa", "grupo"):
+        frame = agregar_balancete([], agrupar_por)
+        assert len(frame) == 0
+        assert list(frame.df.columns) == list(colunas_balancete(agrupar_por))
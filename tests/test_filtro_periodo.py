@@ -0,0 +1,73 @@
+"""
+Filtro de período das consultas do razão: meses da seleção viram faixas
+`S.DATA >= ? AND S.DATA < ?`, com meses contíguos (inclusive dez -> jan)
+fundidos numa faixa só.
+
+Uso:
+    python -m pytest -q tests
+"""
+from __future__ import annotations
+import os
+import sys
+from datetime import date
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from reporting.database_data_provider import DatabaseDataProvider  # noqa: E402
+
+intervalos = DatabaseDataProvider._intervalos_periodo
+filtro = DatabaseDataProvider._filtro_periodo
+
+
+def test_mes_unico():
+    assert intervalos([2024], [3]) == [(date(2024, 3, 1), date(2024, 4, 1))]
+
+
+def test_meses_contiguos_viram_uma_faixa():
+    assert intervalos([2024], [3, 1, 2]) == [(date(2024, 1, 1), date(2024, 4, 1))]
+
+
+def test_meses_separados_viram_faixas_separadas():
+    assert intervalos([2024], [1, 2, 5, 11, 12]) == [
+        (date(2024, 1, 1), date(2024, 3, 1)),
+        (date(2024, 5, 1), date(2024, 6, 1)),
+        (date(2024, 11, 1), date(2025, 1, 1)),
+    ]
+
+
+def test_dezembro_emenda_com_janeiro_do_ano_seguinte():
+    assert intervalos([2023, 2024], [12, 1]) == [
+        (date(2023, 1, 1), date(2023, 2, 1)),
+        (date(2023, 12, 1), date(2024, 2, 1)),
+        (date(2024, 12, 1), date(2025, 1, 1)),
+    ]
+
+
+def test_anos_inteiros_contiguos():
+    # Sem meses = anos inteiros; dois anos seguidos formam uma faixa só
+    assert intervalos([2024, 2023], []) == [(date(2023, 1, 1), date(2025, 1, 1))]
+
+
+def test_meses_invalidos_sao_ignorados():
+    assert intervalos([2024], [0, 6, 13]) == [(date(2024, 6, 1), date(2024, 7, 1))]
+
+
+def test_filtro_sql_e_parametros():
+    sql, params = filtro([2024], [1, 2, 6])
+    assert sql == "((S.DATA >= ? AND S.DATA < ?) OR (S.DATA >= ? AND S.DATA < ?))"
+    assert params == [date(2024, 1, 1), date(2024, 3, 1), date(2024, 6, 1), date(2024, 7, 1)]
+
+
+def test_filtro_ano_inteiro():
+    assert filtro([2024], []) == ("((S.DATA >= ? AND S.DATA < ?))", [date(2024, 1, 1), date(2025, 1, 1)])
+
+
+def test_filtro_sem_meses_validos_nao_retorna_nada():
+    assert filtro([2024], [13]) == ("1 = 0", [])
+
+
+def test_filtro_sem_anos():
+    # Sem ano não há faixas de data: cai no EXTRACT dos meses, ou em nenhum filtro
+    assert filtro([], [1, 2]) == ("EXTRACT(MONTH FROM S.DATA) IN (1,2)", [])
+    assert filtro([], []) == ("", [])
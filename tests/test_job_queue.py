@@ -0,0 +1,193 @@
+"""
+Máquina de estados da JobQueue: pendente -> executando -> concluido/erro,
+expiração de jobs sem sinal de vida e recusa com a fila cheia (o 503 da
+rota de lote).
+
+Uso:
+    python -m pytest -q tests
+"""
+from __future__ import annotations
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from reporting.job_queue import FilaCheiaError, JobQueue  # noqa: E402
+
+
+@pytest.fixture
+def fila(tmp_path):
+    fila = JobQueue(
+        db_path=str(tmp_path / "jobs.sqlite"),
+        dir_resultados=str(tmp_path / "resultados"),
+        max_workers=1,
+        max_fila=2,
+        timeout_inativo=0.3,
+    )
+    yield fila
+    fila.parar()
+
+
+def _esperar(fila: JobQueue, job_id: str, status: str, timeout: float = 5.0) -> dict:
+    limite = time.time() + timeout
+    while time.time() < limite:
+        job = fila.obter(job_id)
+        if job["status"] == status:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} não chegou a '{status}' (está '{fila.obter(job_id)['status']}')")
+
+
+def _inserir(fila: JobQueue, job_id: str, status: str, dono: str, atualizado_em: float) -> None:
+    # Job de outro processo (ex.: um worker web que morreu no meio)
+    fila._preparar()
+    with fila._conectar() as conn:
+        conn.execute(
+            "INSERT INTO jobs (id, tipo, status, total, criado_em, atualizado_em, dono) "
+            "VALUES (?, 'pdf_lote', ?, 1, ?, ?, ?)",
+            (job_id, status, atualizado_em, atualizado_em, dono),
+        )
+
+
+def test_job_passa_por_pendente_executando_e_concluido(fila):
+    liberar = threading.Event()
+    ocupar = fila.enfileirar("pdf_lote", {}, 1, lambda job_id, progresso: liberar.wait(5) and "")
+
+    def executar(job_id, progresso):
+        progresso(1, 0)
+        caminho = fila.caminho_resultado(job_id)
+        with open(caminho, "wb") as f:
+            f.write(b"zip")
+        return caminho
+
+    job_id = fila.enfileirar("pdf_lote", {"clientes": [1]}, 1, executar)
+    # Único worker ocupado: o segundo job espera na fila
+    assert fila.obter(job_id)["status"] == "pendente"
+    assert _esperar(fila, ocupar, "executando")["iniciado_em"] is not None
+
+    liberar.set()
+    job = _esperar(fila, job_id, "concluido")
+    assert job["params"] == {"clientes": [1]}
+    assert job["progresso"] == 100.0
+    assert job["arquivo"] == fila.caminho_resultado(job_id)
+    assert job["finalizado_em"] is not None
+
+
+def test_excecao_no_job_vira_erro(fila):
+    def executar(job_id, progresso):
+        raise ValueError("sem dados")
+
+    job = _esperar(fila, fila.enfileirar("pdf_lote", {}, 1, executar), "erro")
+    assert job["erro"] == "ValueError: sem dados"
+    assert job["arquivo"] is None
+
+
+def test_pendente_de_processo_morto_expira(fila):
+    # O dono morreu antes de executar: ninguém mais pegaria o job
+    _inserir(fila, "pendente-orfao", "pendente", "outro-host:1", time.time() - 3600)
+    fila.limpar_expirados()
+    job = fila.obter("pendente-orfao")
+    assert job["status"] == "erro"
+    assert job["erro"] == "Interrompido (sem atualização)"
+
+
+def test_pendente_recente_de_outro_processo_nao_expira(fila):
+    _inserir(fila, "pendente-vivo", "pendente", "outro-host:1", time.time())
+    fila.limpar_expirados()
+    assert fila.obter("pendente-vivo")["status"] == "pendente"
+
+
+def test_pendente_deste_processo_recebe_heartbeat(fila):
+    liberar = threading.Event()
+    bloquear = lambda job_id, progresso: liberar.wait(5) and ""  # noqa: E731
+    fila.enfileirar("pdf_lote", {}, 1, bloquear)
+    job_id = fila.enfileirar("pdf_lote", {}, 1, bloquear)
+
+    # Esperando vaga bem mais que timeout_inativo: o heartbeat renova o job pendente
+    time.sleep(1.0)
+    job = fila.obter(job_id)
+    assert job["status"] == "pendente"
+    assert time.time() - job["atualizado_em"] < fila.timeout_inativo
+    fila.limpar_expirados()
+    assert fila.obter(job_id)["status"] == "pendente"
+
+    liberar.set()
+    _esperar(fila, job_id, "concluido")
+
+
+def test_executando_de_processo_morto_expira(fila):
+    _inserir(fila, "orfao", "executando", "outro-host:1", time.time() - 3600)
+    fila.limpar_expirados()
+    job = fila.obter("orfao")
+    assert job["status"] == "erro"
+    assert job["erro"] == "Interrompido (sem atualização)"
+
+
+def test_executando_recente_de_outro_processo_nao_expira(fila):
+    _inserir(fila, "vivo", "executando", "outro-host:1", time.time())
+    fila.limpar_expirados()
+    assert fila.obter("vivo")["status"] == "executando"
+
+
+def test_job_longo_deste_processo_nao_expira(fila):
+    liberar = threading.Event()
+    job_id = fila.enfileirar("pdf_lote", {}, 1, lambda job_id, progresso: liberar.wait(5) and "")
+    _esperar(fila, job_id, "executando")
+
+    # Bem mais que timeout_inativo sem progresso: o processo dono está vivo
+    time.sleep(1.0)
+    fila.limpar_expirados()
+    assert fila.obter(job_id)["status"] == "executando"
+
+    liberar.set()
+    _esperar(fila, job_id, "concluido")
+
+
+def test_status_nao_volta_depois_de_encerrado(fila):
+    liberar = threading.Event()
+    caminho = str(fila.caminho_resultado("x"))
+
+    def executar(job_id, progresso):
+        liberar.wait(5)
+        with open(caminho, "wb") as f:
+            f.write(b"zip")
+        return caminho
+
+    job_id = fila.enfileirar("pdf_lote", {}, 1, executar)
+    _esperar(fila, job_id, "executando")
+    # Outro caminho encerrou o job enquanto ele rodava
+    assert fila._atualizar(job_id, de_status="executando", status="erro", erro="cancelado")
+
+    liberar.set()
+    limite = time.time() + 5
+    while fila.stats()["ativos"] and time.time() < limite:
+        time.sleep(0.01)
+    job = fila.obter(job_id)
+    assert job["status"] == "erro"
+    assert job["arquivo"] is None
+    # O resultado que não será servido é apagado
+    assert not os.path.exists(caminho)
+
+
+def test_fila_cheia_recusa_novos_jobs(fila):
+    liberar = threading.Event()
+    bloquear = lambda job_id, progresso: liberar.wait(5) and ""  # noqa: E731
+    primeiro = fila.enfileirar("pdf_lote", {}, 1, bloquear)
+    fila.enfileirar("pdf_lote", {}, 1, bloquear)
+
+    with pytest.raises(FilaCheiaError):
+        fila.enfileirar("pdf_lote", {}, 1, bloquear)
+    assert fila.stats()["ativos"] == 2
+
+    liberar.set()
+    _esperar(fila, primeiro, "concluido")
+    limite = time.time() + 5
+    while fila.stats()["ativos"] and time.time() < limite:
+        time.sleep(0.01)
+    # Com vaga de novo, aceita
+    fila.enfileirar("pdf_lote", {}, 1, bloquear)
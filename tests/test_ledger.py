@@ -0,0 +1,105 @@
+"""
+LedgerIndex contra a soma linear por prefixo que os KPIs usavam antes
+(somar_em em obter_contexto_dados): mesmos totais para prefixos vizinhos,
+contas sintéticas fora, sinal das redutoras e arredondamento em 2 casas.
+
+Uso:
+    python -m pytest -q tests
+"""
+from __future__ import annotations
+import os
+import sys
+from typing import Any, Dict, List
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from reporting.ledger import LedgerFrame, LedgerIndex  # noqa: E402
+
+
+# (COD, NOME, TIPO, NATUREZA, DEBITO, CREDITO, SALDO), como vêm do banco
+LINHAS = [
+    ("1", "ATIVO", "Sintetica", "D", 999.0, 0.0, 999.0),
+    ("1.1", "CIRCULANTE", "Sintetica", "D", 999.0, 0.0, 999.0),
+    ("1.1.01", "Caixa", "Analitica", "D", 0.1, 0.0, 0.1),
+    ("1.1.02", "Bancos", "Analitica", "D", 0.2, 0.0, 0.2),
+    ("1.10.01", "Aplicações", "Analitica", "D", 10.0, 0.0, 10.0),
+    ("11.01", "Conta fora da máscara", "Analitica", "D", 7.0, 0.0, 7.0),
+    ("1.2.03.01", "Máquinas", "Analitica", "D", 1000.0, 0.0, 1000.0),
+    ("1.2.03.10", "(-) Depreciação", "Analitica", "C", 0.0, 300.0, 300.0),
+    ("2.1.01", "Fornecedores", "Analitica", "C", 0.0, 50.55, 50.55),
+    ("3.1.10.001", "Receita", "Analitica", "C", 0.0, 1234.56, 1234.56),
+    ("3.1.10.002", "Receita serviços", "Analitica", "C", 0.0, 0.01, 0.01),
+    ("3.1.50.001", "(-) Cancelamentos", "Analitica", "D", 20.0, 0.0, 20.0),
+    ("4.1.01", "Compras", "", "D", 5.0, 0.0, 5.0),
+]
+
+PREFIXOS = ["", "1", "11", "110", "1101", "1.1", "12", "1203", "120310", "2", "3", "3110", "3150", "4", "5", "9"]
+
+
+def _somar_em(dados: List[Dict[str, Any]], prefixo: str, campo: str = "saldo") -> float:
+    # A varredura de antes: todas as contas, a cada prefixo
+    total = 0.0
+    for conta in dados:
+        if conta.get("tipo") == "Sintetica":
+            continue
+        cod_limpo = "".join(c for c in conta["codigo"] if c.isdigit())
+        if cod_limpo.startswith(prefixo):
+            total += conta[campo]
+    return total
+
+
+def _contas() -> List[Dict[str, Any]]:
+    contas = []
+    for codigo, nome, tipo, natureza, debito, credito, saldo in LINHAS:
+        contas.append({
+            "codigo": codigo, "nome": nome, "tipo": tipo, "natureza": natureza,
+            "debito": debito, "credito": credito,
+            "saldo": -saldo if nome.startswith("(-)") else saldo,
+        })
+    return contas
+
+
+@pytest.mark.parametrize("origem", ["frame", "dicts"])
+@pytest.mark.parametrize("campo", LedgerIndex.CAMPOS)
+def test_indice_igual_a_varredura(origem, campo):
+    contas = _contas()
+    indice = LedgerIndex(LedgerFrame.de_contas(LINHAS) if origem == "frame" else contas)
+    for prefixo in PREFIXOS:
+        assert indice.somar(prefixo, campo) == pytest.approx(_somar_em(contas, prefixo, campo), abs=1e-9), prefixo
+
+
+def test_prefixos_vizinhos_nao_se_misturam():
+    indice = LedgerIndex(LedgerFrame.de_contas(LINHAS))
+    # Prefixos valem sobre os dígitos: '1101' pega 1.1.01 e 11.01, mas não 1.10.01 ('11001')
+    assert indice.somar("1") == pytest.approx(0.1 + 0.2 + 10.0 + 7.0 + 1000.0 - 300.0)
+    assert indice.somar("11") == pytest.approx(0.1 + 0.2 + 10.0 + 7.0)
+    assert indice.somar("1101") == pytest.approx(0.1 + 7.0)
+    assert indice.somar("1110") == 0.0
+    # Prefixos são só dígitos: com máscara nada casa, como na varredura
+    assert indice.somar("1.1") == 0.0
+
+
+def test_redutoras_entram_com_sinal_invertido():
+    indice = LedgerIndex(LedgerFrame.de_contas(LINHAS))
+    assert indice.somar("120310") == -300.0
+    assert indice.somar("1203") == 700.0
+    assert indice.somar("3150") == -20.0
+    # Débito e crédito não mudam de sinal
+    assert indice.somar("120310", "credito") == 300.0
+
+
+def test_totais_arredondados_em_2_casas():
+    indice = LedgerIndex(LedgerFrame.de_contas(LINHAS))
+    assert indice.somar("1101") == 7.1
+    assert indice.somar("311") == 1234.57
+    # 0.1 + 0.2 em float é 0.30000000000000004
+    assert LedgerIndex(LedgerFrame.de_contas(LINHAS[2:4])).somar("1") == 0.3
+
+
+def test_indice_vazio():
+    indice = LedgerIndex(LedgerFrame.de_contas([]))
+    assert len(indice) == 0
+    assert indice.somar("1") == 0.0
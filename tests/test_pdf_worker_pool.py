@@ -0,0 +1,115 @@
+"""
+Vagas do PdfWorkerPool: recusa com a fila cheia (o 503 da rota de PDF) e
+devolução da vaga só quando o PDF termina, mesmo depois de um timeout.
+
+Uso:
+    python -m pytest -q tests
+"""
+from __future__ import annotations
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturoTimeoutError
+from typing import Optional
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from reporting import pdf_worker_pool  # noqa: E402
+from reporting.pdf_worker_pool import PdfPoolOcupadoError, PdfWorkerPool  # noqa: E402
+
+
+class RendererLento:
+    """Faz o papel do PdfRenderer: devolve o HTML como PDF, esperando `liberar` se dado."""
+
+    def __init__(self, liberar: Optional[threading.Event] = None) -> None:
+        self.liberar = liberar
+        self.chamadas = 0
+
+    def renderizar(self, html: str, base_url=None) -> bytes:
+        self.chamadas += 1
+        if self.liberar is not None:
+            self.liberar.wait(5)
+        if html == "falhar":
+            raise RuntimeError("layout")
+        return html.encode("utf-8")
+
+
+def _pool_local(renderer: RendererLento, max_fila: int = 0) -> PdfWorkerPool:
+    # max_workers=0: PDF no próprio processo, com o renderer já montado
+    pool = PdfWorkerPool({}, max_workers=0, max_fila=max_fila, espera_vaga=0.05)
+    pool._renderer_local = renderer
+    return pool
+
+
+def _esperar_livre(pool: PdfWorkerPool, timeout: float = 5.0) -> None:
+    limite = time.time() + timeout
+    while pool.stats()["em_andamento"] and time.time() < limite:
+        time.sleep(0.01)
+    assert pool.stats()["em_andamento"] == 0
+
+
+def test_renderiza_no_proprio_processo():
+    pool = _pool_local(RendererLento())
+    assert pool.renderizar("<p>ok</p>") == b"<p>ok</p>"
+    assert pool.stats()["pdfs"] == 1
+    assert pool.stats()["em_andamento"] == 0
+
+
+def test_sem_vaga_recusa_e_depois_aceita():
+    liberar = threading.Event()
+    pool = _pool_local(RendererLento(liberar), max_fila=1)
+    # 1 vaga de execução + 1 de fila, ambas ocupadas
+    ocupando = [threading.Thread(target=pool.renderizar, args=("a",)) for _ in range(2)]
+    for thread in ocupando:
+        thread.start()
+    limite = time.time() + 5
+    while pool.stats()["em_andamento"] < 2 and time.time() < limite:
+        time.sleep(0.01)
+
+    with pytest.raises(PdfPoolOcupadoError):
+        pool.renderizar("b")
+    assert pool.stats()["recusados"] == 1
+
+    liberar.set()
+    for thread in ocupando:
+        thread.join(5)
+    _esperar_livre(pool)
+    assert pool.renderizar("c") == b"c"
+    assert pool.stats()["pdfs"] == 3
+
+
+def test_erro_no_layout_devolve_a_vaga():
+    pool = _pool_local(RendererLento())
+    with pytest.raises(RuntimeError):
+        pool.renderizar("falhar")
+    assert pool.stats()["erros"] == 1
+    assert pool.renderizar("ok") == b"ok"
+
+
+def test_vaga_so_volta_quando_o_pdf_termina_apos_timeout(monkeypatch):
+    liberar = threading.Event()
+    renderer = RendererLento(liberar)
+    # Executor em threads no lugar dos processos spawn: mesma API de futuros e done_callback
+    monkeypatch.setattr(pdf_worker_pool, "_renderer", renderer)
+    pool = PdfWorkerPool({}, max_workers=1, max_fila=0, espera_vaga=0.05, timeout=0.1)
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(pool, "_obter_executor", lambda: executor)
+
+    with pytest.raises(FuturoTimeoutError):
+        pool.renderizar("lento")
+    assert pool.stats()["erros"] == 1
+
+    # A requisição desistiu, mas o PDF continua no worker: a vaga segue ocupada
+    assert pool.stats()["em_andamento"] == 1
+    with pytest.raises(PdfPoolOcupadoError):
+        pool.renderizar("outro")
+
+    liberar.set()
+    _esperar_livre(pool)
+    assert pool.renderizar("depois") == b"depois"
+    executor.shutdown()
@@ -0,0 +1,68 @@
+"""
+ZIP em stream (zip_em_stream): os pedaços, juntados, formam um ZIP válido
+com as entradas e o erros.json do lote, e cada entrada sai antes da próxima
+ser produzida.
+
+Uso:
+    python -m pytest -q tests
+"""
+from __future__ import annotations
+import io
+import json
+import os
+import sys
+import zipfile
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from reporting.zip_stream import zip_em_stream  # noqa: E402
+
+
+ERROS = {"total": 1, "erros": [{"cliente_id": 1003, "erro": "Sem dados no período"}]}
+
+
+def _entradas():
+    # Como entradas_lote do main.py: PDFs na ordem em que ficam prontos e o manifesto no fim
+    yield "RPS_Relatorio_1001_2024.pdf", b"%PDF-1.7 primeiro" + bytes(range(256)) * 16
+    yield "RPS_Relatorio_1002_2024.pdf", b"%PDF-1.7 segundo"
+    yield "erros.json", json.dumps(ERROS, ensure_ascii=False).encode("utf-8")
+
+
+@pytest.mark.parametrize("compressao", [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED])
+def test_pedacos_formam_zip_valido(compressao):
+    esperado = dict(_entradas())
+    dados = b"".join(zip_em_stream(_entradas(), compressao=compressao))
+
+    with zipfile.ZipFile(io.BytesIO(dados)) as zf:
+        assert zf.testzip() is None
+        assert zf.namelist() == list(esperado)
+        for nome, conteudo in esperado.items():
+            assert zf.read(nome) == conteudo
+        assert json.loads(zf.read("erros.json").decode("utf-8")) == ERROS
+
+
+def test_entrada_sai_antes_da_proxima_ser_produzida():
+    produzidas = []
+
+    def entradas():
+        for i in range(3):
+            produzidas.append(i)
+            yield f"{i}.pdf", b"x" * 100
+
+    pedacos = zip_em_stream(entradas())
+    primeiro = next(pedacos)
+    # Só a primeira entrada foi pedida ao gerador quando o primeiro pedaço chegou
+    assert produzidas == [0]
+    assert primeiro.startswith(b"PK\x03\x04")
+    resto = b"".join(pedacos)
+    assert produzidas == [0, 1, 2]
+    with zipfile.ZipFile(io.BytesIO(primeiro + resto)) as zf:
+        assert zf.namelist() == ["0.pdf", "1.pdf", "2.pdf"]
+
+
+def test_zip_vazio():
+    with zipfile.ZipFile(io.BytesIO(b"".join(zip_em_stream([])))) as zf:
+        assert zf.namelist() == []